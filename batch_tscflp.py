@@ -0,0 +1,211 @@
+# batch_tscflp.py
+"""
+Chạy nhiều thí nghiệm Greedy + MFSS trong cùng 1 chương trình.
+
+- Mỗi job = (instance, seed, tham số MFSS, ngân sách thời gian).
+- Các job được chia cho 1 process pool: mỗi worker import PuLP 1 lần và giữ
+  instance đã load (theo đường dẫn + cost_mode) cho các job sau trên cùng
+  instance, thay vì mỗi thí nghiệm 1 subprocess riêng.
+- Mỗi job có time_budget riêng (tính cả greedy, cận dưới và MFSS), truyền
+  xuống mfss(time_budget=...) nên thời gian chạy của cả batch ≈
+  tổng ngân sách / số core.
+- Kết quả trả về dạng BatchResult (không cần parse stdout).
+"""
+
+import contextlib
+import io
+import os
+import random
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from tscflp_core import TSCFLPInstance, load_instance_from_file
+from greedy_tscflp import greedy_tscflp
+from localsearch_tscflp import local_search
+from mfss_tscflp import mfss
+from bounds_tscflp import lower_bound, gap
+
+
+@dataclass
+class BatchJob:
+    """1 thí nghiệm Greedy + MFSS."""
+    instance: str                                          # Đường dẫn file instance
+    seed: int = 42
+    params: Dict[str, Any] = field(default_factory=dict)   # Tham số cho mfss()
+    time_budget: Optional[float] = None                    # Giây cho cả job (None = không giới hạn)
+    lower_bound: Optional[str] = None                      # 'lp' / 'lagrangian' / 'both' (None = không tính)
+    local_search: bool = False                             # Local search sau greedy
+    cost_mode: str = 'dense'                               # Xem load_instance_from_file
+
+
+@dataclass
+class BatchResult:
+    """Kết quả 1 job (các trường None nếu bước tương ứng không chạy / lỗi)."""
+    job: BatchJob
+    success: bool
+    greedy_cost: Optional[float] = None
+    greedy_time: Optional[float] = None
+    mfss_cost: Optional[float] = None
+    mfss_time: Optional[float] = None
+    improvement: Optional[float] = None   # % MFSS tốt hơn greedy
+    lower_bound: Optional[float] = None
+    mfss_gap: Optional[float] = None      # % gap của MFSS so với cận dưới
+    elapsed: float = 0.0                  # Tổng thời gian của job (giây)
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Dạng dict phẳng (không gồm job), VD: để in bảng hoặc ghi JSON."""
+        d = asdict(self)
+        d.pop('job')
+        return d
+
+
+# =====================================================================
+# WORKER PROCESS
+# =====================================================================
+
+# Instance đã load trong worker: (đường dẫn, cost_mode) → instance
+_INSTANCES: Dict[Tuple[str, str], TSCFLPInstance] = {}
+
+# Thuộc tính gắn vào instance trong lúc chạy 1 job (xem tscflp_core.get_model,
+# cache_tscflp.get_pattern_cache); NeighborIndex chỉ phụ thuộc dữ liệu nên giữ lại
+_JOB_STATE = ('_model', '_reduced_models', '_pattern_cache')
+
+
+def _get_instance(path: str, cost_mode: str) -> TSCFLPInstance:
+    """
+    Load instance 1 lần cho mỗi worker; trạng thái do job trước để lại (model
+    MILP, cache pattern) bị bỏ để job sau không bị ảnh hưởng.
+    """
+    key = (os.path.abspath(path), cost_mode)
+    inst = _INSTANCES.get(key)
+    if inst is None:
+        inst = load_instance_from_file(path, cost_mode=cost_mode)
+        _INSTANCES[key] = inst
+    # Model dùng chung giữ lời giải của job trước làm MIP start, cache pattern
+    # giữ các pattern job trước đã đánh giá → bỏ đi để kết quả và thời gian
+    # của mỗi job không phụ thuộc thứ tự chạy trong worker
+    for attr in _JOB_STATE:
+        inst.__dict__.pop(attr, None)
+    return inst
+
+
+def run_job(job: BatchJob) -> BatchResult:
+    """
+    Chạy 1 job: greedy (rcl_size=1) → local search (tùy chọn) → cận dưới
+    (tùy chọn) → MFSS, tất cả trong time_budget của job (nếu hết ngân sách
+    trước MFSS thì mfss_cost = greedy).
+    Log của các bước bị nuốt (không in ra); lỗi được ghi vào BatchResult.error.
+    """
+    start = time.time()
+    res = BatchResult(job=job, success=False)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            inst = _get_instance(job.instance, job.cost_mode)
+            random.seed(job.seed)
+
+            def remaining() -> Optional[float]:
+                """Ngân sách còn lại của job (None = không giới hạn)."""
+                if job.time_budget is None:
+                    return None
+                return job.time_budget - (time.time() - start)
+
+            # ===== BƯỚC 1: Greedy (+ local search trong ngân sách còn lại) =====
+            t0 = time.time()
+            sol_greedy = greedy_tscflp(inst, rcl_size=1)
+            if job.local_search and (remaining() is None or remaining() > 0):
+                sol_greedy = local_search(inst, sol_greedy, time_limit=remaining())
+            res.greedy_time = time.time() - t0
+            res.greedy_cost = sol_greedy.cost
+
+            # ===== BƯỚC 2: Cận dưới (tùy chọn, trong ngân sách còn lại) =====
+            lb = None
+            if job.lower_bound is not None and (remaining() is None or remaining() > 0):
+                lb = lower_bound(inst, method=job.lower_bound, ub=sol_greedy.cost,
+                                 time_limit=remaining(),
+                                 backend=job.params.get('backend', 'cbc')).value
+                if not np.isfinite(lb):
+                    lb = None  # Hết giờ trước khi có cận
+                res.lower_bound = lb
+
+            # ===== BƯỚC 3: MFSS với phần ngân sách còn lại =====
+            # Hết ngân sách sau greedy / cận dưới → kết quả là lời giải greedy
+            if remaining() is not None and remaining() <= 0:
+                res.mfss_time = 0.0
+                res.mfss_cost = sol_greedy.cost
+            else:
+                params = dict(job.params)
+                params.setdefault('seed', job.seed)
+                params.setdefault('n_workers', 1)  # Song song ở mức job, không lồng pool
+                if lb is not None:
+                    params.setdefault('lb', lb)
+                if job.time_budget is not None:
+                    params['time_budget'] = remaining()
+                t0 = time.time()
+                sol_mfss = mfss(inst, **params)
+                res.mfss_time = time.time() - t0
+                res.mfss_cost = sol_mfss.cost
+
+        res.improvement = (res.greedy_cost - res.mfss_cost) / res.greedy_cost * 100
+        if lb is not None:
+            res.mfss_gap = gap(res.mfss_cost, lb) * 100
+        res.success = True
+    except Exception:
+        res.error = traceback.format_exc(limit=3)
+    res.elapsed = time.time() - start
+    return res
+
+
+# =====================================================================
+# BATCH ENGINE
+# =====================================================================
+
+def run_batch(jobs: List[BatchJob],
+              n_workers: int = 0,
+              on_result: Optional[Callable[[int, BatchResult], None]] = None
+              ) -> List[BatchResult]:
+    """
+    Chạy danh sách job trên process pool.
+
+    Parameters
+    ----------
+    jobs : list of BatchJob
+        Các thí nghiệm cần chạy.
+    n_workers : int
+        Số process (0 = toàn bộ CPU, 1 = chạy tuần tự trong process hiện tại).
+    on_result : callable, optional
+        on_result(chỉ số job, kết quả) được gọi ngay khi 1 job xong
+        (theo thứ tự hoàn thành), VD: để in tiến trình.
+
+    Returns
+    -------
+    List[BatchResult]
+        Kết quả theo đúng thứ tự của `jobs`.
+    """
+    if not n_workers:
+        n_workers = os.cpu_count() or 1
+    n_workers = min(n_workers, max(1, len(jobs)))
+    results: List[Optional[BatchResult]] = [None] * len(jobs)
+
+    if n_workers <= 1:
+        for t, job in enumerate(jobs):
+            results[t] = run_job(job)
+            if on_result is not None:
+                on_result(t, results[t])
+        return results
+
+    # Job cùng instance xếp liền nhau → worker dùng lại instance đã load
+    order = sorted(range(len(jobs)), key=lambda t: (jobs[t].instance, t))
+    with ProcessPoolExecutor(max_workers=n_workers) as ex:
+        futures = {ex.submit(run_job, jobs[t]): t for t in order}
+        for fut in as_completed(futures):
+            t = futures[fut]
+            results[t] = fut.result()
+            if on_result is not None:
+                on_result(t, results[t])
+    return results
@@ -0,0 +1,316 @@
+# bounds_tscflp.py
+"""
+Cận dưới (lower bound) cho TSCFLP và báo cáo khoảng cách tối ưu (gap).
+
+Greedy / MFSS chỉ cho cận trên (chi phí của 1 lời giải khả thi). Module này
+tính cận dưới LB để biết lời giải cách tối ưu tối đa bao xa:
+    gap = (cost - LB) / cost
+
+Hai cách tính:
+- LP relaxation: model MILP đầy đủ với x, y liên tục, thêm các ràng buộc
+  hợp lệ để LP chặt hơn:
+    + cover:        Σ U_i x_i >= ΣD,  Σ V_j y_j >= ΣD
+    + strong link:  z[j,k] <= min(D_k, V_j) y_j,  w[i,j] <= min(U_i, V_j) x_i
+      (thêm |I|·|J| + |J|·|K| ràng buộc, thường giảm gap LP khoảng một nửa)
+- Lagrangian relaxation: đưa ràng buộc capacity
+      Σ_j w[i,j] <= U_i x_i  (nhân tử λ_i >= 0)
+      Σ_k z[j,k] <= V_j y_j  (nhân tử μ_j >= 0)
+  lên hàm mục tiêu. Bài toán con tách thành:
+    + luồng: mỗi khách k đi đường rẻ nhất i → j → k với chi phí
+      d[j,k] + μ_j + min_i (c[i,j] + λ_i)   (không còn capacity)
+    + 2 bài toán knapsack phủ (giữ lại ràng buộc cover):
+      min Σ (f_i - λ_i U_i) x_i  s.t.  Σ U_i x_i >= ΣD,  x nhị phân
+      (tương tự cho y), giải bằng quy hoạch động trên capacity đã làm tròn
+      theo hướng nới lỏng → vẫn là cận dưới hợp lệ.
+  Nhân tử được cập nhật bằng subgradient (bước Polyak).
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pulp as pl
+
+from tscflp_core import TSCFLPInstance, TSCFLPModel
+
+
+@dataclass
+class LowerBound:
+    """Kết quả tính cận dưới."""
+    value: float                        # Cận dưới tốt nhất = max(lp, lagrangian)
+    lp: Optional[float] = None          # Cận LP relaxation (None nếu không tính)
+    lagrangian: Optional[float] = None  # Cận Lagrangian (None nếu không tính)
+    time: float = 0.0                   # Thời gian tính (giây)
+
+
+def gap(cost: float, lb: float) -> float:
+    """Gap tương đối (cost - lb) / cost; inf nếu chưa có lời giải khả thi."""
+    if not np.isfinite(cost):
+        return float('inf')
+    return max(0.0, (cost - lb) / max(abs(cost), 1e-9))
+
+
+# =====================================================================
+# 1. LP RELAXATION
+# =====================================================================
+
+def lp_bound(inst: TSCFLPInstance,
+             time_limit: Optional[float] = None,
+             backend: str = 'cbc',
+             strong: bool = True) -> Tuple[float, Dict[str, np.ndarray]]:
+    """
+    Cận dưới LP relaxation (model đầy đủ + ràng buộc cover, và strong link
+    nếu strong=True).
+
+    Returns
+    -------
+    (giá trị LP, giá trị đối ngẫu) — đối ngẫu theo TSCFLPModel.duals(),
+    dùng để khởi tạo nhân tử Lagrangian. Giá trị LP = -inf nếu solver không
+    giải xong trong time_limit (tính cả thời gian dựng model) → không có cận.
+    """
+    start = time.time()
+    if time_limit is not None and time_limit <= 0:
+        return -float('inf'), {}
+
+    # Model riêng (không dùng model cache của instance để không đổi MIP start)
+    model = TSCFLPModel(inst, backend=backend)
+    total_demand = float(inst.D.sum())
+    model.prob += pl.lpSum(float(inst.U[i]) * model.x[i] for i in model.I) >= total_demand, "coverI"
+    model.prob += pl.lpSum(float(inst.V[j]) * model.y[j] for j in model.J) >= total_demand, "coverJ"
+    if strong:
+        U, V, D = inst.U, inst.V, inst.D
+        for (i, j), v in model.w.items():
+            model.prob += v - float(min(U[i], V[j])) * model.x[i] <= 0, f"linkI_{i}_{j}"
+        for (j, k), v in model.z.items():
+            model.prob += v - float(min(D[k], V[j])) * model.y[j] <= 0, f"linkJ_{j}_{k}"
+
+    # time_limit tính cả thời gian dựng model
+    if time_limit is not None:
+        time_limit -= time.time() - start
+        if time_limit <= 0:
+            return -float('inf'), {}
+    value = model.solve_lp(time_limit=time_limit)
+    if not np.isfinite(value) or model.prob.status != pl.LpStatusOptimal:
+        # Hết giờ: giá trị LP chưa tối ưu không phải cận dưới
+        return -float('inf'), {}
+    return float(value), model.duals()
+
+
+# =====================================================================
+# 2. LAGRANGIAN RELAXATION CỦA CAPACITY
+# =====================================================================
+
+def _cover_knapsack(a: np.ndarray, cap: np.ndarray, demand: float,
+                    steps: int) -> Tuple[float, np.ndarray]:
+    """
+    min Σ a_t x_t  s.t.  Σ cap_t x_t >= demand,  x nhị phân.
+
+    Capacity được làm tròn LÊN và demand làm tròn XUỐNG theo bước
+    s = demand / steps → tập khả thi rộng hơn bài toán gốc, nên giá trị trả về
+    luôn <= tối ưu thật (an toàn cho cận dưới).
+    Trả về (giá trị, x). Giá trị = inf nếu mở hết vẫn không đủ demand.
+    """
+    x = (a <= 0).astype(np.float64)  # Hệ số không dương: mở luôn có lợi
+    value = float(a[a <= 0].sum())
+    if cap.sum() < demand - 1e-6:
+        return float('inf'), np.ones_like(a)
+
+    s = demand / steps if demand > 0 else 1.0
+    units = np.ceil(cap / s - 1e-9).astype(np.int64)
+    need = int(np.floor(demand / s + 1e-9)) - int(units[x > 0].sum())
+    if need <= 0:
+        return value, x
+
+    # ===== Quy hoạch động: best[r] = chi phí nhỏ nhất để phủ >= r đơn vị =====
+    items = np.flatnonzero(a > 0)
+    best = np.full(need + 1, np.inf)
+    best[0] = 0.0
+    r = np.arange(need + 1)
+    take = np.zeros((len(items), need + 1), dtype=bool)
+    for t, idx in enumerate(items):
+        cand = best[np.maximum(0, r - units[idx])] + a[idx]
+        take[t] = cand < best
+        best = np.where(take[t], cand, best)
+
+    # Truy vết lời giải từ r = need
+    rem = need
+    for t in range(len(items) - 1, -1, -1):
+        if take[t, rem]:
+            x[items[t]] = 1.0
+            rem = max(0, rem - int(units[items[t]]))
+    return value + float(best[need]), x
+
+
+def _route(d, h: np.ndarray, block: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    min_j (d[j,k] + h[j]) và argmin theo từng khách k, duyệt d theo khối hàng
+    (d có thể là ndarray, memmap hoặc AbsDistanceCost).
+    """
+    nJ = len(h)
+    val = arg = None
+    for j0 in range(0, nJ, block):
+        j1 = min(nJ, j0 + block)
+        blk = np.asarray(d[j0:j1], dtype=np.float64) + h[j0:j1, None]
+        a = blk.argmin(axis=0)
+        v = blk[a, np.arange(blk.shape[1])]
+        if val is None:
+            val, arg = v, a + j0
+        else:
+            better = v < val
+            val = np.where(better, v, val)
+            arg = np.where(better, a + j0, arg)
+    return val, arg
+
+
+def lagrangian_bound(inst: TSCFLPInstance,
+                     ub: Optional[float] = None,
+                     max_iter: int = 300,
+                     time_limit: Optional[float] = None,
+                     lam0: Optional[np.ndarray] = None,
+                     mu0: Optional[np.ndarray] = None,
+                     knap_steps: int = 1000,
+                     verbose: bool = False) -> float:
+    """
+    Cận dưới Lagrangian (relax capacity), tối ưu nhân tử bằng subgradient.
+
+    Parameters
+    ----------
+    inst : TSCFLPInstance
+        Instance bài toán.
+    ub : float, optional
+        Cận trên đã biết (VD: chi phí greedy), dùng cho bước Polyak
+        t = θ (ub - L) / ||s||². Không có thì dùng mục tiêu L_best·1.05.
+    max_iter : int
+        Số vòng subgradient tối đa.
+    time_limit : float, optional
+        Giới hạn thời gian (giây).
+    lam0, mu0 : np.ndarray, optional
+        Nhân tử khởi tạo cho capacity nhà máy / kho (VD: -alpha, -beta từ
+        đối ngẫu LP). Mặc định = 0.
+    knap_steps : int
+        Độ phân giải của quy hoạch động knapsack (lớn hơn → chặt hơn, chậm hơn).
+    verbose : bool
+        In tiến trình mỗi khi cận được cải thiện.
+
+    Returns
+    -------
+    float
+        Cận dưới tốt nhất tìm được.
+    """
+    start = time.time()
+    nI, nJ, nK = len(inst.I), len(inst.J), len(inst.K)
+    U, V, D = inst.U, inst.V, inst.D
+    f, g = np.asarray(inst.f, dtype=np.float64), np.asarray(inst.g, dtype=np.float64)
+    total_demand = float(D.sum())
+    c = np.asarray(inst.c, dtype=np.float64)       # I×J: nhỏ, giữ trong RAM
+    block = max(1, 4_000_000 // max(nK, 1))         # Số hàng d mỗi khối
+
+    lam = np.zeros(nI) if lam0 is None else np.maximum(0.0, np.asarray(lam0, dtype=np.float64))
+    mu = np.zeros(nJ) if mu0 is None else np.maximum(0.0, np.asarray(mu0, dtype=np.float64))
+
+    best = -float('inf')
+    theta, patience, since = 2.0, 20, 0
+    for it in range(max_iter):
+        if time_limit is not None and time.time() - start > time_limit:
+            break
+
+        # ===== BƯỚC 1: Bài toán con luồng (đường rẻ nhất cho từng khách) =====
+        cI = c + lam[:, None]
+        i_of_j = cI.argmin(axis=0)                  # nhà máy rẻ nhất cho mỗi kho
+        p = cI[i_of_j, np.arange(nJ)]
+        route, j_of_k = _route(inst.d, mu + p, block)
+        L = float(D @ route)
+
+        # ===== BƯỚC 2: Knapsack phủ cho x và y =====
+        vx, x = _cover_knapsack(f - lam * U, U, total_demand, knap_steps)
+        vy, y = _cover_knapsack(g - mu * V, V, total_demand, knap_steps)
+        L += vx + vy
+        if not np.isfinite(L):
+            return L  # Tổng capacity không đủ demand: bài toán không khả thi
+
+        if L > best + 1e-9:
+            best = L
+            since = 0
+            if verbose:
+                print(f"    [LR {it}] cận dưới {best:,.2f}")
+        else:
+            since += 1
+            if since >= patience:
+                theta /= 2       # Không cải thiện lâu → giảm bước
+                since = 0
+                if theta < 1e-4:
+                    break
+
+        # ===== BƯỚC 3: Subgradient + bước Polyak =====
+        load_J = np.bincount(j_of_k, weights=D, minlength=nJ)
+        load_I = np.bincount(i_of_j, weights=load_J, minlength=nI)
+        s_lam = load_I - U * x
+        s_mu = load_J - V * y
+        # Nhân tử = 0 và subgradient âm → bị chặn bởi λ >= 0, không tính vào bước
+        s_lam[(lam <= 0) & (s_lam < 0)] = 0.0
+        s_mu[(mu <= 0) & (s_mu < 0)] = 0.0
+        norm = float(s_lam @ s_lam + s_mu @ s_mu)
+        if norm < 1e-12:
+            break  # Lời giải Lagrangian khả thi cho capacity → cận đã tối ưu
+        target = ub if ub is not None and ub > best else best + 0.05 * abs(best) + 1.0
+        step = theta * (target - L) / norm
+        lam = np.maximum(0.0, lam + step * s_lam)
+        mu = np.maximum(0.0, mu + step * s_mu)
+
+    return best
+
+
+# =====================================================================
+# 3. HÀM TỔNG HỢP
+# =====================================================================
+
+def lower_bound(inst: TSCFLPInstance,
+                method: str = 'both',
+                ub: Optional[float] = None,
+                time_limit: Optional[float] = None,
+                backend: str = 'cbc',
+                verbose: bool = False) -> LowerBound:
+    """
+    Tính cận dưới cho instance.
+
+    Parameters
+    ----------
+    method : str
+        'both' (mặc định: LP trước, đối ngẫu LP làm nhân tử khởi tạo cho
+        Lagrangian), 'lp' (chỉ LP relaxation, thường là cận chặt hơn) hoặc
+        'lagrangian' (không cần solver, không dựng model → dùng cho instance
+        quá lớn để dựng LP đầy đủ).
+    ub : float, optional
+        Cận trên đã biết, giúp subgradient hội tụ nhanh hơn.
+    time_limit : float, optional
+        Giới hạn thời gian cho cả lần tính (giây): LP dùng trước, Lagrangian
+        chạy trong thời gian còn lại (bỏ qua nếu đã hết).
+    backend : str
+        Solver cho LP relaxation (xem tscflp_core.make_solver).
+    """
+    if method not in ('lagrangian', 'lp', 'both'):
+        raise ValueError(f"method không hợp lệ: {method!r} (chọn 'lagrangian', 'lp' hoặc 'both')")
+
+    start = time.time()
+
+    def remaining() -> Optional[float]:
+        if time_limit is None:
+            return None
+        return time_limit - (time.time() - start)
+
+    lp = lag = None
+    lam0 = mu0 = None
+    if method in ('lp', 'both'):
+        lp, duals = lp_bound(inst, time_limit=remaining(), backend=backend)
+        if duals:
+            # Ràng buộc capacity dạng Σw - U·x <= 0 → đối ngẫu <= 0, λ = -alpha
+            lam0, mu0 = -duals['alpha'], -duals['beta']
+        if verbose:
+            print(f"    LP relaxation: {lp:,.2f}")
+    if method in ('lagrangian', 'both') and (time_limit is None or remaining() > 0):
+        lag = lagrangian_bound(inst, ub=ub, time_limit=remaining(),
+                               lam0=lam0, mu0=mu0, verbose=verbose)
+
+    value = max((v for v in (lp, lag) if v is not None), default=-float('inf'))
+    return LowerBound(value=value, lp=lp, lagrangian=lag, time=time.time() - start)
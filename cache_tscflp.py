@@ -0,0 +1,212 @@
+# cache_tscflp.py
+"""
+Các cache dùng chung để tránh giải lại những bài toán đã giải.
+
+- SubproblemCache: cache LRU cho subproblem fixed-set của MFSS,
+  key = chữ ký gọn của fixed set trên I/J.
+- pattern_key(): mã hóa pattern mở/đóng (open_I, open_J) thành bitset
+  (bytes) để hash/so sánh O(1) thay vì so sánh list.
+- PatternCache: cache pattern → (cost, luồng) của mỗi instance, để một
+  pattern đã đánh giá gần đây không phải gửi lại cho bộ giải luồng
+  (giới hạn theo số phần tử và số byte).
+"""
+
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from tscflp_core import TSCFLPInstance, Solution
+
+
+def pattern_key(open_I: Sequence[int], open_J: Sequence[int]) -> bytes:
+    """
+    Mã hóa pattern facility thành bitset gọn: 1 bit cho mỗi facility
+    (các plant rồi tới các depot), đóng gói 8 facility/byte.
+
+    Hai lời giải có cùng pattern ⇔ cùng key, nên có thể dùng key làm
+    phần tử của set/dict (tra cứu O(1)).
+    """
+    bits = np.concatenate((np.asarray(open_I) > 0, np.asarray(open_J) > 0))
+    return np.packbits(bits).tobytes()
+
+
+class SubproblemCache:
+    """
+    Cache LRU có giới hạn cho kết quả solve_full_mip với fixed-set.
+
+    Trong MFSS, build_fixed_set thường sinh lại đúng fixed set F của một
+    vòng trước (VD: khi B và Skn lặp lại). Khi đó MILP là y hệt nhau nên
+    trả luôn Solution đã có thay vì gọi solver lần nữa.
+
+    Key của mỗi subproblem chỉ gồm fixed set (không gồm time limit, vốn đổi
+    liên tục theo time_budget):
+        - mỗi facility (I rồi J) mã hóa thành 1 byte: 0 = tự do,
+          1 = fix đóng, 2 = fix mở
+        - băm blake2b 16 byte
+    → key gọn, cố định 16 byte dù instance có bao nhiêu facility.
+
+    Mỗi phần tử lưu (Solution, time limit đã dùng). Lời giải đã chứng minh
+    tối ưu (Solution.optimal) luôn được dùng lại; lời giải chưa tối ưu chỉ
+    được dùng lại khi time limit mới <= time limit đã giải (giải lại lâu hơn
+    có thể tìm được lời giải tốt hơn).
+
+    Attributes
+    ----------
+    hits, misses : int
+        Số lần tra cache trúng / trượt.
+    """
+
+    def __init__(self, n_I: int, n_J: int, maxsize: int = 1024):
+        self.n_I = n_I
+        self.n_J = n_J
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[bytes, Tuple[Solution, Optional[float]]]" = OrderedDict()
+
+    def key(self, fixed: Dict[str, Dict[int, int]]) -> bytes:
+        """Chữ ký gọn của fixed set."""
+        state = np.zeros(self.n_I + self.n_J, dtype=np.uint8)
+        for i, val in fixed.get('I', {}).items():
+            state[i] = 1 + int(val)
+        for j, val in fixed.get('J', {}).items():
+            state[self.n_I + j] = 1 + int(val)
+        return hashlib.blake2b(state.tobytes(), digest_size=16).digest()
+
+    def get(self,
+            fixed: Dict[str, Dict[int, int]],
+            time_limit: Optional[float]) -> Optional[Solution]:
+        """
+        Trả về Solution đã cache (và đánh dấu mới dùng) nếu dùng lại được với
+        time_limit (None = không giới hạn), hoặc None.
+        """
+        k = self.key(fixed)
+        entry = self._data.get(k)
+        if entry is not None:
+            sol, tl_old = entry
+            if sol.optimal or _tl_le(time_limit, tl_old):
+                self._data.move_to_end(k)
+                self.hits += 1
+                return sol
+        self.misses += 1
+        return None
+
+    def put(self,
+            fixed: Dict[str, Dict[int, int]],
+            time_limit: Optional[float],
+            sol: Solution):
+        """
+        Lưu kết quả giải với time_limit; nếu fixed set đã có thì giữ lời giải
+        tốt hơn và time limit lớn hơn. Bỏ phần tử lâu không dùng nhất khi
+        vượt maxsize.
+        """
+        if self.maxsize <= 0:
+            return
+        k = self.key(fixed)
+        entry = self._data.get(k)
+        if entry is not None:
+            old, tl_old = entry
+            if not sol.optimal and (old.optimal or old.cost < sol.cost):
+                sol = old
+            if _tl_le(time_limit, tl_old):
+                time_limit = tl_old
+        self._data[k] = (sol, time_limit)
+        self._data.move_to_end(k)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self) -> str:
+        return (f"SubproblemCache(size={len(self)}/{self.maxsize}, "
+                f"hits={self.hits}, misses={self.misses})")
+
+
+def _tl_le(a: Optional[float], b: Optional[float]) -> bool:
+    """Time limit a <= b (None = không giới hạn = vô cùng)."""
+    return b is None or (a is not None and a <= b)
+
+
+class PatternCache:
+    """
+    Cache LRU pattern → (cost, luồng) đã đánh giá chính xác.
+
+    Dùng cho các lời giải có được từ bộ giải min-cost flow (luồng tối ưu cho
+    pattern), VD: bước cuối của greedy, các move của local search. Key là
+    bitset của pattern_key(). Mỗi instance có 1 cache riêng, lấy qua
+    get_pattern_cache().
+
+    Chỉ lưu cost và mảng của luồng thưa (không giữ Solution / list pattern);
+    Solution được dựng lại khi get(). Cache bị giới hạn cả số phần tử
+    (maxsize) lẫn tổng số byte của luồng (max_bytes), vì mỗi worker MFSS
+    giữ 1 bản riêng.
+    """
+
+    # Phụ phí ước lượng (byte) cho mỗi phần tử: key, tuple, header mảng numpy
+    _ENTRY_OVERHEAD = 512
+
+    def __init__(self, maxsize: int = 4096, max_bytes: int = 64 << 20):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[bytes, tuple]" = OrderedDict()
+
+    def get(self,
+            open_I: Sequence[int],
+            open_J: Sequence[int]) -> Optional[Solution]:
+        """Trả về Solution đã đánh giá của pattern, hoặc None."""
+        k = pattern_key(open_I, open_J)
+        entry = self._data.get(k)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(k)
+        self.hits += 1
+        cost, w, z, _ = entry
+        return Solution(cost=cost,
+                        open_I=[int(v > 0) for v in open_I],
+                        open_J=[int(v > 0) for v in open_J],
+                        w=w, z=z)
+
+    def put(self, sol: Solution):
+        """Lưu cost + luồng của sol theo pattern của nó."""
+        if self.maxsize <= 0:
+            return
+        k = pattern_key(sol.open_I, sol.open_J)
+        size = self._ENTRY_OVERHEAD + len(k) + sum(
+            f.rows.nbytes + f.cols.nbytes + f.vals.nbytes
+            for f in (sol.w, sol.z) if f is not None)
+        old = self._data.pop(k, None)
+        if old is not None:
+            self.nbytes -= old[3]
+        self._data[k] = (sol.cost, sol.w, sol.z, size)
+        self.nbytes += size
+        while self._data and (len(self._data) > self.maxsize or self.nbytes > self.max_bytes):
+            self.nbytes -= self._data.popitem(last=False)[1][3]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self) -> str:
+        return (f"PatternCache(size={len(self)}/{self.maxsize}, "
+                f"{self.nbytes / 2**20:.1f}/{self.max_bytes / 2**20:.0f} MB, "
+                f"hits={self.hits}, misses={self.misses})")
+
+
+def get_pattern_cache(inst: TSCFLPInstance) -> PatternCache:
+    """
+    Lấy PatternCache dùng chung của instance (tạo ở lần gọi đầu tiên).
+
+    Cache được gắn vào instance (thuộc tính `_pattern_cache`) giống như
+    model MILP, nên mọi nơi đánh giá pattern trên cùng instance đều dùng chung.
+    """
+    cache = getattr(inst, '_pattern_cache', None)
+    if cache is None:
+        cache = PatternCache()
+        inst._pattern_cache = cache
+    return cache
@@ -13,6 +13,8 @@ import numpy as np
 from tscflp_core import load_instance_from_file
 from greedy_tscflp import greedy_tscflp
 from mfss_tscflp import mfss
+from localsearch_tscflp import local_search, LS_TIME_LIMIT
+from bounds_tscflp import lower_bound, gap
 
 # Fix encoding cho Windows console
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
@@ -24,12 +26,49 @@ def main():
                         help='Đường dẫn đến file instance (VD: OCA/TSCFL/Instances/PSC1-C1-50.txt)')
     parser.add_argument('--seed', type=int, default=42,
                         help='Random seed (default: 42)')
-    parser.add_argument('--iters', type=int, default=50,
-                        help='Số iterations cho MFSS (default: 50)')
+    parser.add_argument('--iters', type=int, default=None,
+                        help='Số iterations cho MFSS (default: 50, hoặc không giới hạn khi có --time-budget)')
     parser.add_argument('--pop-size', type=int, default=5,
                         help='Kích thước population cho MFSS (default: 5)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Số process chạy MFSS song song (default: 1, 0 = tất cả CPU)')
+    parser.add_argument('--deterministic', action='store_true',
+                        help='MFSS song song theo lượt, gộp kết quả theo thứ tự cố định')
+    parser.add_argument('--local-search', action='store_true',
+                        help='Chạy local search sau Greedy và xen giữa các vòng MFSS (mỗi 5 vòng)')
+    parser.add_argument('--ls-time', type=float, default=LS_TIME_LIMIT,
+                        help=f'Giới hạn thời gian (giây) của local search sau Greedy (default: {LS_TIME_LIMIT:g})')
+    parser.add_argument('--mip-mode', choices=['full', 'sparse', 'colgen'], default='full',
+                        help="MILP subproblem của MFSS: đầy đủ ('full'), tập cung thưa ('sparse') "
+                             "hay sinh cột ('colgen'); cả 3 cho cùng tối ưu khi đủ thời gian. "
+                             "'colgen' chỉ nên dùng khi model đầy đủ quá lớn để dựng: với "
+                             "instance vừa và nhỏ nó chậm hơn 'full' / 'sparse' (nhất là với CBC)")
+    parser.add_argument('--backend', choices=['cbc', 'highs', 'highs_cmd'], default='cbc',
+                        help="Solver MILP cho MFSS (default: cbc; 'highs' chạy trong process, cần highspy)")
+    parser.add_argument('--cost-mode', choices=['dense', 'mmap', 'lazy'], default='dense',
+                        help="Ma trận chi phí trong RAM ('dense'), memory-mapped trên đĩa ('mmap') "
+                             "hay tính từ tọa độ khi cần ('lazy')")
+    parser.add_argument('--lower-bound', choices=['none', 'lp', 'lagrangian', 'both'], default='none',
+                        help="Tính cận dưới để báo cáo gap tối ưu (default: none)")
+    parser.add_argument('--time-budget', type=float, default=None,
+                        help='Tổng thời gian (giây) cho MFSS; time limit subproblem được cắt theo thời gian còn lại')
+    parser.add_argument('--adaptive-size', action='store_true',
+                        help='Tự điều chỉnh số facility tự do của subproblem theo thời gian giải đo được')
+    parser.add_argument('--target-time', type=float, default=None,
+                        help='Thời gian giải mục tiêu (giây) mỗi subproblem cho --adaptive-size '
+                             '(default: 1/2 time limit subproblem)')
+    parser.add_argument('--pop-max', type=int, default=100,
+                        help='Số lời giải tối đa giữ trong population MFSS (default: 100)')
+    parser.add_argument('--evict', choices=['worst', 'diversity'], default='worst',
+                        help="Lời giải bị loại khi population đầy: cost cao nhất ('worst') "
+                             "hay giống lời giải khác nhất ('diversity')")
+    parser.add_argument('--gap-tol', type=float, default=None,
+                        help="Dừng MFSS sớm khi gap <= giá trị này (VD: 0.01 = 1%%); "
+                             "cần cận dưới (mặc định dùng --lower-bound both)")
     
     args = parser.parse_args()
+    if args.iters is None and args.time_budget is None:
+        args.iters = 50
     
     # Set random seed
     random.seed(args.seed)
@@ -39,13 +78,16 @@ def main():
     print(f"Đang load instance từ: {args.instance}")
     
     try:
-        inst = load_instance_from_file(args.instance)
+        inst = load_instance_from_file(args.instance, cost_mode=args.cost_mode)
         I_size = len(inst.f)
         J_size = len(inst.g)
         K_size = len(inst.D)
         total_demand = sum(inst.D)
         
         print(f"I={I_size} plants, J={J_size} depots, K={K_size} customers – |D|={int(total_demand)} tổng demand")
+        if args.mip_mode == 'colgen':
+            print("  ⚠ --mip-mode colgen dành cho instance mà model đầy đủ quá lớn để dựng; "
+                  "với instance vừa và nhỏ nó chậm hơn 'full' / 'sparse'")
         print("="*70)
     except Exception as e:
         print(f"Lỗi khi load instance: {e}")
@@ -57,6 +99,9 @@ def main():
     
     try:
         sol_greedy = greedy_tscflp(inst, rcl_size=1)
+        if args.local_search:
+            # Tăng cường nghiệm greedy bằng local search (open/close/swap)
+            sol_greedy = local_search(inst, sol_greedy, time_limit=args.ls_time)
         greedy_time = time.time() - start_time
         
         print(f"  ✓ Greedy hoàn thành trong {greedy_time:.2f}s")
@@ -68,6 +113,26 @@ def main():
         sol_greedy = None
         greedy_time = 0
     
+    # ========== Cận dưới (tùy chọn) ==========
+    lb = None
+    if args.lower_bound != 'none' or args.gap_tol is not None:
+        method = args.lower_bound if args.lower_bound != 'none' else 'both'
+        try:
+            # Greedy thất bại → không có cận trên cho Lagrangian (ub=None)
+            bound = lower_bound(inst, method=method, backend=args.backend,
+                                ub=sol_greedy.cost if sol_greedy is not None else None)
+            if np.isfinite(bound.value):
+                lb = bound.value
+                print(f"\n  Cận dưới (LB): {lb:,.2f} ({method}, {bound.time:.2f}s)")
+                if sol_greedy is not None:
+                    print(f"  - Gap Greedy: {gap(sol_greedy.cost, lb) * 100:.2f}%")
+            else:
+                print(f"\n  ✗ Không tính được cận dưới ({method}, {bound.time:.2f}s)")
+        except Exception as e:
+            # MFSS vẫn chạy, chỉ không báo cáo gap / không dừng sớm theo gap_tol
+            print(f"\n  ✗ Tính cận dưới thất bại: {e}")
+            lb = None
+    
     # ========== 2. Chạy MFSS ==========
     print(f"\n[2] Chạy MFSS (pop_size={args.pop_size}, iterations={args.iters})...")
     start_time = time.time()
@@ -77,7 +142,19 @@ def main():
             inst,
             Npop=args.pop_size,
             max_iter=args.iters,
-            tinit=30.0
+            time_budget=args.time_budget,
+            adaptive_size=args.adaptive_size,
+            target_time=args.target_time,
+            pop_max=args.pop_max,
+            evict=args.evict,
+            tinit=30.0,
+            n_workers=args.workers,
+            deterministic=args.deterministic,
+            ls_every=5 if args.local_search else 0,
+            mip_mode=args.mip_mode,
+            backend=args.backend,
+            gap_tol=args.gap_tol,
+            lb=lb
         )
         mfss_time = time.time() - start_time
         
@@ -85,6 +162,8 @@ def main():
         print(f"  - Chi phí: {sol_mfss.cost:,.2f}")
         print(f"  - Số plant mở: {sum(sol_mfss.open_I)}/{I_size}")
         print(f"  - Số depot mở: {sum(sol_mfss.open_J)}/{J_size}")
+        if lb is not None:
+            print(f"  - Gap MFSS: {gap(sol_mfss.cost, lb) * 100:.2f}%")
     except Exception as e:
         print(f"  ✗ MFSS thất bại: {e}")
         sol_mfss = None
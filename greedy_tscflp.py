@@ -6,14 +6,61 @@ Cài đặt Algorithm 1: Greedy Algorithm for the TSCFLP.
   + chọn dần các primary (nhà máy) theo heuristic h_p(i, S)
   + với mỗi primary, chọn các secondary (kho) theo h_s(i, j, S)
   + với mỗi secondary, gán cho các khách có chi phí d_jk nhỏ nhất
-- Sau khi đã chọn tập facility, gọi lại MILP để tối ưu luồng (SolveMinCostFlow)
+- Sau khi đã chọn tập facility, giải min-cost flow để tối ưu luồng (SolveMinCostFlow)
+  bằng bộ giải luồng riêng (mincostflow_tscflp), không cần gọi CBC
 """
 
 import random
-from typing import List, Tuple
 import numpy as np
 
-from tscflp_core import TSCFLPInstance, Solution, solve_full_mip
+from tscflp_core import TSCFLPInstance, Solution
+from mincostflow_tscflp import solve_fixed_pattern
+
+
+def choose_with_rcl(cand: np.ndarray, scores: np.ndarray, rcl_sz: int) -> int:
+    """
+    Chọn 1 ứng viên từ RCL (Restricted Candidate List).
+
+    Args:
+        cand: Mảng index của các ứng viên
+        scores: Mảng heuristic tương ứng (nhỏ hơn = tốt hơn)
+        rcl_sz: Kích thước RCL (số ứng viên tốt nhất xét)
+
+    Returns:
+        index của ứng viên được chọn
+
+    Cách hoạt động:
+    - rcl_sz=1 → pure greedy: argmin, O(n)
+    - rcl_sz>1 → argpartition lấy top rcl_sz ứng viên (O(n), không sort toàn bộ),
+      sắp xếp riêng nhóm nhỏ này theo (score, index) rồi chọn ngẫu nhiên 1
+    """
+    r = max(1, min(rcl_sz, len(cand)))
+    if r == 1:
+        return int(cand[np.argmin(scores)])
+    top = np.argpartition(scores, r - 1)[:r]
+    top = top[np.lexsort((cand[top], scores[top]))]  # Thứ tự ổn định giống sort cũ
+    return int(cand[random.choice(top.tolist())])
+
+
+def _next_customers(order: np.ndarray, ptr: int, D: np.ndarray, r: int):
+    """
+    Duyệt lười danh sách customer đã sắp theo d[j][k] của 1 depot.
+
+    Returns:
+        (ptr mới, tối đa r customer còn demand gần depot nhất)
+        ptr mới đã bỏ qua các customer đầu danh sách đã được phục vụ đủ.
+    """
+    n = len(order)
+    while ptr < n and D[order[ptr]] <= 1e-6:
+        ptr += 1
+    picked = []
+    pos = ptr
+    while pos < n and len(picked) < r:
+        k = int(order[pos])
+        if D[k] > 1e-6:
+            picked.append(k)
+        pos += 1
+    return ptr, picked
 
 
 def greedy_tscflp(inst: TSCFLPInstance, rcl_size: int = 1) -> Solution:
@@ -34,7 +81,7 @@ def greedy_tscflp(inst: TSCFLPInstance, rcl_size: int = 1) -> Solution:
     Returns
     -------
     Solution
-        Lời giải (pattern facility mở + cost) sau khi giải lại MILP để tối ưu luồng.
+        Lời giải (pattern facility mở + cost) sau khi giải min-cost flow để tối ưu luồng.
     """
     # ===== KHỞI TẠO DỮ LIỆU =====
     I, J, K = inst.I, inst.J, inst.K  # Tập chỉ số facilities và customers
@@ -42,11 +89,12 @@ def greedy_tscflp(inst: TSCFLPInstance, rcl_size: int = 1) -> Solution:
     c, d = inst.c, inst.d  # Ma trận chi phí vận chuyển
 
     # Copy capacity/demand vì trong thuật toán sẽ giảm dần khi phân phối hàng
+    # (inst lưu dữ liệu dạng mảng NumPy → copy() tạo mảng mới)
     U = U0.copy()   # Capacity còn lại của từng plant
     V = V0.copy()   # Capacity còn lại của từng depot  
     D = D0.copy()   # Demand còn lại của từng customer
 
-    total_demand = sum(D)  # Tổng demand cần phục vụ
+    total_demand = float(D.sum())  # Tổng demand cần phục vụ
 
     # Tập facility đã được chọn mở
     selected_I = set()  # Plants đã mở
@@ -55,27 +103,33 @@ def greedy_tscflp(inst: TSCFLPInstance, rcl_size: int = 1) -> Solution:
     # Tập khách hàng chưa được phục vụ đầy đủ
     unmet_customers = set(k for k in K if D[k] > 0)
 
-    def choose_with_rcl(scores: List[Tuple[int, float]], rcl_sz: int):
-        """
-        Chọn facility từ RCL (Restricted Candidate List).
-        
-        Args:
-            scores: Danh sách (index, heuristic_value) của các ứng viên
-            rcl_sz: Kích thước RCL (số ứng viên tốt nhất xét)
-        
-        Returns:
-            index của facility được chọn
-            
-        Cách hoạt động:
-        - Sắp xếp ứng viên theo heuristic (tăng dần = tốt hơn)
-        - Lấy top rcl_sz ứng viên tốt nhất
-        - Chọn ngẫu nhiên 1 trong số đó
-        
-        Lưu ý: rcl_sz=1 → pure greedy (luôn chọn tốt nhất)
-        """
-        scores = sorted(scores, key=lambda x: x[1])  # Sắp xếp tăng dần
-        rcl = scores[:max(1, min(rcl_sz, len(scores)))]  # Lấy top rcl_sz
-        return random.choice(rcl)[0]  # Chọn ngẫu nhiên
+    # ===== HEURISTIC CẬP NHẬT TĂNG DẦN (running sums) =====
+    # Phần cố định của heuristic: chi phí mở / capacity (+1e-9 tránh chia 0)
+    hp_fixed = f / (U0 + 1e-9)
+    hs_fixed = g / (V0 + 1e-9)
+
+    # Tổng chi phí từ mỗi plant đến các depot còn capacity: sum_c_avail[i]
+    # → chỉ trừ đi cột c[:, j] khi depot j hết capacity
+    avail_J = V > 1e-6
+    sum_c_avail = c[:, avail_J].sum(axis=1)
+    n_avail = int(avail_J.sum())
+
+    # Tổng chi phí từ mỗi depot đến các customer chưa phục vụ xong: sum_d_unmet[j]
+    # → chỉ trừ đi cột d[:, k] khi customer k được phục vụ đủ
+    # (d có thể là memmap rất lớn: khi mọi customer đều có demand thì cộng
+    #  thẳng trên d, tránh fancy-index copy cả ma trận J×K vào RAM)
+    unmet_mask = D > 0
+    if unmet_mask.all():
+        sum_d_unmet = d.sum(axis=1)
+    else:
+        sum_d_unmet = d[:, unmet_mask].sum(axis=1)
+    n_unmet = len(unmet_customers)
+
+    # Thứ tự customer theo d[j][k] tăng dần của từng depot (tính lười khi depot
+    # được chọn lần đầu) + con trỏ tới customer chưa phục vụ đầu tiên.
+    # Customer đã phục vụ đủ không bao giờ quay lại nên con trỏ chỉ tiến lên.
+    cust_order = {}
+    cust_ptr = {}
 
     # ===== VÒNG LẶP CHÍNH: Xây dựng nghiệm dần =====
     # Lặp cho đến khi phục vụ hết demand
@@ -83,24 +137,18 @@ def greedy_tscflp(inst: TSCFLPInstance, rcl_size: int = 1) -> Solution:
         
         # ===== BƯỚC 1: Chọn plant (primary facility) =====
         # Chỉ xét plants còn capacity
-        cand_I = [i for i in I if U[i] > 1e-6]
-        if not cand_I:
+        cand_I = np.flatnonzero(U > 1e-6)
+        if len(cand_I) == 0:
             raise RuntimeError("Không đủ capacity primary để đáp ứng demand")
 
-        # Depots còn capacity (dùng để tính heuristic)
-        J_available = [j for j in J if V[j] > 1e-6]
-
-        # Tính heuristic h_p(i, S) cho từng plant
-        scores_i = []
-        for i in cand_I:
-            # h_p(i) = (chi phí mở / capacity) + (trung bình chi phí đến depots)
-            # → Ưu tiên plant có: chi phí mở thấp, capacity lớn, gần depots
-            avg_c = np.mean([c[i][j] for j in J_available]) if J_available else 0.0
-            hp = f[i] / (U0[i] + 1e-9) + avg_c  # +1e-9 tránh chia 0
-            scores_i.append((i, hp))
+        # Tính heuristic h_p(i, S) cho mọi plant cùng lúc
+        # h_p(i) = (chi phí mở / capacity) + (trung bình chi phí đến depots còn capacity)
+        # → Ưu tiên plant có: chi phí mở thấp, capacity lớn, gần depots
+        avg_c = sum_c_avail / n_avail if n_avail else 0.0
+        hp = hp_fixed + avg_c
 
         # Chọn plant theo RCL
-        i_star = choose_with_rcl(scores_i, rcl_size)
+        i_star = choose_with_rcl(cand_I, hp[cand_I], rcl_size)
         selected_I.add(i_star)  # Đánh dấu plant đã được mở
 
         # Lượng hàng plant i_star cung cấp = min(demand còn lại, capacity còn lại)
@@ -113,21 +161,18 @@ def greedy_tscflp(inst: TSCFLPInstance, rcl_size: int = 1) -> Solution:
         # Lặp cho đến khi phân phối hết remaining_from_i
         while remaining_from_i > 1e-6:
             # Chỉ xét depots còn capacity
-            cand_J = [j for j in J if V[j] > 1e-6]
-            if not cand_J:
+            cand_J = np.flatnonzero(avail_J)
+            if len(cand_J) == 0:
                 raise RuntimeError("Không đủ capacity secondary để nhận hàng")
 
-            # Tính heuristic h_s(i,j,S) cho từng depot
-            scores_j = []
-            for j in cand_J:
-                # h_s(i,j) = (chi phí i→j) + (chi phí mở / capacity) + (trung bình chi phí đến customers)
-                # → Ưu tiên depot: gần plant, chi phí mở thấp, capacity lớn, gần customers
-                avg_d = np.mean([d[j][k] for k in unmet_customers]) if unmet_customers else 0.0
-                hs = c[i_star][j] + g[j] / (V0[j] + 1e-9) + avg_d
-                scores_j.append((j, hs))
+            # Tính heuristic h_s(i,j,S) cho mọi depot cùng lúc
+            # h_s(i,j) = (chi phí i→j) + (chi phí mở / capacity) + (trung bình chi phí đến customers)
+            # → Ưu tiên depot: gần plant, chi phí mở thấp, capacity lớn, gần customers
+            avg_d = sum_d_unmet / n_unmet if n_unmet else 0.0
+            hs = c[i_star] + hs_fixed + avg_d
 
             # Chọn depot theo RCL
-            j_star = choose_with_rcl(scores_j, rcl_size)
+            j_star = choose_with_rcl(cand_J, hs[cand_J], rcl_size)
             selected_J.add(j_star)  # Đánh dấu depot đã được mở
 
             # Lượng hàng chuyển từ i_star đến j_star
@@ -135,20 +180,30 @@ def greedy_tscflp(inst: TSCFLPInstance, rcl_size: int = 1) -> Solution:
             V[j_star] -= V_used         # Giảm capacity depot còn lại
             remaining_from_i -= V_used  # Giảm lượng hàng cần phân phối
 
+            # Depot hết capacity → bỏ khỏi tổng chi phí của h_p
+            if V[j_star] <= 1e-6 and avail_J[j_star]:
+                avail_J[j_star] = False
+                sum_c_avail -= c[:, j_star]
+                n_avail -= 1
+
             remaining_from_j = V_used  # Lượng hàng depot j_star cần phân phối cho customers
 
             # ===== BƯỚC 3: Gán hàng từ depot cho customers =====
             # Lặp cho đến khi phân phối hết remaining_from_j
+            if j_star not in cust_order:
+                cust_order[j_star] = np.argsort(d[j_star], kind='stable')
+                cust_ptr[j_star] = 0
+
             while remaining_from_j > 1e-6:
-                # Chỉ xét customers còn demand
-                cand_K = [k for k in unmet_customers if D[k] > 1e-6]
+                # Heuristic h_c(j,k) = d[j][k] (chi phí vận chuyển depot → customer)
+                # → Ưu tiên customer gần depot nhất: đi tiếp trên danh sách đã sắp,
+                #   chỉ lấy rcl_size customer còn demand đầu tiên (không sort lại)
+                cust_ptr[j_star], cand_K = _next_customers(
+                    cust_order[j_star], cust_ptr[j_star], D, max(1, rcl_size))
                 if not cand_K:
                     break  # Không còn customer nào cần phục vụ
 
-                # Heuristic h_c(j,k) = d[j][k] (chi phí vận chuyển depot → customer)
-                # → Ưu tiên customer gần depot nhất
-                scores_k = [(k, d[j_star][k]) for k in cand_K]
-                k_star = choose_with_rcl(scores_k, rcl_size)
+                k_star = random.choice(cand_K) if len(cand_K) > 1 else cand_K[0]
 
                 # Lượng hàng giao cho customer k_star
                 amount = min(remaining_from_j, D[k_star])
@@ -156,20 +211,21 @@ def greedy_tscflp(inst: TSCFLPInstance, rcl_size: int = 1) -> Solution:
                 remaining_from_j -= amount    # Giảm hàng cần phân phối
 
                 # Nếu customer đã được phục vụ đủ → xóa khỏi danh sách
+                # và bỏ khỏi tổng chi phí của h_s
                 if D[k_star] <= 1e-6 and k_star in unmet_customers:
                     unmet_customers.remove(k_star)
+                    sum_d_unmet -= d[:, k_star]
+                    n_unmet -= 1
 
-    # ===== BƯỚC CUỐI: Giải lại MILP để tối ưu luồng =====
+    # ===== BƯỚC CUỐI: Giải min-cost flow để tối ưu luồng =====
     # Greedy đã chọn xong tập facility mở/đóng
-    # Giờ cố định pattern này, giải MILP để tìm luồng phân phối tối ưu
+    # Khi mọi x_i, y_j đã cố định, bài toán còn lại là bài toán vận tải 2 tầng
+    # → giải trực tiếp bằng min-cost flow (không cần MILP/CBC)
     # → Đảm bảo nghiệm cuối cùng khả thi và có chi phí chính xác
-    fixed = {
-        'I': {i: (1 if i in selected_I else 0) for i in I},  # Cố định plants
-        'J': {j: (1 if j in selected_J else 0) for j in J},  # Cố định depots
-    }
-    
-    # Gọi solver MILP với fixed-set constraints
-    sol = solve_full_mip(inst, fixed=fixed, verbose=False)
+    open_I = [1 if i in selected_I else 0 for i in I]  # Pattern plants
+    open_J = [1 if j in selected_J else 0 for j in J]  # Pattern depots
+
+    sol = solve_fixed_pattern(inst, open_I, open_J)
     return sol
 
 
@@ -0,0 +1,242 @@
+# localsearch_tscflp.py
+"""
+Local search cho TSCFLP trên không gian pattern facility.
+
+- Các move:
+  + close: đóng 1 facility đang mở
+  + open : mở 1 facility đang đóng
+  + swap : đóng 1 facility và mở 1 facility cùng tầng "gần" nó
+- Trước khi giải, mỗi move được ước lượng Δ chi phí từ luồng hiện tại
+  (chi phí mở tiết kiệm được trừ chi phí chuyển luồng, xem _MoveScreen);
+  chỉ move có Δ ước lượng < 0 mới được đánh giá chính xác, theo thứ tự Δ
+  tăng dần.
+- Chi phí của pattern mới được tính bằng min-cost flow WARM START từ luồng
+  của lời giải hiện tại (mincostflow_tscflp): luồng cũ là cây xuất phát của
+  network simplex, không giải lại từ đầu và không gọi CBC.
+- Chiến lược first-improvement: gặp move tốt hơn là nhận ngay, rồi sinh lại
+  danh sách move từ lời giải mới.
+
+Dùng làm bước tăng cường (intensification) sau greedy_tscflp, hoặc giữa các
+vòng MFSS (tham số ls_every của mfss).
+"""
+
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from tscflp_core import TSCFLPInstance, Solution
+from mincostflow_tscflp import solve_fixed_pattern
+
+# Giới hạn thời gian mặc định (giây) của local_search
+LS_TIME_LIMIT = 60.0
+
+# Move = (tầng 'I'/'J', facility bị đóng hoặc None, facility được mở hoặc None)
+Move = Tuple[str, Optional[int], Optional[int]]
+
+
+def _generate_moves(inst: TSCFLPInstance,
+                    sol: Solution,
+                    swap_candidates: int) -> List[Move]:
+    """
+    Sinh danh sách move, sắp theo thứ tự "hứa hẹn" để first-improvement
+    gặp move tốt sớm:
+    - close: facility dùng ít capacity nhất (so với chi phí mở) trước
+    - open : facility có chi phí mở / capacity thấp nhất trước
+    - swap : với mỗi facility đang mở, chỉ thử swap_candidates facility đang
+             đóng có vector chi phí vận chuyển gần nó nhất (gần về vị trí)
+    """
+    total_demand = float(inst.D.sum())
+
+    # Luồng đi qua mỗi facility (dùng để đánh giá mức sử dụng)
+    load_I = sol.w.row_sums() if sol.w is not None else np.zeros(len(inst.I))
+    load_J = sol.z.row_sums() if sol.z is not None else np.zeros(len(inst.J))
+
+    tiers = (
+        ('I', np.asarray(sol.open_I) > 0, inst.f, inst.U, load_I, inst.c),
+        ('J', np.asarray(sol.open_J) > 0, inst.g, inst.V, load_J, inst.d),
+    )
+    closes, opens, swaps = [], [], []
+    for tier, is_open, fixed, cap, load, rows in tiers:
+        opened = np.flatnonzero(is_open)
+        closed = np.flatnonzero(~is_open)
+        open_cap = float(cap[opened].sum())
+
+        # close: chỉ xét khi phần capacity còn lại vẫn đủ demand
+        ok = open_cap - cap[opened] >= total_demand - 1e-6
+        cand = opened[ok]
+        score = load[cand] / (fixed[cand] + 1e-9)  # ít hàng so với chi phí mở → đóng trước
+        closes += [(tier, int(a), None) for a in cand[np.argsort(score, kind='stable')]]
+
+        # open: rẻ nhất theo chi phí mở / capacity trước
+        score = fixed[closed] / (cap[closed] + 1e-9)
+        opens += [(tier, None, int(b)) for b in closed[np.argsort(score, kind='stable')]]
+
+        # swap: facility đóng có vector chi phí gần facility đang mở nhất
+        if swap_candidates > 0 and len(closed):
+            r = min(swap_candidates, len(closed))
+            for a in opened:
+                if open_cap - cap[a] + cap[closed].max() < total_demand - 1e-6:
+                    continue
+                dist = np.abs(rows[closed] - rows[a]).mean(axis=1)
+                near = closed[np.argpartition(dist, r - 1)[:r]]
+                for b in near:
+                    if open_cap - cap[a] + cap[b] >= total_demand - 1e-6:
+                        swaps.append((tier, int(a), int(b)))
+
+    return closes + swaps + opens
+
+
+def _apply_move(sol: Solution, move: Move) -> Tuple[List[int], List[int]]:
+    """Pattern mới sau khi áp dụng move."""
+    tier, a, b = move
+    open_I, open_J = list(sol.open_I), list(sol.open_J)
+    target = open_I if tier == 'I' else open_J
+    if a is not None:
+        target[a] = 0
+    if b is not None:
+        target[b] = 1
+    return open_I, open_J
+
+
+class _MoveScreen:
+    """
+    Ước lượng nhanh thay đổi chi phí của move từ luồng hiện tại (không giải
+    min-cost flow), để chỉ giải lại các move có triển vọng:
+
+        Δ ≈ chi phí mở facility mới − chi phí mở facility bị đóng
+            + chi phí chuyển luồng của facility bị đóng sang facility rẻ nhất
+              còn mở (bỏ qua capacity)
+            − phần tiết kiệm khi chuyển luồng sang facility được mở
+              (luồng tiết kiệm nhiều nhất trước, trong capacity của nó)
+
+    Luồng tầng I là các cung w (chi phí c[i,j]); luồng tầng J là các cung z
+    với chi phí d[j,k] + chi phí vào kho (bình quân theo luồng w hiện tại;
+    với kho khác: c rẻ nhất từ các plant đang mở).
+    """
+
+    def __init__(self, inst: TSCFLPInstance, sol: Solution):
+        self.inst = inst
+        self.open_I = np.flatnonzero(np.asarray(sol.open_I) > 0)
+        self.open_J = np.flatnonzero(np.asarray(sol.open_J) > 0)
+        w, z = sol.w, sol.z
+        c_w = np.asarray(inst.c[w.rows, w.cols], dtype=float)
+        self.c_in = np.asarray(inst.c[self.open_I], dtype=float).reshape(
+            len(self.open_I), len(inst.g)).min(axis=0, initial=np.inf)
+        inflow = w.col_sums()
+        inflow_cost = np.bincount(w.cols, weights=w.vals * c_w, minlength=len(inst.g))
+        c_cur = np.where(inflow > 0, inflow_cost / np.maximum(inflow, 1e-300), self.c_in)
+        d_z = np.asarray(inst.d[z.rows, z.cols], dtype=float)
+        self.flows = {'I': (w.rows, w.cols, w.vals, c_w),
+                      'J': (z.rows, z.cols, z.vals, d_z + c_cur[z.rows])}
+
+    def _route(self, tier: str, fac: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        """Chi phí đơn vị đi qua facility fac tới các đầu cols (|fac| × |cols|)."""
+        if tier == 'I':
+            return np.asarray(self.inst.c[np.ix_(fac, cols)], dtype=float)
+        return np.asarray(self.inst.d[np.ix_(fac, cols)], dtype=float) + self.c_in[fac][:, None]
+
+    def delta(self, move: Move) -> float:
+        """Thay đổi chi phí ước lượng của move (âm = có thể cải thiện)."""
+        tier, a, b = move
+        inst = self.inst
+        fixed, cap, opened = ((inst.f, inst.U, self.open_I) if tier == 'I'
+                              else (inst.g, inst.V, self.open_J))
+        fac, cols, q, unit = self.flows[tier]
+        delta = 0.0
+        b_cap = float(cap[b]) if b is not None else 0.0
+        stay = np.ones(len(fac), dtype=bool)
+        if a is not None:
+            delta -= float(fixed[a])
+            stay = fac != a
+            moved = ~stay
+            if moved.any():
+                targets = opened[opened != a]
+                if b is not None:
+                    targets = np.append(targets, b)
+                if not len(targets):
+                    return np.inf
+                R = self._route(tier, targets, cols[moved])
+                best = R.argmin(axis=0)
+                new_unit = R[best, np.arange(len(best))]
+                delta += float((q[moved] * (new_unit - unit[moved])).sum())
+                if b is not None:
+                    b_cap -= float(q[moved][targets[best] == b].sum())
+        if b is not None:
+            delta += float(fixed[b])
+            gain = unit[stay] - self._route(tier, np.array([b]), cols[stay])[0]
+            pos = gain > 0
+            gain, amt = gain[pos], q[stay][pos]
+            order = np.argsort(-gain, kind='stable')
+            gain, amt = gain[order], amt[order]
+            room = np.maximum(b_cap - (np.cumsum(amt) - amt), 0.0)
+            delta -= float((gain * np.minimum(amt, room)).sum())
+        return delta
+
+
+def local_search(inst: TSCFLPInstance,
+                 sol: Solution,
+                 max_rounds: int = 50,
+                 swap_candidates: int = 3,
+                 time_limit: Optional[float] = LS_TIME_LIMIT,
+                 screen: bool = True,
+                 verbose: bool = False) -> Solution:
+    """
+    Cải thiện một lời giải bằng các move open/close/swap (first-improvement).
+
+    Parameters
+    ----------
+    inst : TSCFLPInstance
+        Instance bài toán.
+    sol : Solution
+        Lời giải xuất phát. Nếu chưa có luồng (w, z) thì được đánh giá lại
+        bằng min-cost flow để lấy luồng.
+    max_rounds : int
+        Số lần nhận move cải thiện tối đa.
+    swap_candidates : int
+        Số facility đóng được thử swap với mỗi facility đang mở (0 = bỏ swap).
+    time_limit : float, optional
+        Giới hạn thời gian (giây, mặc định LS_TIME_LIMIT); hết giờ thì trả về
+        lời giải tốt nhất hiện có. None = không giới hạn.
+    screen : bool
+        Lọc move bằng ước lượng Δ từ luồng hiện tại (_MoveScreen): chỉ giải
+        min-cost flow cho move có Δ ước lượng < 0, theo thứ tự Δ tăng dần.
+        False = thử mọi move theo thứ tự của _generate_moves.
+    verbose : bool
+        In log mỗi khi nhận move.
+
+    Returns
+    -------
+    Solution
+        Lời giải tốt nhất tìm được (chính là `sol` nếu không có move cải thiện).
+    """
+    start = time.time()
+    cur = sol
+    if cur.w is None or cur.z is None:
+        # Luồng tối ưu cho pattern → cost không tệ hơn lời giải ban đầu
+        cur = solve_fixed_pattern(inst, cur.open_I, cur.open_J)
+
+    for _ in range(max_rounds):
+        improved = False
+        moves = _generate_moves(inst, cur, swap_candidates)
+        if screen and cur.w is not None and cur.z is not None:
+            est = _MoveScreen(inst, cur)
+            scored = [(est.delta(move), move) for move in moves]
+            moves = [move for e, move in sorted(scored, key=lambda t: t[0]) if e < 0]
+        for move in moves:
+            if time_limit is not None and time.time() - start > time_limit:
+                return cur
+            open_I, open_J = _apply_move(cur, move)
+            cand = solve_fixed_pattern(inst, open_I, open_J, warm_start=cur)
+            if cand.cost < cur.cost - 1e-6:
+                if verbose:
+                    tier, a, b = move
+                    kind = 'swap' if a is not None and b is not None else ('close' if b is None else 'open')
+                    print(f"    LS {kind} {tier}: {a}->{b}  chi phí {cur.cost:,.0f} → {cand.cost:,.0f}")
+                cur = cand
+                improved = True
+                break
+        if not improved:
+            break
+
+    return cur
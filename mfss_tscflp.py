@@ -3,34 +3,163 @@
 Cài đặt Algorithm 2: Matheuristic Fixed Set Search (MFSS) cho TSCFLP.
 
 Luồng chính:
-- Khởi tạo population P bằng randomized greedy (Algorithm 1 với RCL > 1).
+- Khởi tạo population P bằng randomized greedy (Algorithm 1 với RCL > 1),
+  có thể chạy song song trên nhiều process (build_population).
 - Mỗi vòng:
   + Lấy tập Sn gồm n_best lời giải tốt nhất.
   + Chọn ngẫu nhiên 1 base solution B trong Sn.
   + Chọn k lời giải từ Sn tạo thành Skn.
   + Xây fixed set F (những biến x_i, y_j sẽ bị fix 0/1).
   + Gọi solver MILP với fixed-set F để tìm lời giải mới S_new.
-  + Nếu S_new tốt hơn best hiện tại và chưa trùng pattern -> thêm vào P.
+  + Nếu S_new tốt hơn best hiện tại và chưa trùng pattern -> thêm vào P
+    (P có giới hạn kích thước, xem population_tscflp.Population).
   + Nếu bị "kẹt" nhiều vòng không cải thiện -> tăng time limit.
+  + (Tùy chọn) cứ ls_every vòng thì chạy local search trên best hiện tại.
+  + (Tùy chọn) dừng sớm khi gap so với cận dưới (bounds_tscflp) <= gap_tol.
+  + (Tùy chọn) tự điều chỉnh số facility tự do theo thời gian giải đo được
+    (SizeController, adaptive_size=True).
+- Chế độ song song (n_workers > 1): nhiều worker giải các subproblem khác
+  nhau cùng lúc, kết quả được gộp vào P và best_sol ngay khi về tới.
+- Anytime: mfss_iter là generator yield best_sol mỗi khi được cải thiện;
+  time_budget giới hạn tổng thời gian chạy, time limit của subproblem được
+  cắt theo thời gian còn lại. mfss() chạy hết generator (có thể kèm callback).
 """
 
+import os
 import random
-from typing import List
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
 
 from tscflp_core import TSCFLPInstance, Solution, solve_full_mip
 from greedy_tscflp import greedy_tscflp
+from cache_tscflp import SubproblemCache, pattern_key
+from localsearch_tscflp import local_search
+from bounds_tscflp import lower_bound, gap
+from population_tscflp import Population
+
+
+# =====================================================================
+# WORKER PROCESS: instance được gửi sang mỗi worker đúng 1 lần
+# =====================================================================
+
+# Instance dùng chung trong 1 worker process (gán bởi _init_worker khi
+# process khởi động) → các task chỉ cần gửi seed, không pickle lại
+# ma trận chi phí cho mỗi task.
+_WORKER_INST: Optional[TSCFLPInstance] = None
+
+# Time limit nhỏ nhất (giây) cho 1 subproblem khi chạy theo time_budget:
+# ít hơn thế thì thời gian dựng model / khởi động solver chiếm gần hết
+_MIN_TIME_LIMIT = 0.5
+
+
+def _init_worker(inst: TSCFLPInstance):
+    global _WORKER_INST
+    _WORKER_INST = inst
+
+
+def _greedy_task(args):
+    """Chạy 1 lần randomized greedy trong worker với seed riêng."""
+    seed, rcl_size = args
+    random.seed(seed)
+    return greedy_tscflp(_WORKER_INST, rcl_size=rcl_size)
+
+
+def _subproblem_task(args):
+    """Giải 1 subproblem fixed-set của MFSS trong worker → (Solution, thời gian giải)."""
+    F, tau, B, mip_opts = args
+    t0 = time.time()
+    sol = solve_full_mip(_WORKER_INST, time_limit=tau, fixed=F, verbose=False,
+                         incumbent=B, **mip_opts)
+    return sol, time.time() - t0
+
+
+def build_population(inst: TSCFLPInstance,
+                     Npop: int,
+                     rcl_size: int = 2,
+                     seed: int = 0,
+                     n_workers: int = 1,
+                     executor: Optional[ProcessPoolExecutor] = None) -> List[Solution]:
+    """
+    Tạo population ban đầu gồm Npop lời giải randomized greedy.
+
+    Mỗi lời giải thứ t dùng 1 seed riêng sinh ra từ `seed`, nên kết quả
+    giống hệt nhau dù chạy tuần tự hay song song, với bao nhiêu worker.
+
+    Parameters
+    ----------
+    inst : TSCFLPInstance
+        Instance bài toán.
+    Npop : int
+        Số lời giải cần tạo.
+    rcl_size : int
+        Kích thước RCL cho greedy (> 1 để các lời giải khác nhau).
+    seed : int
+        Seed gốc để sinh seed cho từng lời giải.
+    n_workers : int
+        Số process chạy song song. 1 = chạy tuần tự trong process hiện tại,
+        0 hoặc None = dùng toàn bộ CPU.
+    executor : ProcessPoolExecutor, optional
+        Pool có sẵn (đã khởi tạo bằng _init_worker với cùng instance).
+        Nếu có thì dùng luôn pool này thay vì tạo pool mới.
+
+    Returns
+    -------
+    List[Solution]
+        Population theo đúng thứ tự seed.
+    """
+    rng = random.Random(seed)
+    tasks = [(rng.getrandbits(32), rcl_size) for _ in range(Npop)]
+
+    if executor is not None:
+        return list(executor.map(_greedy_task, tasks))
+
+    if not n_workers:
+        n_workers = os.cpu_count() or 1
+    n_workers = min(n_workers, Npop)
+
+    if n_workers <= 1:
+        # Tuần tự: giữ nguyên trạng thái random của process gọi hàm
+        state = random.getstate()
+        try:
+            P = []
+            for task_seed, r in tasks:
+                random.seed(task_seed)
+                P.append(greedy_tscflp(inst, rcl_size=r))
+            return P
+        finally:
+            random.setstate(state)
+
+    # Song song: instance được pickle 1 lần cho mỗi worker (initializer),
+    # map() trả kết quả theo đúng thứ tự task → tái lập được
+    with ProcessPoolExecutor(max_workers=n_workers,
+                             initializer=_init_worker,
+                             initargs=(inst,)) as ex:
+        return list(ex.map(_greedy_task, tasks))
+
+
+def pattern_row(sol: Solution) -> np.ndarray:
+    """Pattern facility của 1 lời giải dạng vector uint8 (các plant rồi tới các depot)."""
+    return np.concatenate((np.asarray(sol.open_I, dtype=np.uint8),
+                           np.asarray(sol.open_J, dtype=np.uint8)))
+
+
+def pattern_matrix(sols: Sequence[Solution]) -> np.ndarray:
+    """Ma trận pattern uint8 (số lời giải × số facility), mỗi hàng = pattern_row."""
+    return np.array([pattern_row(s) for s in sols], dtype=np.uint8).reshape(len(sols), -1)
 
 
 def build_fixed_set(base: Solution,
-                    Skn: List[Solution],
+                    Skn: Union[Sequence[Solution], np.ndarray],
                     Size: int,
                     inst: TSCFLPInstance):
     """
     Xây fixed set F giống ý tưởng trong bài:
 
-    - Với mỗi facility:
-        + nếu là primary: xem trạng thái open_I[i] của base
-        + nếu là secondary: xem trạng thái open_J[j] của base
+    - Với mỗi facility (plant rồi depot): xem trạng thái của nó trong base
       rồi đếm trong Skn có bao nhiêu lời giải có cùng trạng thái đó.
 
     - Những facility có "tần suất xuất hiện giống base" cao nhất sẽ được đưa vào F
@@ -39,59 +168,160 @@ def build_fixed_set(base: Solution,
     Điều này phản ánh ý tưởng:
       "những pattern hay xuất hiện trong nhiều lời giải tốt thì có khả năng là 'tốt',
        nên ta giữ cố định chúng và chỉ tối ưu phần còn lại."
-    """
-    I, J = inst.I, inst.J
-
-    scores = []  # mỗi phần tử: (score, ('I', i) or ('J', j))
-
-    # Đánh điểm cho các nhà máy
-    for i in I:
-        cnt = sum(1 for S in Skn if S.open_I[i] == base.open_I[i])
-        scores.append((cnt, ('I', i)))
 
-    # Đánh điểm cho các kho
-    for j in J:
-        cnt = sum(1 for S in Skn if S.open_J[j] == base.open_J[j])
-        scores.append((cnt, ('J', j)))
+    Skn là list Solution hoặc ma trận pattern uint8 đã có (pattern_matrix).
+    Đếm tần suất bằng 1 phép so sánh trên cả ma trận; chọn top-Size bằng
+    argpartition, các facility cùng điểm ở ngưỡng cắt được chọn ngẫu nhiên.
+    """
+    nI = len(inst.I)
+    b = pattern_row(base)
+    M = Skn if isinstance(Skn, np.ndarray) else pattern_matrix(Skn)
 
-    # Sắp xếp giảm dần theo score (tần suất)
-    scores.sort(key=lambda x: x[0], reverse=True)
+    # Đánh điểm: số lời giải trong Skn có cùng trạng thái với base
+    scores = (M == b).sum(axis=0)
 
-    if Size >= len(scores):
+    n = len(b)
+    if Size >= n:
         # Nếu Size lớn hơn số facility, fix hết
-        chosen = scores
+        chosen = np.arange(n)
+    elif Size <= 0:
+        chosen = np.arange(0)
     else:
-        # Nếu không thì chọn Size phần tử,
-        # nhưng xử lý tie giống trong paper:
-        cutoff = scores[Size - 1][0]
-        # những phần tử có score > cutoff thì luôn được chọn
-        prefix = [s for s in scores if s[0] > cutoff]
-        # những phần tử score = cutoff cho vào "group tie"
-        tied = [s for s in scores if s[0] == cutoff]
-        needed = Size - len(prefix)
-        # random lấy "needed" phần tử trong group tie
-        chosen = prefix + random.sample(tied, needed)
+        # Chọn Size phần tử điểm cao nhất, xử lý tie giống trong paper:
+        # cộng nhiễu ngẫu nhiên trong [0, 1) → thứ tự giữa các điểm khác nhau
+        # giữ nguyên, các facility cùng điểm ở ngưỡng cắt được chọn ngẫu nhiên
+        rng = np.random.default_rng(random.getrandbits(32))
+        key = scores + rng.random(n)
+        chosen = np.argpartition(-key, Size - 1)[:Size]
 
     # Chuyển thành dict fixed-set cho solver
-    fixed_I = {}
-    fixed_J = {}
-    for _, (typ, idx) in chosen:
-        if typ == 'I':
-            fixed_I[idx] = base.open_I[idx]
-        else:
-            fixed_J[idx] = base.open_J[idx]
+    chosen = np.sort(chosen)
+    ci, cj = chosen[chosen < nI], chosen[chosen >= nI]
+    fixed_I = dict(zip(ci.tolist(), b[ci].tolist()))
+    fixed_J = dict(zip((cj - nI).tolist(), b[cj].tolist()))
 
     return {'I': fixed_I, 'J': fixed_J}
 
 
-def mfss(inst: TSCFLPInstance,
-         Npop: int = 10,
-         n_best: int = 5,
-         Sizemax: int = 10,
-         tinit: float = 1.0,
-         max_iter: int = 50) -> Solution:
+def _propose_fixed_set(P: Population,
+                       n_best: int,
+                       Size: int,
+                       inst: TSCFLPInstance):
+    """
+    Chọn base B, tập Skn từ top-n của P và xây fixed set F cho 1 subproblem.
+    (Dùng chung cho chế độ tuần tự và song song.)
+    Trả về (F, B): B thỏa F nên được dùng làm incumbent của subproblem.
+    """
+    # Top n_best theo cost tăng dần (P luôn được giữ sắp xếp, không sort lại)
+    Sn = P.top(n_best)
+
+    # Chọn base solution B ngẫu nhiên trong top-n
+    B = P.solution(random.choice(Sn))
+
+    # Chọn k lời giải từ Sn để tạo Skn (k ngẫu nhiên), lấy thẳng hàng pattern.
+    # P chỉ có 1 lời giải (instance nhỏ, greedy trả về cùng 1 pattern) → Skn
+    # chỉ gồm B, các facility cùng điểm nên fixed set được chọn ngẫu nhiên
+    k = min(random.randint(2, max(2, len(Sn))), len(Sn))
+    Skn = P.rows(random.sample(Sn, k=k))
+
+    # Xây fixed set F dựa trên B và Skn
+    return build_fixed_set(B, Skn, Size, inst), B
+
+
+class SizeController:
+    """
+    Điều chỉnh số facility tự do (n_free = Sizemax) của subproblem theo thời
+    gian giải đo được so với thời gian mục tiêu target của mỗi subproblem
+    (mặc định 1/2 time limit tau của chính subproblem đó), kèm tỉ lệ thành
+    công:
+    - thời gian / target trung bình > slow → subproblem quá khó so với time
+      limit: thu nhỏ
+    - thời gian / target trung bình < fast → giải xong quá nhanh: mở rộng
+      vùng tìm kiếm
+    - nằm giữa hai ngưỡng: giữ nguyên nếu tỉ lệ thành công >= min_success;
+      ít thành công mà vẫn nhanh hơn target thì cũng mở rộng (còn dư thời
+      gian mà không tìm ra gì mới)
+    "Thành công" = subproblem trả về lời giải tốt hơn base B của nó.
+    Đánh giá trên cửa sổ `window` subproblem gần nhất; sau mỗi lần đổi kích
+    thước thì đo lại từ đầu.
+    """
+
+    def __init__(self, n_free: int, n_min: int, n_max: int,
+                 target: Optional[float] = None,
+                 window: int = 5,
+                 grow: float = 1.25,
+                 shrink: float = 0.8,
+                 slow: float = 1.2,
+                 fast: float = 0.5,
+                 min_success: float = 0.5):
+        self.n_min, self.n_max = n_min, n_max
+        self.n_free = min(max(n_free, n_min), n_max)
+        self.target = target  # None → 1/2 time limit của subproblem
+        self.grow, self.shrink = grow, shrink
+        self.slow, self.fast = slow, fast
+        self.min_success = min_success
+        self.avg_time = 0.0   # Thời gian giải trung bình của cửa sổ vừa đánh giá
+        self._times = deque(maxlen=window)
+        self._ratios = deque(maxlen=window)   # thời gian giải / target
+        self._success = deque(maxlen=window)
+
+    def size(self, total_fac: int) -> int:
+        """Số facility bị fix tương ứng (tham số Size của build_fixed_set)."""
+        return total_fac - self.n_free
+
+    def update(self, elapsed: float, success: bool, time_limit: float) -> bool:
+        """Ghi nhận 1 subproblem (giải với time_limit); trả về True nếu n_free thay đổi."""
+        target = self.target if self.target is not None else 0.5 * time_limit
+        self._times.append(elapsed)
+        self._ratios.append(elapsed / max(target, 1e-9))
+        self._success.append(success)
+        if len(self._times) < self._times.maxlen:
+            return False
+
+        self.avg_time = sum(self._times) / len(self._times)
+        ratio = sum(self._ratios) / len(self._ratios)
+        rate = sum(self._success) / len(self._success)
+        old = self.n_free
+        if ratio > self.slow:
+            self.n_free = max(self.n_min, int(self.n_free * self.shrink))
+        elif ratio < self.fast or (rate < self.min_success and ratio < 1.0):
+            self.n_free = min(self.n_max, max(self.n_free + 1, int(round(self.n_free * self.grow))))
+        if self.n_free != old:
+            self._times.clear()
+            self._ratios.clear()
+            self._success.clear()
+            return True
+        return False
+
+
+def mfss_iter(inst: TSCFLPInstance,
+              Npop: int = 10,
+              n_best: int = 5,
+              Sizemax: int = 10,
+              tinit: float = 1.0,
+              max_iter: Optional[int] = 50,
+              n_workers: int = 1,
+              seed: int = 0,
+              deterministic: bool = False,
+              cache: Optional[SubproblemCache] = None,
+              cache_size: int = 1024,
+              ls_every: int = 0,
+              mip_mode: str = 'full',
+              backend: str = 'cbc',
+              use_incumbent: bool = True,
+              gap_tol: Optional[float] = None,
+              lb: Optional[float] = None,
+              time_budget: Optional[float] = None,
+              tau_max: Optional[float] = None,
+              adaptive_size: bool = False,
+              target_time: Optional[float] = None,
+              pop_max: Optional[int] = 100,
+              evict: str = 'worst') -> Iterator[Solution]:
     """
-    Cài đặt MFSS (phiên bản đơn giản hóa so với paper, nhưng cùng ý tưởng).
+    Cài đặt MFSS (phiên bản đơn giản hóa so với paper, nhưng cùng ý tưởng),
+    dạng generator "anytime": yield best_sol mỗi khi tìm được lời giải tốt hơn
+    (lời giải đầu tiên là best của population ban đầu). Dừng vòng lặp ở bất kỳ
+    lúc nào vẫn có lời giải tốt nhất tới thời điểm đó.
 
     Parameters
     ----------
@@ -106,90 +336,366 @@ def mfss(inst: TSCFLPInstance,
         => fixed-set sẽ có khoảng (|I| + |J| - Sizemax) biến được fix.
     tinit : float
         Time limit ban đầu cho solver MILP (giây).
-    max_iter : int
-        Số vòng lặp MFSS.
-
-    Returns
-    -------
+    max_iter : int, optional
+        Số vòng lặp MFSS (= tổng số subproblem được giải).
+        None = không giới hạn số vòng (cần time_budget hoặc gap_tol để dừng).
+    n_workers : int
+        Số process chạy song song (tạo population + giải subproblem).
+        1 = tuần tự, 0 = dùng toàn bộ CPU.
+    seed : int
+        Random seed (population tái lập được với cùng seed, bất kể n_workers).
+    deterministic : bool
+        Chỉ dùng khi n_workers > 1.
+        - False: bất đồng bộ - mỗi khi 1 worker xong, gộp kết quả vào P rồi
+                 giao ngay subproblem mới (tận dụng CPU tối đa).
+        - True : theo lượt - mỗi lượt tạo n_workers subproblem từ cùng 1 P,
+                 chờ tất cả xong rồi gộp theo đúng thứ tự giao việc, nên
+                 chuỗi subproblem không phụ thuộc vào thứ tự worker xong.
+    cache : SubproblemCache, optional
+        Cache kết quả subproblem, key = fixed set; mỗi kết quả lưu kèm time
+        limit đã dùng để giải. Lời giải đã chứng minh tối ưu luôn được dùng
+        lại; lời giải chưa tối ưu chỉ được dùng lại khi time limit mới <= time
+        limit đã lưu (stagnation tăng tau thì subproblem được giải lại).
+        Truyền vào để dùng lại giữa nhiều lần chạy hoặc đọc số hit/miss sau
+        khi chạy.
+    cache_size : int
+        Kích thước cache tạo mới khi không truyền `cache` (0 = tắt cache).
+    ls_every : int
+        Cứ sau ls_every vòng thì chạy local search (open/close/swap, xem
+        localsearch_tscflp) trên best_sol, giới hạn thời gian tau.
+        0 = không dùng local search.
+    mip_mode : str
+        Cách dựng MILP cho subproblem, truyền cho solve_full_mip(mode=...):
+        'full' (mọi cung), 'sparse' (k cung rẻ nhất + tái chèn cung) hoặc
+        'colgen' (sinh cột trên LP rồi mới branch).
+    backend : str
+        Solver cho subproblem: 'cbc', 'highs' (trong process, không ghi file
+        hay tạo process cho mỗi subproblem) hoặc 'highs_cmd'.
+    use_incumbent : bool
+        Dùng base B (khả thi cho fixed-set) làm MIP start / cận trên của
+        mỗi subproblem: subproblem không bao giờ trả về lời giải tệ hơn B
+        hay không khả thi khi tau ngắn.
+    gap_tol : float, optional
+        Dừng sớm khi gap (best - LB) / best <= gap_tol (VD: 0.01 = 1%).
+        None = chạy đủ max_iter vòng.
+    lb : float, optional
+        Cận dưới đã biết. Nếu None mà có gap_tol thì tính bằng
+        bounds_tscflp.lower_bound sau khi tạo population (theo time_budget:
+        trong phần ngân sách còn lại).
+    time_budget : float, optional
+        Tổng thời gian (giây, tính cả tạo population) cho cả lần chạy.
+        Time limit của mỗi subproblem = min(tau, thời gian còn lại), không
+        giao subproblem mới khi còn dưới _MIN_TIME_LIMIT giây.
+    tau_max : float, optional
+        Trần của tau khi tăng gấp đôi lúc stagnation. Mặc định: không giới
+        hạn, hoặc time_budget / 4 nếu có time_budget.
+    adaptive_size : bool
+        Tự điều chỉnh số facility tự do (bắt đầu từ Sizemax) theo thời gian
+        giải và tỉ lệ thành công của các subproblem gần đây (SizeController).
+    target_time : float, optional
+        Thời gian giải mục tiêu cho mỗi subproblem khi adaptive_size=True.
+        Mặc định: 1/2 time limit hiện tại của subproblem.
+    pop_max : int, optional
+        Số lời giải tối đa giữ trong P (None = không giới hạn). Không nhỏ hơn
+        n_best.
+    evict : str
+        Lời giải bị loại khi P đầy: 'worst' (cost cao nhất) hoặc 'diversity'
+        (giống lời giải khác nhất, không loại n_best lời giải tốt nhất;
+        cần pop_max).
+
+    Yields
+    ------
     Solution
-        Lời giải tốt nhất tìm được trong quá trình MFSS.
+        Lời giải tốt nhất hiện tại, mỗi khi được cải thiện.
     """
-    random.seed(0)
-
-    # ---------- 1) Khởi tạo population P bằng randomized greedy ----------
-    print(f"  → Tạo {Npop} nghiệm ban đầu...", end='', flush=True)
-    P: List[Solution] = []
-    for _ in range(Npop):
+    if max_iter is None and time_budget is None and gap_tol is None:
+        raise ValueError("max_iter=None cần time_budget hoặc gap_tol để dừng")
+    if evict == 'diversity' and pop_max is None:
+        raise ValueError("evict='diversity' cần pop_max (population có giới hạn)")
+
+    start = time.time()
+    random.seed(seed)
+
+    if not n_workers:
+        n_workers = os.cpu_count() or 1
+    if tau_max is None and time_budget is not None:
+        tau_max = max(tinit, time_budget / 4)
+
+    # Tùy chọn truyền cho solve_full_mip ở mọi subproblem
+    mip_opts = {'mode': mip_mode, 'backend': backend}
+
+    if cache is None and cache_size > 0:
+        cache = SubproblemCache(len(inst.I), len(inst.J), maxsize=cache_size)
+
+    # Pool dùng chung cho cả tạo population và giải subproblem
+    executor = None
+    if n_workers > 1:
+        executor = ProcessPoolExecutor(max_workers=n_workers,
+                                       initializer=_init_worker,
+                                       initargs=(inst,))
+
+    try:
+        # ---------- 1) Khởi tạo population P bằng randomized greedy ----------
+        print(f"  → Tạo {Npop} nghiệm ban đầu...", end='', flush=True)
         # RCL size = 2 => tạo ra nhiều lời giải khác nhau
-        sol = greedy_tscflp(inst, rcl_size=2)
-        P.append(sol)
-    print(" ✓")
-
-    # tau = time limit hiện tại cho MILP
-    tau = tinit
-    # Số facility total
-    total_fac = len(inst.I) + len(inst.J)
-    # Số biến sẽ bị fix = total_fac - Sizemax
-    Size = min(total_fac - 1, total_fac - Sizemax)  # bảo đảm dương
-
-    # Lời giải tốt nhất hiện tại
-    best_sol = min(P, key=lambda s: s.cost)
-    best_initial = best_sol.cost  # Lưu chi phí ban đầu để tính % cải thiện
-    stag = 0  # đếm số vòng không cải thiện (stagnation)
-
-    # ---------- 2) Vòng lặp học Fixed Set Search ----------
-    print(f"  → Bắt đầu {max_iter} vòng lặp tối ưu hóa...")
-    for it in range(max_iter):
-        print(f"    [Vòng {it+1}/{max_iter}]", end='', flush=True)
-        # Sắp xếp P theo cost tăng dần, lấy top n_best
-        P.sort(key=lambda s: s.cost)
-        Sn = P[:min(n_best, len(P))]
-
-        # Chọn base solution B ngẫu nhiên trong top-n
-        B = random.choice(Sn)
-
-        # Chọn k lời giải từ Sn để tạo Skn (k ngẫu nhiên)
-        k = random.randint(2, max(2, len(Sn)))
-        Skn = random.sample(Sn, k=k)
-
-        # Xây fixed set F dựa trên B và Skn
-        F = build_fixed_set(B, Skn, Size, inst)
-
-        # Giải MILP với fixed-set F, time limit = tau (tắt verbose để nhanh hơn)
-        S_new = solve_full_mip(inst, time_limit=tau, fixed=F, verbose=False)
-
-        # Hàm so sánh pattern (facility mở/đóng) giữa 2 lời giải
-        def same_pattern(a: Solution, b: Solution) -> bool:
-            return a.open_I == b.open_I and a.open_J == b.open_J
-
-        # Kiểm tra xem S_new đã tồn tại trong P chưa
-        exists = any(same_pattern(S_new, s) for s in P)
-
-        # Nếu mới + tốt hơn best_sol thì update
-        if (not exists) and (S_new.cost < best_sol.cost - 1e-6):
-            P.append(S_new)
-            best_sol = S_new
-            stag = 0
-            improvement = ((best_initial - best_sol.cost) / best_initial * 100)
-            print(f" ✓ Cải thiện {improvement:.2f}% (chi phí: {best_sol.cost:,.0f})")
+        P0 = build_population(inst, Npop, rcl_size=2, seed=seed,
+                              n_workers=n_workers, executor=executor)
+        print(" ✓")
+
+        # Population có giới hạn, sắp theo cost, tra trùng pattern O(1)
+        P = Population(len(inst.I), len(inst.J),
+                       maxsize=max(pop_max, n_best) if pop_max is not None else None,
+                       evict=evict, elite=n_best)
+        for S in P0:
+            P.add(S)
+
+        # tau = time limit hiện tại cho MILP
+        tau = tinit
+        # Số facility total
+        total_fac = len(inst.I) + len(inst.J)
+        # Số biến sẽ bị fix = total_fac - Sizemax
+        Size = min(total_fac - 1, total_fac - Sizemax)  # bảo đảm dương
+        # Bộ điều khiển kích thước subproblem (None = Size cố định)
+        ctrl = None
+        if adaptive_size:
+            ctrl = SizeController(total_fac - Size, n_min=2, n_max=total_fac - 1,
+                                  target=target_time)
+
+        # Lời giải tốt nhất hiện tại
+        best_sol = P.best
+        best_initial = best_sol.cost  # Lưu chi phí ban đầu để tính % cải thiện
+        stag = 0  # đếm số vòng không cải thiện (stagnation)
+        it = 0    # số subproblem đã gộp kết quả
+        yield best_sol
+
+        # Cận dưới để báo cáo gap / dừng sớm
+        if gap_tol is not None and lb is None:
+            # Theo time_budget: chỉ dùng phần ngân sách còn lại, hết thì bỏ qua
+            left = None if time_budget is None else time_budget - (time.time() - start)
+            if left is None or left >= _MIN_TIME_LIMIT:
+                print("  → Tính cận dưới...", end='', flush=True)
+                try:
+                    lb = lower_bound(inst, ub=best_sol.cost, time_limit=left,
+                                     backend=backend).value
+                except Exception as e:
+                    # Không có cận thì chỉ mất điều kiện dừng sớm, MFSS vẫn chạy
+                    print(f" ✗ lỗi: {e}")
+                    lb = None
+                else:
+                    if np.isfinite(lb):
+                        print(f" ✓ LB = {lb:,.0f}, gap ban đầu {gap(best_sol.cost, lb) * 100:.2f}%")
+                    else:
+                        print(" hết thời gian, không có cận")
+                        lb = None
+
+        def reached() -> bool:
+            """Gap của best_sol đã đạt gap_tol chưa (→ dừng sớm)."""
+            return gap_tol is not None and lb is not None and gap(best_sol.cost, lb) <= gap_tol
+
+        def time_limit() -> Optional[float]:
+            """Time limit cho subproblem tiếp theo: tau, cắt theo ngân sách còn lại."""
+            if time_budget is None:
+                return tau
+            return min(tau, time_budget - (time.time() - start))
+
+        def more(n: int) -> bool:
+            """Còn được giao subproblem thứ n+1 không (số vòng, gap, ngân sách)."""
+            if max_iter is not None and n >= max_iter:
+                return False
+            if reached():
+                return False
+            return time_budget is None or time_limit() >= _MIN_TIME_LIMIT
+
+        # Nhãn số vòng khi in log
+        total = max_iter if max_iter is not None else '∞'
+
+        def merge(S_new: Solution) -> bool:
+            """
+            Gộp kết quả 1 subproblem vào P / best_sol và cập nhật tau.
+            Trả về True nếu best_sol được cải thiện.
+            """
+            nonlocal best_sol, stag, tau, it
+            it += 1
+            improved = False
+            print(f"    [Vòng {it}/{total}]", end='', flush=True)
+
+            # Kiểm tra xem S_new đã tồn tại trong P chưa
+            key = pattern_key(S_new.open_I, S_new.open_J)
+            exists = P.has_key(key)
+
+            # Nếu mới + tốt hơn best_sol thì update
+            if (not exists) and (S_new.cost < best_sol.cost - 1e-6):
+                P.add(S_new, key)
+                best_sol = S_new
+                stag = 0
+                improved = True
+                improvement = ((best_initial - best_sol.cost) / best_initial * 100)
+                gap_str = f", gap {gap(best_sol.cost, lb) * 100:.2f}%" if lb is not None else ""
+                print(f" ✓ Cải thiện {improvement:.2f}% (chi phí: {best_sol.cost:,.0f}{gap_str})")
+            else:
+                print(" -")
+                stag += 1
+
+            # Nếu 5 vòng không cải thiện: tăng time limit lên 2x
+            # (gần giống ý tưởng paper tăng τ khi bị stagnation), tối đa tau_max
+            if stag >= 5:
+                stag = 0
+                if tau_max is None or tau < tau_max:
+                    tau = tau * 2 if tau_max is None else min(tau * 2, tau_max)
+                    print(f"    ⚠ Không cải thiện sau 5 vòng → tăng thời gian giải lên {tau}s")
+
+            # Local search xen giữa các vòng MFSS để tăng cường best_sol
+            tl = time_limit()
+            if ls_every and it % ls_every == 0 and tl > 0:
+                S_ls = local_search(inst, best_sol, time_limit=tl)
+                key = pattern_key(S_ls.open_I, S_ls.open_J)
+                if not P.has_key(key) and S_ls.cost < best_sol.cost - 1e-6:
+                    P.add(S_ls, key)
+                    best_sol = S_ls
+                    stag = 0
+                    improved = True
+                    improvement = ((best_initial - best_sol.cost) / best_initial * 100)
+                    print(f"    ↳ Local search: cải thiện {improvement:.2f}% (chi phí: {best_sol.cost:,.0f})")
+            return improved
+
+        def cached(F, tl) -> Optional[Solution]:
+            """Tra cache subproblem (None nếu không có cache hoặc trượt)."""
+            return cache.get(F, tl) if cache is not None else None
+
+        def remember(F, tl, sol: Solution):
+            if cache is not None:
+                cache.put(F, tl, sol)
+
+        def propose():
+            """Fixed set + base cho subproblem tiếp theo, theo kích thước hiện tại."""
+            size = ctrl.size(total_fac) if ctrl is not None else Size
+            return _propose_fixed_set(P, n_best, size, inst)
+
+        def observe(elapsed: float, S_new: Solution, B: Solution, tl: float):
+            """Cập nhật SizeController sau 1 subproblem thực sự được giải."""
+            if ctrl is not None and ctrl.update(elapsed, S_new.cost < B.cost - 1e-6, tl):
+                print(f"    ⇅ {ctrl.avg_time:.2f}s/subproblem → Sizemax = {ctrl.n_free}")
+
+        # ---------- 2) Vòng lặp học Fixed Set Search ----------
+        print(f"  → Bắt đầu {total} vòng lặp tối ưu hóa...")
+        submitted = 0
+
+        if executor is None:
+            # Tuần tự: mỗi vòng 1 subproblem
+            while more(submitted):
+                tl = time_limit()
+                F, B = propose()
+                submitted += 1
+                S_new = cached(F, tl)
+                if S_new is None:
+                    # Giải MILP với fixed-set F, time limit = tl (tắt verbose để nhanh hơn)
+                    t0 = time.time()
+                    S_new = solve_full_mip(inst, time_limit=tl, fixed=F, verbose=False,
+                                           incumbent=B if use_incumbent else None,
+                                           **mip_opts)
+                    remember(F, tl, S_new)
+                    observe(time.time() - t0, S_new, B, tl)
+                if merge(S_new):
+                    yield best_sol
+
+        elif deterministic:
+            # Song song theo lượt: n_workers subproblem/lượt, gộp theo thứ tự giao
+            while more(submitted):
+                jobs = []  # (F, tl, B, Solution từ cache hoặc Future)
+                while len(jobs) < n_workers and more(submitted):
+                    tl = time_limit()
+                    F, B = propose()
+                    submitted += 1
+                    hit = cached(F, tl)
+                    task = (F, tl, B if use_incumbent else None, mip_opts)
+                    jobs.append((F, tl, B, hit if hit is not None
+                                 else executor.submit(_subproblem_task, task)))
+                for F, tl, B, res in jobs:
+                    if isinstance(res, Solution):
+                        S_new = res
+                    else:
+                        S_new, elapsed = res.result()
+                        remember(F, tl, S_new)
+                        observe(elapsed, S_new, B, tl)
+                    if merge(S_new):
+                        yield best_sol
+
         else:
-            print(" -")
-            stag += 1
+            # Song song bất đồng bộ: luôn giữ n_workers subproblem đang chạy
+            pending = {}  # Future -> (F, tl, B) để lưu cache khi có kết quả
+
+            def refill() -> List[Solution]:
+                """Giao thêm subproblem cho worker rảnh; trả về các kết quả trúng cache."""
+                nonlocal submitted
+                hits = []
+                while len(pending) < n_workers and more(submitted):
+                    tl = time_limit()
+                    F, B = propose()
+                    submitted += 1
+                    hit = cached(F, tl)
+                    if hit is not None:
+                        hits.append(hit)  # Trúng cache: gộp ngay, không cần worker
+                    else:
+                        task = (F, tl, B if use_incumbent else None, mip_opts)
+                        fut = executor.submit(_subproblem_task, task)
+                        pending[fut] = (F, tl, B)
+                return hits
+
+            ready = refill()
+            while pending or ready:
+                for S_new in ready:
+                    if merge(S_new):
+                        yield best_sol
+                if pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        F, tl, B = pending.pop(fut)
+                        S_new, elapsed = fut.result()
+                        remember(F, tl, S_new)
+                        observe(elapsed, S_new, B, tl)
+                        if merge(S_new):
+                            yield best_sol
+                ready = refill()
+
+        if reached():
+            print(f"  → Dừng sớm: gap {gap(best_sol.cost, lb) * 100:.2f}% <= {gap_tol * 100:.2f}%")
+        elif time_budget is not None and time.time() - start >= time_budget - _MIN_TIME_LIMIT:
+            print(f"  → Hết ngân sách thời gian {time_budget:.0f}s sau {it} vòng")
+        if cache is not None:
+            print(f"  → Cache subproblem: {cache.hits} hit / {cache.misses} miss")
+
+    finally:
+        if executor is not None:
+            # Dừng giữa chừng (generator bị close): hủy các subproblem chưa chạy
+            executor.shutdown(cancel_futures=True)
+
 
-        # Nếu 5 vòng không cải thiện: tăng time limit lên 2x
-        # (gần giống ý tưởng paper tăng τ khi bị stagnation)
-        if stag >= 5:
-            tau *= 2
-            stag = 0
-            print(f"    ⚠ Không cải thiện sau 5 vòng → tăng thời gian giải lên {tau}s")
+def mfss(inst: TSCFLPInstance,
+         *args,
+         callback: Optional[Callable[[Solution], None]] = None,
+         **kwargs) -> Solution:
+    """
+    Chạy MFSS đến khi kết thúc và trả về lời giải tốt nhất.
 
+    Tham số giống mfss_iter (max_iter, time_budget, gap_tol, ...).
+    callback(sol) được gọi với mỗi lời giải cải thiện ngay khi tìm được
+    (VD: để lưu / gửi kế hoạch tốt nhất hiện tại khi chạy dưới SLA cứng).
+
+    Returns
+    -------
+    Solution
+        Lời giải tốt nhất tìm được trong quá trình MFSS.
+    """
+    best_sol = None
+    for best_sol in mfss_iter(inst, *args, **kwargs):
+        if callback is not None:
+            callback(best_sol)
     return best_sol
 
 
 if __name__ == "__main__":
     import sys
     import io
-    import time
     
     # Fix UTF-8 encoding cho console Windows
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
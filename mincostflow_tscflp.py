@@ -0,0 +1,824 @@
+# mincostflow_tscflp.py
+"""
+Bộ giải min-cost flow cho TSCFLP khi pattern facility đã được cố định.
+
+Khi mọi x_i, y_j đã được fix (bước cuối của Greedy), bài toán còn lại chỉ là
+bài toán vận tải 2 tầng (LP thuần), không cần gửi cả MILP nhị phân cho CBC.
+Module này giải trực tiếp bằng Network Simplex (primal, cây khung strongly
+feasible) trên mạng:
+
+    s ──> plant i ──> depot_in j ──> depot_out j ──> customer k
+      U[i]        c[i][j]       V[j]            d[j][k]      (cầu D[k])
+
+- Cung s→i có capacity U[i], cung j_in→j_out có capacity V[j] (capacity kho);
+  các cung vận chuyển i→j, j→k không giới hạn. s cung cấp đúng tổng D.
+- Mỗi pivot: chọn cung vào theo block pricing (reduced cost tính bằng NumPy
+  trên từng khối cung), tìm cung ra trên chu trình của cây, cập nhật cây
+  bằng thread index (chỉ đi qua các node trên chu trình / cây con bị dời).
+- Chỉ _N_NEAR cung depot → customer rẻ nhất của mỗi khách có mặt từ đầu;
+  khi simplex dừng, mọi cung còn thiếu được pricing theo thế vị (đọc d theo
+  khối), cung có reduced cost âm được thêm vào rồi pivot tiếp → kết quả vẫn
+  tối ưu trên mạng đầy đủ.
+- Không dùng PuLP/CBC, không có subprocess hay file trung gian.
+- Không dựng ma trận d hay z dày |J|×|K|: d được đọc theo khối hàng (hoặc
+  từng ô cho các cung đang xét), z chỉ lưu các cung có luồng → dùng được
+  với d memmap / AbsDistanceCost mà bộ nhớ không tăng theo |J|·|K|.
+"""
+
+from typing import List, Optional, Tuple
+import numpy as np
+
+from tscflp_core import TSCFLPInstance, Solution, SparseFlow
+from cache_tscflp import get_pattern_cache
+
+
+class _NetworkSimplex:
+    """
+    Network Simplex nguyên thủy cho min-cost flow cân bằng (tổng supply = 0)
+    với capacity có thể là inf.
+
+    Cây khung gốc tại 1 node ảo (chỉ số n); mỗi node có 1 cung nhân tạo chi
+    phí lớn (big-M) tới gốc, nên cây ban đầu (cho trước hoặc chỉ gồm cung
+    nhân tạo) luôn khả thi và strongly feasible; quy tắc chọn cung ra giữ
+    tính chất này nên không bị cycling khi suy biến.
+    Cây được lưu bằng parent / pred (cung tới parent) / pred_dir / thread /
+    rev_thread / succ_num / last_succ (list Python, thao tác từng node);
+    state, cost, src, tgt và thế vị pi là mảng NumPy để pricing vector hóa.
+
+    Quy ước reduced cost: cost[a] + pi[src[a]] - pi[tgt[a]] (= 0 trên cây).
+    """
+
+    TREE, LOWER, UPPER = 0, 1, -1
+    UP, DOWN = 1, -1
+    _N_CAND = 64  # Số cung tối thiểu giữ lại sau mỗi lượt pricing toàn bộ (≥ √m)
+
+    def __init__(self, supply: np.ndarray, src: np.ndarray, tgt: np.ndarray,
+                 cap: np.ndarray, cost: np.ndarray, tol: float,
+                 tree: Optional[np.ndarray] = None,
+                 upper: Optional[np.ndarray] = None):
+        """
+        tree[u] (tùy chọn): cung thật nối u với parent của nó trong cây ban
+        đầu, -1 nếu u treo thẳng vào gốc ảo. upper (tùy chọn): mask các cung
+        thật bắt đầu ở cận trên (luồng = capacity). Luồng trên cây được suy
+        ra từ supply và các cung ở cận trên; caller phải bảo đảm luồng này
+        khả thi và cung có luồng 0 hướng về gốc (cây strongly feasible).
+        """
+        n = len(supply)
+        root = n
+        m = len(src)
+        self.tol = tol
+        supply = np.asarray(supply, dtype=float)
+        src = np.asarray(src, dtype=np.int64)
+        tgt = np.asarray(tgt, dtype=np.int64)
+        if tree is None:
+            tree = np.full(n, -1, dtype=np.int64)
+
+        # parent và thứ tự duyệt cây theo chiều sâu (preorder) từ gốc ảo
+        tree = np.asarray(tree, dtype=np.int64)
+        real = tree >= 0
+        nodes = np.arange(n)
+        parent = np.full(n + 1, root, dtype=np.int64)
+        parent[:n][real] = np.where(src[tree[real]] == nodes[real],
+                                    tgt[tree[real]], src[tree[real]])
+        parent[root] = -1
+        parent = parent.tolist()
+        children = [[] for _ in range(n + 1)]
+        for u in range(n):
+            children[parent[u]].append(u)
+        order, stack = [], [root]
+        while stack:
+            u = stack.pop()
+            order.append(u)
+            stack.extend(reversed(children[u]))
+        if len(order) != n + 1:
+            raise ValueError("tree không phải là cây khung")
+
+        # Tổng supply (kể cả luồng của cung ở cận trên) của từng cây con
+        # → luồng trên cung tới parent
+        sub = np.append(supply, 0.0)
+        cap = np.asarray(cap, dtype=float)
+        if upper is not None:
+            np.add.at(sub, src[upper], -cap[upper])
+            np.add.at(sub, tgt[upper], cap[upper])
+        sub = sub.tolist()
+        for u in reversed(order[1:]):
+            sub[parent[u]] += sub[u]
+        sub = np.asarray(sub)
+        up = np.where(real, src[np.maximum(tree, 0)] == nodes, sub[:n] >= 0)
+
+        # Cung nhân tạo m + u: u → root (up) hoặc root → u. Chi phí big-M,
+        # trừ cung u → root đang trong cây (như LEMON: thế vị của u = 0)
+        max_cost = float(np.abs(cost).max()) if m else 0.0
+        art_cost = (max_cost + 1.0) * (n + 1)
+        art_dir = np.where(real, supply >= 0, up)
+        self.art = (m, m + n)
+        self.src = np.concatenate((src, np.where(art_dir, nodes, root)))
+        self.tgt = np.concatenate((tgt, np.where(art_dir, root, nodes)))
+        self.cost = np.concatenate((np.asarray(cost, dtype=np.float64),
+                                    np.where(~real & up, 0.0, art_cost)))
+        pred = np.where(real, tree, m + nodes)
+        self.state = np.full(m + n, self.LOWER, dtype=np.int8)
+        flow = np.zeros(m + n)
+        if upper is not None:
+            self.state[:m][upper] = self.UPPER
+            flow[:m][upper] = cap[upper]
+        self.state[pred] = self.TREE
+        flow[pred] = np.abs(sub[:n])
+        self.flow = flow.tolist()
+        self.cap = cap.tolist() + [np.inf] * n
+
+        # Thế vị: reduced cost 0 trên cây, pi[root] = 0
+        pc = np.where(up, -1.0, 1.0) * self.cost[pred]
+        pc = pc.tolist()
+        pi = [0.0] * (n + 1)
+        for u in order[1:]:
+            pi[u] = pi[parent[u]] + pc[u]
+        self.pi = np.asarray(pi)
+
+        self.parent = parent
+        self.pred = pred.tolist() + [-1]
+        self.pred_dir = np.where(up, self.UP, self.DOWN).tolist() + [0]
+        thread = [0] * (n + 1)
+        rev_thread = [0] * (n + 1)
+        for a, b in zip(order, order[1:] + order[:1]):
+            thread[a] = b
+            rev_thread[b] = a
+        self.thread, self.rev_thread = thread, rev_thread
+        succ_num = [1] * (n + 1)
+        last_succ = list(range(n + 1))
+        for u in reversed(order):
+            if u != root:
+                succ_num[parent[u]] += succ_num[u]
+            if children[u]:
+                # Node cuối cùng của cây con u trong preorder
+                last_succ[u] = last_succ[children[u][-1]]
+        self.succ_num, self.last_succ = succ_num, last_succ
+
+        self._cand = np.empty(0, dtype=np.int64)
+
+    def add_arcs(self, src: np.ndarray, tgt: np.ndarray,
+                 cap: np.ndarray, cost: np.ndarray):
+        """Thêm cung mới (luồng 0, ngoài cây)."""
+        self.src = np.concatenate((self.src, np.asarray(src, dtype=np.int64)))
+        self.tgt = np.concatenate((self.tgt, np.asarray(tgt, dtype=np.int64)))
+        self.cost = np.concatenate((self.cost, np.asarray(cost, dtype=np.float64)))
+        self.state = np.concatenate((self.state, np.full(len(src), self.LOWER, dtype=np.int8)))
+        self.flow.extend([0.0] * len(src))
+        self.cap.extend(np.asarray(cap, dtype=float).tolist())
+
+    # -----------------------------------------------------------------
+    # Pivot
+    # -----------------------------------------------------------------
+    def _reduced(self, arcs) -> np.ndarray:
+        """Reduced cost theo hướng cải thiện (âm ⇒ cung vào được)."""
+        return self.state[arcs] * (self.cost[arcs] + self.pi[self.src[arcs]]
+                                   - self.pi[self.tgt[arcs]])
+
+    def _find_entering(self) -> int:
+        """
+        Candidate-list pricing: 1 lượt tính reduced cost của mọi cung (NumPy)
+        giữ lại max(_N_CAND, √m) cung vi phạm nhiều nhất; các pivot sau chỉ
+        tính lại trên danh sách này cho đến khi nó hết cung vi phạm.
+        -1 nếu tối ưu.
+        """
+        cand = self._cand
+        if len(cand):
+            c = self._reduced(cand)
+            keep = c < -self.tol
+            if keep.any():
+                self._cand, c = cand[keep], c[keep]
+                return int(self._cand[c.argmin()])
+        c = self._reduced(slice(None))
+        cand = np.flatnonzero(c < -self.tol)
+        if not len(cand):
+            self._cand = cand
+            return -1
+        n_cand = max(self._N_CAND, int(np.sqrt(len(c))))
+        if len(cand) > n_cand:
+            cand = cand[np.argpartition(c[cand], n_cand)[:n_cand]]
+        self._cand = cand
+        return int(cand[c[cand].argmin()])
+
+    def _pivot(self, in_arc: int):
+        """Đưa in_arc vào cây: đẩy luồng quanh chu trình, đổi cung ra, cập
+        nhật cây và thế vị."""
+        parent, pred, pred_dir = self.parent, self.pred, self.pred_dir
+        succ_num, flow, cap = self.succ_num, self.flow, self.cap
+        UP, DOWN = self.UP, self.DOWN
+        u_src, u_tgt = int(self.src[in_arc]), int(self.tgt[in_arc])
+        st = int(self.state[in_arc])
+
+        # Node chung (join) của 2 nhánh chu trình
+        u, v = u_src, u_tgt
+        while u != v:
+            if succ_num[u] < succ_num[v]:
+                u = parent[u]
+            else:
+                v = parent[v]
+        join = u
+
+        # Cung ra: bottleneck theo hướng đẩy luồng; nhánh first lấy '<',
+        # nhánh second lấy '<=' (giữ cây strongly feasible)
+        first, second = (u_src, u_tgt) if st == self.LOWER else (u_tgt, u_src)
+        delta = cap[in_arc]
+        result, u_out, out_upper = 0, -1, False
+        u = first
+        while u != join:
+            e = pred[u]
+            if pred_dir[u] == UP:
+                d, to_upper = flow[e], False
+            else:
+                d, to_upper = cap[e] - flow[e], True
+            if d < delta:
+                delta, u_out, result, out_upper = d, u, 1, to_upper
+            u = parent[u]
+        u = second
+        while u != join:
+            e = pred[u]
+            if pred_dir[u] == DOWN:
+                d, to_upper = flow[e], False
+            else:
+                d, to_upper = cap[e] - flow[e], True
+            if d <= delta:
+                delta, u_out, result, out_upper = d, u, 2, to_upper
+            u = parent[u]
+        if delta == np.inf:
+            raise RuntimeError("Min-cost flow không bị chặn (chu trình âm không giới hạn)")
+
+        # Đẩy luồng quanh chu trình
+        if delta > 0:
+            val = st * delta
+            flow[in_arc] += val
+            u = u_src
+            while u != join:
+                flow[pred[u]] -= pred_dir[u] * val
+                u = parent[u]
+            u = u_tgt
+            while u != join:
+                flow[pred[u]] += pred_dir[u] * val
+                u = parent[u]
+
+        if result == 0:
+            # Cung vào chỉ đổi cận (chạm capacity hoặc về 0)
+            self.state[in_arc] = -st
+            flow[in_arc] = cap[in_arc] if st == self.LOWER else 0.0
+            return
+        e_out = pred[u_out]
+        self.state[in_arc] = self.TREE
+        self.state[e_out] = self.UPPER if out_upper else self.LOWER
+        flow[e_out] = cap[e_out] if out_upper else 0.0
+        if result == 1:
+            u_in, v_in = first, second
+        else:
+            u_in, v_in = second, first
+        self._update_tree(in_arc, join, u_in, v_in, u_out)
+        self._update_potential(in_arc, u_in, v_in)
+
+    def _update_tree(self, in_arc: int, join: int, u_in: int, v_in: int, u_out: int):
+        """Gắn lại cây con chứa u_out dưới v_in qua cung vào (đảo các node
+        'stem' từ u_in tới u_out), cập nhật thread / succ_num / last_succ."""
+        parent, pred, pred_dir = self.parent, self.pred, self.pred_dir
+        thread, rev_thread = self.thread, self.rev_thread
+        succ_num, last_succ = self.succ_num, self.last_succ
+
+        old_rev_thread = rev_thread[u_out]
+        old_succ_num = succ_num[u_out]
+        old_last_succ = last_succ[u_out]
+        v_out = parent[u_out]
+        in_dir = self.UP if u_in == int(self.src[in_arc]) else self.DOWN
+
+        if u_in == u_out:
+            parent[u_in] = v_in
+            pred[u_in] = in_arc
+            pred_dir[u_in] = in_dir
+            if thread[v_in] != u_out:
+                after = thread[old_last_succ]
+                thread[old_rev_thread] = after
+                rev_thread[after] = old_rev_thread
+                after = thread[v_in]
+                thread[v_in] = u_out
+                rev_thread[u_out] = v_in
+                thread[old_last_succ] = after
+                rev_thread[after] = old_last_succ
+        else:
+            thread_continue = (thread[old_last_succ] if old_rev_thread == v_in
+                               else thread[v_in])
+            stem, par_stem = u_in, v_in
+            last = last_succ[u_in]
+            after = thread[last]
+            thread[v_in] = u_in
+            dirty_revs = [v_in]
+            while stem != u_out:
+                next_stem = parent[stem]
+                thread[last] = next_stem
+                dirty_revs.append(last)
+                before = rev_thread[stem]
+                thread[before] = after
+                rev_thread[after] = before
+                parent[stem] = par_stem
+                par_stem = stem
+                stem = next_stem
+                last = (rev_thread[par_stem] if last_succ[stem] == last_succ[par_stem]
+                        else last_succ[stem])
+                after = thread[last]
+            parent[u_out] = par_stem
+            thread[last] = thread_continue
+            rev_thread[thread_continue] = last
+            last_succ[u_out] = last
+            if old_rev_thread != v_in:
+                thread[old_rev_thread] = after
+                rev_thread[after] = old_rev_thread
+            for u in dirty_revs:
+                rev_thread[thread[u]] = u
+
+            tmp_sc, tmp_ls = 0, last_succ[u_out]
+            u = u_out
+            while u != u_in:
+                p = parent[u]
+                pred[u] = pred[p]
+                pred_dir[u] = -pred_dir[p]
+                tmp_sc += succ_num[u] - succ_num[p]
+                succ_num[u] = tmp_sc
+                last_succ[p] = tmp_ls
+                u = p
+            pred[u_in] = in_arc
+            pred_dir[u_in] = in_dir
+            succ_num[u_in] = old_succ_num
+
+        up_limit_out = join if last_succ[join] == v_in else -1
+        last_succ_out = last_succ[u_out]
+        u = v_in
+        while u != -1 and last_succ[u] == v_in:
+            last_succ[u] = last_succ_out
+            u = parent[u]
+        if join != old_rev_thread and v_in != old_rev_thread:
+            u = v_out
+            while u != up_limit_out and last_succ[u] == old_last_succ:
+                last_succ[u] = old_rev_thread
+                u = parent[u]
+        elif last_succ_out != old_last_succ:
+            u = v_out
+            while u != up_limit_out and last_succ[u] == old_last_succ:
+                last_succ[u] = last_succ_out
+                u = parent[u]
+
+        u = v_in
+        while u != join:
+            succ_num[u] += old_succ_num
+            u = parent[u]
+        u = v_out
+        while u != join:
+            succ_num[u] -= old_succ_num
+            u = parent[u]
+
+    def _update_potential(self, in_arc: int, u_in: int, v_in: int):
+        """Dịch thế vị của cây con dưới u_in để cung vào có reduced cost 0."""
+        pi, thread = self.pi, self.thread
+        sigma = pi[v_in] - pi[u_in] - self.pred_dir[u_in] * self.cost[in_arc]
+        end = thread[self.last_succ[u_in]]
+        sub, u = [], u_in
+        while u != end:
+            sub.append(u)
+            u = thread[u]
+        pi[sub] += sigma
+
+    def run(self):
+        """Pivot cho đến khi không còn cung vào (tối ưu trên tập cung hiện có)."""
+        while True:
+            a = self._find_entering()
+            if a < 0:
+                return
+            self._pivot(a)
+
+    def artificial_flow(self) -> float:
+        """Tổng luồng trên các cung nhân tạo (> 0 ⇒ không khả thi)."""
+        lo, hi = self.art
+        return float(sum(self.flow[lo:hi]))
+
+    def flows(self) -> np.ndarray:
+        """Luồng trên mọi cung (theo chỉ số cung, gồm cả cung nhân tạo)."""
+        return np.asarray(self.flow)
+
+
+class _FlowNetwork:
+    """
+    Mạng của bài toán vận tải 2 tầng trên các facility đang mở.
+
+    Các node được đánh chỉ số toàn cục theo tầng:
+        s | plants (nI) | depot_in (nJ) | depot_out (nJ) | customers (K)
+    Cung (theo thứ tự trong _NetworkSimplex): s→i, i→j_in (đủ nI·nJ),
+    j_in→j_out, rồi các cung j_out→k đang xét: _N_NEAR kho rẻ nhất của mỗi
+    khách, cung có luồng của warm start và cung được thêm khi pricing.
+
+    Với warm start, mạng gồm cả các facility mở trong lời giải warm start
+    nhưng đóng trong pattern mới ("đang đóng"): cung capacity của chúng
+    (s→i, j_in→j_out) mang chi phí phạt big-M, nên luồng cũ vẫn khả thi và
+    là cây xuất phát của simplex; lời giải tối ưu không còn luồng qua chúng
+    (nếu còn thì pattern mới không khả thi).
+
+    Chi phí d không được copy: các lượt quét mọi cung depot → customer (chọn
+    _N_NEAR kho, pricing) đọc inst.d theo khối hàng (_d_blocks), chi phí của
+    cung đang xét được đọc từng ô (_d_at).
+    """
+
+    _N_NEAR = 8
+    _BLOCK = 1 << 20  # Số ô của d đọc trong 1 khối (bộ nhớ tạm ~ 8 MB)
+
+    def __init__(self, inst: TSCFLPInstance, open_I: List[int], open_J: List[int],
+                 warm_start: Optional[Solution] = None):
+        open_I = np.asarray(open_I) > 0
+        open_J = np.asarray(open_J) > 0
+        if warm_start is not None and (warm_start.w is None or warm_start.z is None):
+            warm_start = None
+        self._warm = warm_start
+        if warm_start is not None:
+            all_I = open_I | (np.asarray(warm_start.open_I) > 0)
+            all_J = open_J | (np.asarray(warm_start.open_J) > 0)
+        else:
+            all_I, all_J = open_I, open_J
+
+        # Chỉ số các facility trong mạng (trong instance gốc) và mask các
+        # facility đang đóng (chỉ có khi warm start)
+        self.Io = np.flatnonzero(all_I)
+        self.Jo = np.flatnonzero(all_J)
+        self.closing_I = ~open_I[self.Io]
+        self.closing_J = ~open_J[self.Jo]
+        nI, nJ, K = len(self.Io), len(self.Jo), len(inst.D)
+        self.nI, self.nJ, self.K = nI, nJ, K
+
+        # Dữ liệu thu gọn về các facility trong mạng
+        # (chỉ số trực tiếp trên inst.c → memmap/AbsDistanceCost chỉ đọc/tính
+        #  đúng phần của facility mở; d giữ nguyên, xem _d_blocks / _d_at)
+        self.c = np.asarray(inst.c[np.ix_(self.Io, self.Jo)], dtype=np.float64)
+        self._d = inst.d
+        self.U = np.asarray(inst.U, dtype=float)[self.Io]
+        self.V = np.asarray(inst.V, dtype=float)[self.Jo]
+        self.D = np.asarray(inst.D, dtype=float)
+
+        # Cung depot_out → customer xét từ đầu: _N_NEAR kho rẻ nhất của mỗi
+        # khách. Chọn bằng 1 lượt quét d theo khối, giữ L kho rẻ nhất đến
+        # hiện tại.
+        L = min(self._N_NEAR, nJ)
+        nbr = np.empty((0, K), dtype=np.int64)
+        nbr_d = np.empty((0, K))
+        max_d = 0.0
+        for rows, blk in self._d_blocks(np.arange(nJ)):
+            if blk.size:
+                max_d = max(max_d, float(blk.max()))
+            nbr = np.vstack((nbr, np.broadcast_to(rows[:, None], blk.shape)))
+            nbr_d = np.vstack((nbr_d, blk))
+            if len(nbr) > L:
+                part = np.argpartition(nbr_d, L - 1, axis=0)[:L]
+                nbr = np.take_along_axis(nbr, part, axis=0)
+                nbr_d = np.take_along_axis(nbr_d, part, axis=0)
+        self.nbr, self.nbr_d = nbr, nbr_d
+
+        # Sai số: eps cho lượng hàng, tol cho khoảng cách (chi phí)
+        self.eps = 1e-9 * max(1.0, float(self.D.sum()))
+        max_c = float(self.c.max()) if self.c.size else 0.0
+        self.tol = 1e-9 * max(1.0, max_c, max_d)
+
+        # Offset của từng tầng trong chỉ số toàn cục
+        self.oP = 1
+        self.oA = self.oP + nI
+        self.oB = self.oA + nJ
+        self.oC = self.oB + nJ
+        self.N = self.oC + K
+        # Chi phí phạt trên cung capacity của facility đang đóng: lớn hơn
+        # chi phí mọi đường đi đơn trong mạng
+        self.penalty = (max_c + max_d + 1.0) * (self.N + 1)
+
+        # Cung j_out → k đang xét: kho (chỉ số cục bộ), khách, chi phí d và
+        # chỉ số cung trong simplex (_za, có sau _build)
+        self._zj = np.empty(0, dtype=np.int64)
+        self._zk = np.empty(0, dtype=np.int64)
+        self._zd = np.empty(0)
+        self._za = np.empty(0, dtype=np.int64)
+        self._keys = np.empty(0, dtype=np.int64)  # j·K + k, đã sắp
+        self.ns = None
+        self._add_z(nbr.ravel(), np.tile(np.arange(K), L), nbr_d.ravel())
+        if warm_start is not None:
+            z = warm_start.z
+            pos_J = np.full(z.shape[0], -1, dtype=np.int64)
+            pos_J[self.Jo] = np.arange(nJ)
+            keep = z.vals > self.eps
+            self._add_z(pos_J[z.rows[keep]], z.cols[keep].astype(np.int64))
+        self.flow_w = np.zeros((nI, nJ))
+        self.flow_z = np.empty(0)
+
+    # -----------------------------------------------------------------
+    # Truy cập chi phí d
+    # -----------------------------------------------------------------
+    def _d_blocks(self, rows: np.ndarray):
+        """
+        Duyệt d theo khối hàng: (chỉ số cục bộ của kho, khối d[Jo[rows]])
+        với mỗi khối tối đa _BLOCK ô.
+        """
+        step = max(1, self._BLOCK // max(1, self.K))
+        for s in range(0, len(rows), step):
+            r = rows[s:s + step]
+            yield r, np.asarray(self._d[self.Jo[r]], dtype=np.float64).reshape(len(r), self.K)
+
+    def _d_at(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        """Chi phí d của các cung (Jo[rows[t]], cols[t]) (cùng shape)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        if rows.size == 0:
+            return np.zeros(rows.shape)
+        return np.asarray(self._d[self.Jo[rows], np.asarray(cols, dtype=np.int64)],
+                          dtype=np.float64)
+
+    def _add_z(self, j: np.ndarray, k: np.ndarray, dz: Optional[np.ndarray] = None) -> int:
+        """Thêm các cung j_out → k chưa có vào tập đang xét; trả về số cung mới."""
+        keys, new = np.unique(j * self.K + k, return_index=True)
+        fresh = ~np.isin(keys, self._keys, assume_unique=True)
+        if not fresh.any():
+            return 0
+        new = np.sort(new[fresh])  # Giữ thứ tự truyền vào (xem _crash_tree)
+        self._keys = np.union1d(self._keys, keys[fresh])
+        j, k = j[new], k[new]
+        dz = self._d_at(j, k) if dz is None else dz[new]
+        if self.ns is not None:
+            m = len(self.ns.src)
+            self.ns.add_arcs(self.oB + j, self.oC + k, np.full(len(j), np.inf), dz)
+            self._za = np.concatenate((self._za, np.arange(m, m + len(j))))
+        self._zj = np.concatenate((self._zj, j))
+        self._zk = np.concatenate((self._zk, k))
+        self._zd = np.concatenate((self._zd, dz))
+        return len(new)
+
+    # -----------------------------------------------------------------
+    # Cây xuất phát
+    # -----------------------------------------------------------------
+    def _crash_tree(self) -> np.ndarray:
+        """
+        Cây xuất phát khi giải từ đầu (gán tham lam): mỗi khách (cầu > 0)
+        treo dưới kho gần nhất qua cung j_out → k trong nbr; kho đủ capacity
+        cho phần cầu đó treo dưới depot_in của nó, depot_in treo dưới plant
+        rẻ nhất còn đủ capacity, plant được dùng treo dưới s. Phần còn lại
+        treo vào gốc ảo → simplex chỉ phải sửa chỗ gán tham lam bị vướng
+        capacity. Mọi cung thật trên cây có luồng dương theo chiều từ gốc
+        xuống nên cây strongly feasible.
+        """
+        nI, nJ = self.nI, self.nJ
+        tree = np.full(self.N, -1, dtype=np.int64)
+        if not nJ:
+            return tree
+        k = np.flatnonzero(self.D > 0)
+        best = self.nbr_d.argmin(axis=0)
+        nearest = self.nbr[best, np.arange(self.K)]
+        # Cung nbr[l, k] là cung z thứ l·K + k
+        tree[self.oC + k] = self._za[best[k] * self.K + k]
+
+        load = np.bincount(nearest[k], weights=self.D[k], minlength=nJ)
+        fits = np.flatnonzero((load > 0) & (load <= self.V))
+        tree[self.oB + fits] = nI + nI * nJ + fits           # j_in → j_out
+        rem = self.U.copy()
+        by_cost = np.argsort(self.c, axis=0)
+        for j in fits[np.argsort(-load[fits])].tolist():
+            for i in by_cost[:, j].tolist():
+                if rem[i] >= load[j]:
+                    rem[i] -= load[j]
+                    tree[self.oA + j] = nI + i * nJ + j       # i → j_in
+                    break
+        used = np.flatnonzero(rem < self.U)
+        tree[self.oP + used] = used                          # s → i
+        return tree
+
+    def _warm_tree(self, src: np.ndarray, tgt: np.ndarray, cap: np.ndarray
+                   ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Cây xuất phát từ luồng warm start: các cung có luồng nằm giữa 2 cận
+        tạo thành rừng (luồng của lời giải cơ sở), mỗi thành phần treo vào
+        gốc ảo; cung capacity đã đầy bắt đầu ở cận trên.
+
+        Returns (tree, upper), hoặc None nếu các cung đó có chu trình (luồng
+        không phải lời giải cơ sở, VD: lời giải của CBC) → giải từ cây crash.
+        """
+        w, z = self._warm.w, self._warm.z
+        nI, nJ, K, eps = self.nI, self.nJ, self.K, self.eps
+        pos_I = np.full(w.shape[0], -1, dtype=np.int64)
+        pos_I[self.Io] = np.arange(nI)
+        pos_J = np.full(w.shape[1], -1, dtype=np.int64)
+        pos_J[self.Jo] = np.arange(nJ)
+        W = np.zeros((nI, nJ))
+        np.add.at(W, (pos_I[w.rows], pos_J[w.cols]), w.vals)
+        fz = np.zeros(len(self._zj))
+        keep = z.vals > eps
+        keys = self._zj * K + self._zk
+        order = np.argsort(keys)
+        at = order[np.searchsorted(keys[order], pos_J[z.rows[keep]] * K + z.cols[keep])]
+        np.add.at(fz, at, z.vals[keep])
+        flow = np.concatenate((W.sum(axis=1), W.ravel(), W.sum(axis=0), fz))
+
+        upper = np.isfinite(cap) & (flow >= cap - eps)
+        inner = np.flatnonzero((flow > eps) & ~upper)
+
+        # Rừng (số cung = số node - số thành phần), định hướng bằng BFS
+        adj = [[] for _ in range(self.N)]
+        for a, u, v in zip(inner.tolist(), src[inner].tolist(), tgt[inner].tolist()):
+            adj[u].append((v, a))
+            adj[v].append((u, a))
+        tree = [-1] * self.N
+        seen = [False] * self.N
+        n_comp = 0
+        for r in range(self.N):
+            if seen[r]:
+                continue
+            n_comp += 1
+            seen[r] = True
+            queue = [r]
+            for u in queue:
+                for v, a in adj[u]:
+                    if not seen[v]:
+                        seen[v] = True
+                        tree[v] = a
+                        queue.append(v)
+        if len(inner) != self.N - n_comp:
+            return None
+        tree = np.asarray(tree, dtype=np.int64)
+        return tree, upper
+
+    # -----------------------------------------------------------------
+    # Giải
+    # -----------------------------------------------------------------
+    def _build(self) -> _NetworkSimplex:
+        nI, nJ = self.nI, self.nJ
+        P = np.arange(nI)
+        J = np.arange(nJ)
+        src = np.concatenate((np.zeros(nI, dtype=np.int64),
+                              np.repeat(self.oP + P, nJ),
+                              self.oA + J, self.oB + self._zj))
+        tgt = np.concatenate((self.oP + P, np.tile(self.oA + J, nI),
+                              self.oB + J, self.oC + self._zk))
+        cap = np.concatenate((self.U, np.full(nI * nJ, np.inf), self.V,
+                              np.full(len(self._zj), np.inf)))
+        cost = np.concatenate((np.where(self.closing_I, self.penalty, 0.0),
+                               self.c.ravel(),
+                               np.where(self.closing_J, self.penalty, 0.0),
+                               self._zd))
+        supply = np.zeros(self.N)
+        supply[0] = self.D.sum()
+        supply[self.oC:] = -self.D
+        self._za = nI + nI * nJ + nJ + np.arange(len(self._zj))
+
+        start = self._warm_tree(src, tgt, cap) if self._warm is not None else None
+        tree, upper = start if start is not None else (self._crash_tree(), None)
+        return _NetworkSimplex(supply, src, tgt, cap, cost, self.tol, tree, upper)
+
+    def _price_missing(self) -> bool:
+        """
+        Pricing mọi cung depot_out → customer theo thế vị hiện tại: với mỗi
+        khách, thêm cung có reduced cost âm nhất (nếu âm). Returns True nếu
+        có cung mới.
+        """
+        pi = self.ns.pi
+        pB, pC = pi[self.oB:self.oC], pi[self.oC:self.N]
+        best = np.full(self.K, -self.tol)
+        best_j = np.full(self.K, -1, dtype=np.int64)
+        for rows, blk in self._d_blocks(np.arange(self.nJ)):
+            rc = blk + pB[rows][:, None] - pC[None, :]
+            a = rc.argmin(axis=0)
+            v = rc[a, np.arange(self.K)]
+            better = v < best
+            best[better] = v[better]
+            best_j[better] = rows[a[better]]
+        k = np.flatnonzero(best_j >= 0)
+        return self._add_z(best_j[k], k) > 0
+
+    def solve(self) -> bool:
+        """
+        Network Simplex trên tập cung đang xét, xen kẽ pricing các cung
+        depot → customer còn thiếu cho đến khi không còn cung nào vi phạm.
+
+        Returns
+        -------
+        bool
+            True nếu đáp ứng được toàn bộ demand, False nếu không khả thi.
+        """
+        # Mạng đầy đủ (mọi cung vận chuyển không giới hạn) nên chỉ cần kiểm tra
+        # tổng capacity của các facility mở trong pattern
+        total_demand = self.D.sum()
+        if (self.U[~self.closing_I].sum() < total_demand - self.eps or
+                self.V[~self.closing_J].sum() < total_demand - self.eps):
+            return False
+
+        self.ns = self._build()
+        while True:
+            self.ns.run()
+            if not self._price_missing():
+                break
+        flow = self.ns.flows()
+        nI, nJ = self.nI, self.nJ
+        closing = np.concatenate((flow[:nI][self.closing_I],
+                                  flow[nI + nI * nJ:nI + nI * nJ + nJ][self.closing_J]))
+        if self.ns.artificial_flow() > self.eps or closing.sum() > self.eps:
+            return False
+        self.flow_w = flow[nI:nI + nI * nJ].reshape(nI, nJ)
+        self.flow_z = flow[self._za]
+        return True
+
+    def transport_cost(self) -> float:
+        """Chi phí vận chuyển của luồng hiện tại."""
+        return float((self.c * self.flow_w).sum() + (self._zd * self.flow_z).sum())
+
+    def sparse_flows(self, n_I: int, n_J: int) -> Tuple[SparseFlow, SparseFlow]:
+        """Luồng hiện tại dạng thưa, theo chỉ số gốc của instance."""
+        w = SparseFlow.from_dense(self.flow_w, tol=self.eps)
+        w.rows = self.Io[w.rows].astype(np.int32)
+        w.cols = self.Jo[w.cols].astype(np.int32)
+        w.shape = (n_I, n_J)
+        keep = np.flatnonzero(self.flow_z > self.eps)
+        order = keep[np.lexsort((self._zk[keep], self._zj[keep]))]
+        z = SparseFlow(rows=self.Jo[self._zj[order]].astype(np.int32),
+                       cols=self._zk[order].astype(np.int32),
+                       vals=self.flow_z[order], shape=(n_J, self.K))
+        return w, z
+
+
+def _solve_pattern(inst: TSCFLPInstance,
+                   open_I: List[int],
+                   open_J: List[int],
+                   warm_start: Optional[Solution] = None) -> Tuple[float, _FlowNetwork]:
+    """Giải min-cost flow, trả về (tổng chi phí, mạng đã chứa luồng tối ưu)."""
+    net = _FlowNetwork(inst, open_I, open_J, warm_start)
+    if not net.solve():
+        return float('inf'), net
+    fixed_cost = (float(np.asarray(inst.f, dtype=float)[np.asarray(open_I) > 0].sum()) +
+                  float(np.asarray(inst.g, dtype=float)[np.asarray(open_J) > 0].sum()))
+    return fixed_cost + net.transport_cost(), net
+
+
+def _empty_flow(shape: Tuple[int, int]) -> SparseFlow:
+    """Luồng thưa không có cung nào."""
+    return SparseFlow(rows=np.empty(0, np.int32), cols=np.empty(0, np.int32),
+                      vals=np.empty(0), shape=shape)
+
+
+def min_cost_flow(inst: TSCFLPInstance,
+                  open_I: List[int],
+                  open_J: List[int],
+                  warm_start: Optional[Solution] = None
+                  ) -> Tuple[float, SparseFlow, SparseFlow]:
+    """
+    Giải bài toán vận tải 2 tầng với pattern facility cố định.
+
+    Parameters
+    ----------
+    inst : TSCFLPInstance
+        Instance bài toán.
+    open_I, open_J : list of int
+        Pattern 0/1 mở/đóng của plants và depots.
+    warm_start : Solution, optional
+        Lời giải có luồng (w, z) của một pattern gần giống (VD: trước khi
+        mở/đóng 1 facility). Luồng này là cây xuất phát của simplex (facility
+        bị đóng được phạt để đẩy luồng ra, xem _FlowNetwork) nên chỉ cần
+        vài pivot thay vì giải lại từ đầu.
+
+    Returns
+    -------
+    cost : float
+        Tổng chi phí = chi phí mở các facility trong pattern + chi phí vận chuyển
+        tối ưu (float('inf') nếu capacity không đủ).
+    w : SparseFlow, shape (|I|, |J|)
+        Luồng tối ưu plant → depot (dạng thưa, chỉ số gốc của instance).
+    z : SparseFlow, shape (|J|, |K|)
+        Luồng tối ưu depot → customer (dạng thưa). Dùng .to_dense() nếu cần
+        ma trận dày.
+    """
+    cost, net = _solve_pattern(inst, open_I, open_J, warm_start)
+    n_I, n_J = len(inst.f), len(inst.g)
+    if not np.isfinite(cost):
+        return cost, _empty_flow((n_I, n_J)), _empty_flow((n_J, len(inst.D)))
+    w, z = net.sparse_flows(n_I, n_J)
+    return cost, w, z
+
+
+def solve_fixed_pattern(inst: TSCFLPInstance,
+                        open_I: List[int],
+                        open_J: List[int],
+                        use_cache: bool = True,
+                        warm_start: Optional[Solution] = None) -> Solution:
+    """
+    Đánh giá một pattern facility bằng min-cost flow (không gọi CBC).
+
+    Tương đương solve_full_mip(inst, fixed=<toàn bộ x, y>) nhưng nhanh hơn
+    nhiều vì chỉ giải bài toán luồng. Solution trả về có kèm luồng tối ưu
+    w, z dạng thưa (nếu pattern khả thi). Với use_cache=True, pattern đã đánh giá
+    trước đó (cache theo bitset, xem cache_tscflp) được trả về ngay.
+    Có thể truyền warm_start (xem min_cost_flow) là một lời giải gần giống.
+    """
+    cache = get_pattern_cache(inst) if use_cache else None
+    if cache is not None:
+        sol = cache.get(open_I, open_J)
+        if sol is not None:
+            return sol
+
+    cost, net = _solve_pattern(inst, open_I, open_J, warm_start)
+    sol = Solution(cost=cost,
+                   open_I=[int(v > 0) for v in open_I],
+                   open_J=[int(v > 0) for v in open_J])
+    if np.isfinite(cost):
+        sol.w, sol.z = net.sparse_flows(len(inst.f), len(inst.g))
+    if cache is not None:
+        cache.put(sol)
+    return sol
@@ -0,0 +1,193 @@
+# population_tscflp.py
+"""
+Population lời giải cho MFSS.
+
+- Giữ các lời giải theo thứ tự cost tăng dần (list sắp xếp, chèn bằng bisect)
+  → lấy top-n không cần sort lại cả population mỗi vòng.
+- Tra trùng pattern O(1) bằng dict bitset pattern (cache_tscflp.pattern_key).
+- Pattern facility lưu trong ma trận uint8 cấp phát sẵn (mỗi lời giải 1 hàng,
+  xem mfss_tscflp.pattern_row) cho build_fixed_set.
+- Giới hạn kích thước (maxsize): khi đầy thì loại 1 lời giải theo chính sách
+  evict:
+    + 'worst'     : loại lời giải cost cao nhất
+    + 'diversity' : loại lời giải giống lời giải khác nhất (khoảng cách
+                    Hamming tới láng giềng gần nhất nhỏ nhất), không đụng tới
+                    `elite` lời giải tốt nhất. Khoảng cách giữa các lời giải
+                    và láng giềng gần nhất được cập nhật dần: mỗi lần thêm /
+                    loại chỉ tốn O(n·F) (n lời giải, F = |I| + |J|); bảng
+                    khoảng cách O(maxsize²) nên chính sách này cần maxsize
+  → bộ nhớ và chi phí quản lý mỗi vòng không tăng theo thời gian chạy.
+"""
+
+import bisect
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from tscflp_core import Solution
+from cache_tscflp import pattern_key
+
+EVICT_POLICIES = ('worst', 'diversity')
+
+
+class Population:
+    """
+    Population có giới hạn, sắp theo cost, không trùng pattern.
+
+    Parameters
+    ----------
+    n_I, n_J : int
+        Số plant / depot của instance (độ dài pattern).
+    maxsize : int, optional
+        Số lời giải tối đa (None = không giới hạn, chỉ dùng với 'worst').
+    evict : str
+        Chính sách loại bỏ khi đầy: 'worst' hoặc 'diversity'
+        ('diversity' cần maxsize: không giới hạn thì không bao giờ loại,
+        còn bảng khoảng cách thì tăng theo bình phương số lời giải).
+    elite : int
+        Số lời giải tốt nhất không bao giờ bị loại theo 'diversity'.
+    """
+
+    def __init__(self, n_I: int, n_J: int,
+                 maxsize: Optional[int] = None,
+                 evict: str = 'worst',
+                 elite: int = 1):
+        if evict not in EVICT_POLICIES:
+            raise ValueError(f"evict không hợp lệ: {evict!r} (chọn 'worst' hoặc 'diversity')")
+        if maxsize is not None and maxsize < 1:
+            raise ValueError("maxsize phải >= 1")
+        if evict == 'diversity' and maxsize is None:
+            raise ValueError("evict='diversity' cần maxsize (population có giới hạn)")
+        self.n_I, self.n_J = n_I, n_J
+        self.maxsize = maxsize
+        self.evict = evict
+        self.elite = max(1, elite)
+        self.n_evicted = 0
+
+        # Ma trận pattern: dư 1 hàng để chèn trước rồi mới loại khi đầy
+        rows = maxsize + 1 if maxsize is not None else 16
+        self._mat = np.zeros((rows, n_I + n_J), dtype=np.uint8)
+        self._sols: List[Optional[Solution]] = [None] * rows
+        self._slot_key: List[Optional[bytes]] = [None] * rows
+        self._free = list(range(rows - 1, -1, -1))    # Slot trống (pop từ cuối)
+        self._keys: Dict[bytes, int] = {}              # pattern key → slot
+        self._order: List[tuple] = []                  # (cost, seq, slot) tăng dần
+        self._seq = 0                                  # Cùng cost: vào trước đứng trước
+
+        # 'diversity': khoảng cách Hamming giữa các slot đang dùng (slot trống /
+        # chính nó = _far), láng giềng gần nhất và khoảng cách tới nó
+        if evict == 'diversity':
+            self._far = n_I + n_J + 1
+            self._dist = np.full((rows, rows), self._far, dtype=np.int32)
+            self._nn = np.full(rows, -1, dtype=np.int64)
+            self._nn_dist = np.full(rows, self._far, dtype=np.int32)
+
+    # ----- Truy vấn -----
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __iter__(self) -> Iterator[Solution]:
+        """Duyệt lời giải theo cost tăng dần."""
+        return (self._sols[slot] for _, _, slot in self._order)
+
+    def __contains__(self, sol: Solution) -> bool:
+        return pattern_key(sol.open_I, sol.open_J) in self._keys
+
+    def has_key(self, key: bytes) -> bool:
+        """Pattern (dạng pattern_key) đã có trong population chưa."""
+        return key in self._keys
+
+    @property
+    def best(self) -> Solution:
+        return self._sols[self._order[0][2]]
+
+    def top(self, n: int) -> List[int]:
+        """Slot của n lời giải tốt nhất (theo cost tăng dần)."""
+        return [slot for _, _, slot in self._order[:n]]
+
+    def solution(self, slot: int) -> Solution:
+        return self._sols[slot]
+
+    def rows(self, slots: Sequence[int]) -> np.ndarray:
+        """Ma trận pattern uint8 của các slot (mỗi hàng 1 lời giải)."""
+        return self._mat[np.asarray(slots, dtype=np.int64)]
+
+    # ----- Cập nhật -----
+    def add(self, sol: Solution, key: Optional[bytes] = None) -> bool:
+        """
+        Thêm lời giải. Trả về False nếu trùng pattern đã có, hoặc nếu chính
+        lời giải mới bị loại ngay (population đầy và nó là ứng viên bị loại).
+        """
+        if key is None:
+            key = pattern_key(sol.open_I, sol.open_J)
+        if key in self._keys:
+            return False
+
+        if not self._free:
+            self._grow()
+        slot = self._free.pop()
+        self._mat[slot, :self.n_I] = np.asarray(sol.open_I, dtype=np.uint8)
+        self._mat[slot, self.n_I:] = np.asarray(sol.open_J, dtype=np.uint8)
+        self._sols[slot] = sol
+        self._slot_key[slot] = key
+        self._keys[key] = slot
+        if self.evict == 'diversity':
+            self._link(slot)
+        bisect.insort(self._order, (sol.cost, self._seq, slot))
+        self._seq += 1
+
+        if self.maxsize is not None and len(self._order) > self.maxsize:
+            return self._evict_one() != slot
+        return True
+
+    def _grow(self):
+        """Gấp đôi số hàng của ma trận pattern (khi không giới hạn maxsize)."""
+        old = len(self._sols)
+        self._mat = np.vstack((self._mat, np.zeros_like(self._mat)))
+        self._sols += [None] * old
+        self._slot_key += [None] * old
+        self._free += list(range(2 * old - 1, old - 1, -1))
+
+    def _link(self, slot: int):
+        """Khoảng cách từ slot mới tới mọi lời giải đang có: O(n·F)."""
+        occ = np.array([t for _, _, t in self._order], dtype=np.int64)
+        if not len(occ):
+            return
+        d = (self._mat[occ] != self._mat[slot]).sum(axis=1).astype(np.int32)
+        self._dist[slot, occ] = d
+        self._dist[occ, slot] = d
+        a = int(np.argmin(d))
+        self._nn[slot], self._nn_dist[slot] = occ[a], d[a]
+        closer = d < self._nn_dist[occ]
+        self._nn[occ[closer]] = slot
+        self._nn_dist[occ[closer]] = d[closer]
+
+    def _unlink(self, slot: int):
+        """Bỏ slot khỏi bảng khoảng cách; tìm lại láng giềng cho lời giải mất láng giềng."""
+        self._dist[slot, :] = self._far
+        self._dist[:, slot] = self._far
+        self._nn[slot], self._nn_dist[slot] = -1, self._far
+        for t in np.flatnonzero(self._nn == slot).tolist():
+            a = int(np.argmin(self._dist[t]))
+            self._nn[t], self._nn_dist[t] = a, self._dist[t, a]
+
+    def _evict_one(self) -> int:
+        """Loại 1 lời giải theo chính sách evict; trả về slot bị loại."""
+        if self.evict == 'worst' or len(self._order) <= self.elite:
+            pos = len(self._order) - 1
+        else:
+            # Khoảng cách tới láng giềng gần nhất của các lời giải ngoài elite
+            cand = np.array([slot for _, _, slot in self._order[self.elite:]], dtype=np.int64)
+            nearest = self._nn_dist[cand]
+            # Giống nhau nhất; cùng khoảng cách thì loại lời giải cost cao hơn
+            pos = self.elite + int(np.flatnonzero(nearest == nearest.min())[-1])
+
+        _, _, slot = self._order.pop(pos)
+        if self.evict == 'diversity':
+            self._unlink(slot)
+        del self._keys[self._slot_key[slot]]
+        self._sols[slot] = None
+        self._slot_key[slot] = None
+        self._free.append(slot)
+        self.n_evicted += 1
+        return slot
@@ -1,12 +1,16 @@
 # -*- coding: utf-8 -*-
 """
 Script chạy batch experiments và tạo bảng kết quả đẹp
+
+Các thí nghiệm chạy song song trên process pool (batch_tscflp.run_batch),
+mỗi thí nghiệm có ngân sách thời gian riêng.
 """
-import subprocess
-import sys
+import argparse
 import time
 from pathlib import Path
 
+from batch_tscflp import BatchJob, run_batch
+
 # Danh sách thí nghiệm
 EXPERIMENTS = [
     # Dataset 50 - Nhóm cơ bản
@@ -23,102 +27,31 @@ EXPERIMENTS = [
     ("PSC3-C3-100.txt", 42, 12, 4),
 ]
 
-def run_single_experiment(instance_file, seed, iters, pop_size):
-    """Chạy 1 thí nghiệm và trả về kết quả"""
-    cmd = [
-        sys.executable,
-        "compare_greedy_mfss.py",
-        "--instance", f"OCA/TSCFL/Instances/{instance_file}",
-        "--seed", str(seed),
-        "--iters", str(iters),
-        "--pop-size", str(pop_size)
-    ]
-    
-    try:
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=300,
-            encoding='utf-8',
-            errors='replace'
+def make_jobs(experiments, instances_dir, time_budget, lower_bound=None):
+    """
+    Tạo danh sách BatchJob từ các bộ (file, seed, iterations, pop_size).
+    lower_bound: 'lp' / 'lagrangian' / 'both' để báo cáo gap (tốn 1 phần
+    ngân sách của mỗi job), None = không tính.
+    """
+    return [
+        BatchJob(
+            instance=str(Path(instances_dir) / instance_file),
+            seed=seed,
+            params={'Npop': pop_size, 'max_iter': iters, 'tinit': 30.0},
+            time_budget=time_budget,
+            lower_bound=lower_bound
         )
-        
-        if result.returncode == 0:
-            output = result.stdout
-            
-            # Parse kết quả
-            greedy_cost = None
-            mfss_cost = None
-            greedy_time = None
-            mfss_time = None
-            improvement = None
-            
-            for line in output.split('\n'):
-                # Tìm dòng có "✓ MFSS TỐT HƠN Greedy"
-                if "TỐT HƠN Greedy" in line:
-                    try:
-                        parts = line.split()
-                        for part in parts:
-                            if '%' in part:
-                                improvement = float(part.replace('%', ''))
-                                break
-                    except:
-                        pass
-                
-                # Tìm chi phí Greedy
-                elif "Chi phí:" in line and greedy_cost is None:
-                    try:
-                        cost_str = line.split("Chi phí:")[1].strip()
-                        greedy_cost = float(cost_str.replace(',', ''))
-                    except:
-                        pass
-                
-                # Tìm thời gian Greedy
-                elif "Greedy hoàn thành trong" in line:
-                    try:
-                        time_str = line.split("trong")[1].split("s")[0].strip()
-                        greedy_time = float(time_str)
-                    except:
-                        pass
-                
-                # Tìm thời gian MFSS
-                elif "MFSS hoàn thành trong" in line:
-                    try:
-                        time_str = line.split("trong")[1].split("s")[0].strip()
-                        mfss_time = float(time_str)
-                        # MFSS cost là dòng sau
-                        next_lines = output.split(line)[1].split('\n')
-                        for next_line in next_lines[:5]:
-                            if "Chi phí:" in next_line:
-                                cost_str = next_line.split("Chi phí:")[1].strip()
-                                mfss_cost = float(cost_str.replace(',', ''))
-                                break
-                    except:
-                        pass
-            
-            return {
-                'success': True,
-                'greedy_cost': greedy_cost,
-                'mfss_cost': mfss_cost,
-                'greedy_time': greedy_time,
-                'mfss_time': mfss_time,
-                'improvement': improvement
-            }
-        else:
-            return {'success': False, 'error': 'Failed'}
-    
-    except Exception as e:
-        return {'success': False, 'error': str(e)}
+        for instance_file, seed, iters, pop_size in experiments
+    ]
 
-def print_table(results):
+def print_table(experiments, results):
     """In bảng kết quả đẹp"""
     print("\n" + "="*120)
     print("KẾT QUẢ THÍ NGHIỆM SO SÁNH GREEDY vs MFSS")
     print("="*120)
     
     # Header
-    header = f"{'STT':<5} {'Dataset':<20} {'Seed':<6} {'Iter':<6} {'Pop':<5} {'Greedy Cost':>15} {'MFSS Cost':>15} {'Cải thiện':>10} {'Greedy(s)':>10} {'MFSS(s)':>10}"
+    header = f"{'STT':<5} {'Dataset':<20} {'Seed':<6} {'Iter':<6} {'Pop':<5} {'Greedy Cost':>15} {'MFSS Cost':>15} {'Cải thiện':>10} {'Greedy(s)':>10} {'MFSS(s)':>10} {'Gap MFSS':>10}"
     print(header)
     print("-"*120)
     
@@ -126,7 +59,7 @@ def print_table(results):
     total_improvement = 0
     success_count = 0
     
-    for i, (exp, res) in enumerate(zip(EXPERIMENTS, results), 1):
+    for i, (exp, res) in enumerate(zip(experiments, results), 1):
         instance, seed, iters, pop = exp
         
         if res['success'] and res['improvement'] is not None:
@@ -136,8 +69,9 @@ def print_table(results):
             improvement = f"{res['improvement']:.2f}%" if res['improvement'] else "N/A"
             greedy_time = f"{res['greedy_time']:.1f}" if res['greedy_time'] else "N/A"
             mfss_time = f"{res['mfss_time']:.1f}" if res['mfss_time'] else "N/A"
+            mfss_gap = f"{res['mfss_gap']:.2f}%" if res['mfss_gap'] is not None else "N/A"
             
-            row = f"{i:<5} {dataset_name:<20} {seed:<6} {iters:<6} {pop:<5} {greedy_cost:>15} {mfss_cost:>15} {improvement:>10} {greedy_time:>10} {mfss_time:>10}"
+            row = f"{i:<5} {dataset_name:<20} {seed:<6} {iters:<6} {pop:<5} {greedy_cost:>15} {mfss_cost:>15} {improvement:>10} {greedy_time:>10} {mfss_time:>10} {mfss_gap:>10}"
             print(row)
             
             if res['improvement']:
@@ -145,7 +79,7 @@ def print_table(results):
                 success_count += 1
         else:
             dataset_name = instance.replace('.txt', '')
-            row = f"{i:<5} {dataset_name:<20} {seed:<6} {iters:<6} {pop:<5} {'ERROR':>15} {'ERROR':>15} {'N/A':>10} {'N/A':>10} {'N/A':>10}"
+            row = f"{i:<5} {dataset_name:<20} {seed:<6} {iters:<6} {pop:<5} {'ERROR':>15} {'ERROR':>15} {'N/A':>10} {'N/A':>10} {'N/A':>10} {'N/A':>10}"
             print(row)
     
     print("="*120)
@@ -160,39 +94,56 @@ def print_table(results):
     print("="*120 + "\n")
 
 def main():
+    parser = argparse.ArgumentParser(description='Chạy batch thí nghiệm Greedy vs MFSS')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Số process chạy các thí nghiệm song song (default: 0 = tất cả CPU)')
+    parser.add_argument('--time-budget', type=float, default=300.0,
+                        help='Ngân sách thời gian (giây) cho mỗi thí nghiệm (default: 300)')
+    parser.add_argument('--instances-dir', type=str, default='OCA/TSCFL/Instances',
+                        help='Thư mục chứa file instance')
+    parser.add_argument('--lower-bound', choices=['none', 'lp', 'lagrangian', 'both'], default='none',
+                        help="Tính cận dưới để báo cáo gap MFSS, trong ngân sách của mỗi "
+                             "thí nghiệm (default: none)")
+    parser.add_argument('--all', action='store_true',
+                        help='Chạy mọi file PSC*.txt trong --instances-dir (seed=42, iters=15, pop=4)')
+    args = parser.parse_args()
+    
+    experiments = EXPERIMENTS
+    if args.all:
+        experiments = [(p.name, 42, 15, 4) for p in sorted(Path(args.instances_dir).glob('PSC*.txt'))]
+    
     print("\n" + "="*120)
-    print(f"BẮT ĐẦU CHẠY {len(EXPERIMENTS)} THÍ NGHIỆM")
+    print(f"BẮT ĐẦU CHẠY {len(experiments)} THÍ NGHIỆM")
     print("="*120 + "\n")
     
-    results = []
+    def progress(t, result):
+        instance, seed, iters, pop = experiments[t]
+        status = f"✓ {result.improvement:.2f}%" if result.success else "✗ Lỗi"
+        print(f"[{t + 1}/{len(experiments)}] {instance} (seed={seed}, iters={iters}, pop={pop}) "
+              f"{status} ({result.elapsed:.0f}s)", flush=True)
+        if not result.success:
+            print(result.error)
     
-    for i, (instance, seed, iters, pop) in enumerate(EXPERIMENTS, 1):
-        print(f"[{i}/{len(EXPERIMENTS)}] Chạy {instance} (seed={seed}, iters={iters}, pop={pop})...", end=' ', flush=True)
-        
-        start = time.time()
-        result = run_single_experiment(instance, seed, iters, pop)
-        elapsed = time.time() - start
-        
-        if result['success'] and result['improvement'] is not None:
-            print(f"✓ {result['improvement']:.2f}% ({elapsed:.0f}s)")
-        else:
-            print(f"✗ Lỗi ({elapsed:.0f}s)")
-        
-        results.append(result)
+    start = time.time()
+    lower_bound = None if args.lower_bound == 'none' else args.lower_bound
+    batch = run_batch(make_jobs(experiments, args.instances_dir, args.time_budget, lower_bound),
+                      n_workers=args.workers, on_result=progress)
+    results = [r.to_dict() for r in batch]
+    print(f"\n→ Tổng thời gian: {time.time() - start:.0f}s")
     
     # In bảng kết quả
-    print_table(results)
+    print_table(experiments, results)
     
     # Lưu ra file text
     with open('results_table.txt', 'w', encoding='utf-8') as f:
         f.write("KẾT QUẢ THÍ NGHIỆM SO SÁNH GREEDY vs MFSS\n")
         f.write("="*120 + "\n\n")
         
-        header = f"{'STT':<5} {'Dataset':<20} {'Seed':<6} {'Iter':<6} {'Pop':<5} {'Greedy Cost':>15} {'MFSS Cost':>15} {'Cải thiện':>10} {'Greedy(s)':>10} {'MFSS(s)':>10}\n"
+        header = f"{'STT':<5} {'Dataset':<20} {'Seed':<6} {'Iter':<6} {'Pop':<5} {'Greedy Cost':>15} {'MFSS Cost':>15} {'Cải thiện':>10} {'Greedy(s)':>10} {'MFSS(s)':>10} {'Gap MFSS':>10}\n"
         f.write(header)
         f.write("-"*120 + "\n")
         
-        for i, (exp, res) in enumerate(zip(EXPERIMENTS, results), 1):
+        for i, (exp, res) in enumerate(zip(experiments, results), 1):
             instance, seed, iters, pop = exp
             
             if res['success'] and res['improvement'] is not None:
@@ -202,8 +153,9 @@ def main():
                 improvement = f"{res['improvement']:.2f}%" if res['improvement'] else "N/A"
                 greedy_time = f"{res['greedy_time']:.1f}" if res['greedy_time'] else "N/A"
                 mfss_time = f"{res['mfss_time']:.1f}" if res['mfss_time'] else "N/A"
+                mfss_gap = f"{res['mfss_gap']:.2f}%" if res['mfss_gap'] is not None else "N/A"
                 
-                row = f"{i:<5} {dataset_name:<20} {seed:<6} {iters:<6} {pop:<5} {greedy_cost:>15} {mfss_cost:>15} {improvement:>10} {greedy_time:>10} {mfss_time:>10}\n"
+                row = f"{i:<5} {dataset_name:<20} {seed:<6} {iters:<6} {pop:<5} {greedy_cost:>15} {mfss_cost:>15} {improvement:>10} {greedy_time:>10} {mfss_time:>10} {mfss_gap:>10}\n"
                 f.write(row)
         
         f.write("\n")
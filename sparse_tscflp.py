@@ -0,0 +1,666 @@
+# sparse_tscflp.py
+"""
+MILP của TSCFLP trên tập cung thưa (candidate arcs).
+
+Ở nghiệm tối ưu hầu hết w(i,j), z(j,k) bằng 0: mỗi khách thường chỉ được
+1-2 kho gần nhất phục vụ. Vì vậy thay vì tạo biến cho mọi cặp (J×K biến z),
+model chỉ giữ:
+    - k_depots kho rẻ nhất cho mỗi customer   (cung z)
+    - k_plants nhà máy rẻ nhất cho mỗi kho    (cung w)
+lấy từ NeighborIndex (thứ tự láng giềng tính 1 lần cho mỗi instance).
+
+Cung gộp + tái chèn cung (re-insertion): mỗi customer k / kho j có thêm 1
+biến gộp r[k] / s[j] đại diện cho MỌI cung bị cắt của nó, với chi phí là
+đường rẻ nhất qua cung bị cắt (xem _CutArcs). Model thưa + cung gộp là
+relaxation của model đầy đủ nên giá trị MILP tối ưu của nó là cận dưới.
+Sau mỗi lần giải MILP:
+    - pattern vừa tìm được đánh giá bằng min-cost flow trên mọi cung
+      (lời giải khả thi, cận trên);
+    - nếu cận dưới >= cận trên (luôn đúng khi r = s = 0) thì lời giải là tối
+      ưu như trên model đầy đủ;
+    - ngược lại các cung bị cắt rẻ nhất của customer / kho còn dùng cung gộp
+      được thêm vào model và giải lại.
+
+Column generation (mode 'colgen'): bắt đầu LP relaxation từ rất ít cung, sinh
+thêm cung bằng pricing trên giá trị đối ngẫu đến khi hội tụ, rồi mới giải MILP
+(xem solve_colgen_mip). Reduced cost của cung theo đối ngẫu (xem
+TSCFLPModel.duals):
+    w(i,j): c[i,j] - (alpha[i] + gamma[j])
+    z(j,k): d[j,k] - (beta[j] - gamma[j] + delta[k])
+"""
+
+import time
+from dataclasses import replace
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pulp as pl
+
+from tscflp_core import TSCFLPInstance, TSCFLPModel, Solution
+from mincostflow_tscflp import solve_fixed_pattern
+
+# Cung = (mảng chỉ số hàng, mảng chỉ số cột), VD: (j, k) với cung z
+Arcs = Tuple[np.ndarray, np.ndarray]
+
+
+class NeighborIndex:
+    """
+    Chỉ số láng giềng gần nhất theo chi phí vận chuyển.
+
+    Với ma trận chi phí M (hàng = nguồn, cột = đích), lưu cho mỗi cột
+    `depth` hàng rẻ nhất đã sắp tăng dần:
+        - M = d (J×K): kho gần nhất của mỗi customer
+        - M = c (I×J): nhà máy gần nhất của mỗi kho
+    Thứ tự được tính theo khối cột nên không cần giữ cả ma trận sắp xếp
+    (dùng được với d memmap / AbsDistanceCost).
+    """
+
+    def __init__(self, inst: TSCFLPInstance, depth: int = 16):
+        self.inst = inst
+        self.depth = depth
+        self._order: Dict[str, np.ndarray] = {}
+
+    def _matrix(self, which: str):
+        return self.inst.d if which == 'z' else self.inst.c
+
+    def order(self, which: str) -> np.ndarray:
+        """Mảng (depth, n_cột): chỉ số hàng rẻ nhất của từng cột, tăng dần."""
+        if which not in self._order:
+            M = self._matrix(which)
+            n_rows, n_cols = M.shape
+            L = min(self.depth, n_rows)
+            out = np.empty((L, n_cols), dtype=np.int32)
+            block = 4096
+            for c0 in range(0, n_cols, block):
+                sub = np.asarray(M[:, c0:c0 + block])
+                if L < n_rows:
+                    part = np.argpartition(sub, L - 1, axis=0)[:L]
+                else:
+                    part = np.broadcast_to(np.arange(n_rows)[:, None], sub.shape)
+                vals = np.take_along_axis(sub, part, axis=0)
+                srt = np.argsort(vals, axis=0, kind='stable')
+                out[:, c0:c0 + block] = np.take_along_axis(part, srt, axis=0)
+            self._order[which] = out
+        return self._order[which]
+
+    def nearest(self,
+                which: str,
+                k: int,
+                allowed_rows: np.ndarray,
+                cols: Optional[np.ndarray] = None) -> Arcs:
+        """
+        Cung tới k hàng rẻ nhất trong số hàng được phép (allowed_rows: mask
+        bool) cho mỗi cột trong `cols` (mặc định: mọi cột).
+
+        Cột nào không đủ k hàng được phép trong `depth` láng giềng đã lưu thì
+        được tính lại trực tiếp trên các hàng được phép.
+        """
+        M = self._matrix(which)
+        n_rows, n_cols = M.shape
+        if cols is None:
+            cols = np.arange(n_cols)
+        cols = np.asarray(cols, dtype=np.int64)
+        rows_ok = np.flatnonzero(allowed_rows)
+        k = min(k, len(rows_ok))
+        if k <= 0 or len(cols) == 0:
+            return np.empty(0, np.int64), np.empty(0, np.int64)
+
+        order = self.order(which)[:, cols]                  # (L, n)
+        ok = allowed_rows[order]
+        sel = ok & (np.cumsum(ok, axis=0) <= k)
+        r_idx, c_pos = np.nonzero(sel)
+        rows, out_cols = order[r_idx, c_pos].astype(np.int64), cols[c_pos]
+
+        # Cột thiếu láng giềng được phép → tính lại trên các hàng được phép
+        short = np.flatnonzero(sel.sum(axis=0) < k)
+        if len(short):
+            sub = np.asarray(M[np.ix_(rows_ok, cols[short])])
+            best = np.argsort(sub, axis=0, kind='stable')[:k]
+            rows = np.concatenate((rows[~np.isin(c_pos, short)], rows_ok[best].ravel()))
+            out_cols = np.concatenate((out_cols[~np.isin(c_pos, short)],
+                                       np.broadcast_to(cols[short], best.shape).ravel()))
+        return rows, out_cols
+
+
+def get_neighbor_index(inst: TSCFLPInstance) -> NeighborIndex:
+    """NeighborIndex dùng chung của instance (gắn vào `inst._neighbors`)."""
+    idx = getattr(inst, '_neighbors', None)
+    if idx is None:
+        idx = NeighborIndex(inst)
+        inst._neighbors = idx
+    return idx
+
+
+def _allowed(n: int, fixed_part: Dict[int, int]) -> np.ndarray:
+    """Mask facility không bị fix đóng."""
+    mask = np.ones(n, dtype=bool)
+    for t, val in fixed_part.items():
+        if int(val) == 0:
+            mask[t] = False
+    return mask
+
+
+def candidate_arcs(inst: TSCFLPInstance,
+                   k_depots: int,
+                   k_plants: int,
+                   allowed_I: np.ndarray,
+                   allowed_J: np.ndarray) -> Tuple[Arcs, Arcs]:
+    """
+    Tập cung ban đầu: k_depots kho gần nhất cho mỗi customer và k_plants
+    nhà máy gần nhất cho mỗi kho (chỉ trong các facility được phép mở).
+    """
+    idx = get_neighbor_index(inst)
+    arcs_z = idx.nearest('z', k_depots, allowed_J)
+    arcs_w = idx.nearest('w', k_plants, allowed_I, cols=np.flatnonzero(allowed_J))
+    return arcs_w, arcs_z
+
+
+def price_arcs(inst: TSCFLPInstance,
+               model: TSCFLPModel,
+               rows_I: np.ndarray,
+               rows_J: np.ndarray,
+               rc_tol: float = 1e-6,
+               max_per_col: Optional[int] = None) -> Tuple[Arcs, Arcs]:
+    """
+    Pricing: các cung chưa có trong model, có reduced cost âm theo giá trị
+    đối ngẫu của lần solve_lp() gần nhất.
+
+    Chỉ xét cung w(i,j) với i ∈ rows_I, j ∈ rows_J và z(j,k) với j ∈ rows_J.
+    Ngưỡng: reduced cost < -rc_tol·(1 + chi phí cung). max_per_col giới hạn
+    số cung thêm cho mỗi kho (w) / mỗi customer (z), ưu tiên reduced cost
+    âm nhất (None = thêm hết).
+    """
+    du = model.duals()
+    rows_I = np.asarray(rows_I, dtype=np.int64)
+    rows_J = np.asarray(rows_J, dtype=np.int64)
+
+    def select(cost: np.ndarray, rc: np.ndarray, r_idx: np.ndarray) -> Arcs:
+        neg = rc < -rc_tol * (1.0 + np.abs(cost))
+        if max_per_col is not None:
+            # Giữ max_per_col cung âm nhất của mỗi cột
+            rank = np.argsort(np.argsort(np.where(neg, rc, np.inf), axis=0,
+                                         kind='stable'), axis=0)
+            neg &= rank < max_per_col
+        r, col = np.nonzero(neg)
+        return r_idx[r], col
+
+    if len(rows_I) and len(rows_J):
+        cost_w = np.asarray(inst.c[np.ix_(rows_I, rows_J)])
+        rc_w = cost_w - du['alpha'][rows_I, None] - du['gamma'][None, rows_J]
+        wi, wc = select(cost_w, rc_w, rows_I)
+        new_w = (wi, rows_J[wc])
+    else:
+        new_w = (np.empty(0, np.int64), np.empty(0, np.int64))
+
+    if len(rows_J):
+        cost_z = np.asarray(inst.d[rows_J])
+        rc_z = (cost_z - (du['beta'] - du['gamma'])[rows_J, None]
+                - du['delta'][None, :])
+        new_z = select(cost_z, rc_z, rows_J)
+    else:
+        new_z = (np.empty(0, np.int64), np.empty(0, np.int64))
+
+    # Bỏ các cung đã có (phòng sai số số học của solver)
+    keep_w = [(i, j) not in model.w for i, j in zip(*new_w)]
+    keep_z = [(j, k) not in model.z for j, k in zip(*new_z)]
+    return ((new_w[0][keep_w], new_w[1][keep_w]),
+            (new_z[0][keep_z], new_z[1][keep_z]))
+
+
+class _CutArcs:
+    """
+    Biến gộp thay cho các cung bị cắt khỏi model thưa:
+        r[k] >= 0 : hàng tới customer k qua một cung z(j,k) bị cắt, chi phí
+                    rho[k] = min_{z(j,k) bị cắt} (d[j,k] + min_i c[i,j]);
+                    chỉ có mặt trong ràng buộc demand của k
+        s[j] >= 0 : hàng vào kho j qua một cung w(i,j) bị cắt, chi phí
+                    sigma[j] = min_{w(i,j) bị cắt} c[i,j];
+                    chỉ có mặt trong ràng buộc bảo toàn luồng của j
+    (min lấy trên các facility không bị fix đóng). r, s không chiếm capacity.
+
+    Lời giải bất kỳ của model đầy đủ chuyển được thành lời giải của model
+    thưa + r, s không đắt hơn: dồn luồng trên cung bị cắt vào r / s và bớt
+    luồng vào kho tương ứng. Do đó tối ưu của model thưa + r, s là CẬN DƯỚI
+    của model đầy đủ (cùng fixed-set); nếu lời giải tối ưu có r = s = 0 thì
+    nó khả thi, tức là tối ưu cho model đầy đủ.
+
+    r, s bị khóa về 0 (model thưa thuần) cho đến khi activate().
+    """
+
+    def __init__(self, inst: TSCFLPInstance, model: TSCFLPModel,
+                 rows_I: np.ndarray, rows_J: np.ndarray):
+        self.inst, self.model = inst, model
+        self.rows_I = np.asarray(rows_I, dtype=np.int64)
+        self.rows_J = np.asarray(rows_J, dtype=np.int64)
+        nI, nJ, nK = len(inst.I), len(inst.J), len(inst.K)
+
+        # Chỉ số đầy đủ → vị trí trong rows_I / rows_J
+        self._pos_I = np.full(nI, -1, dtype=np.int64)
+        self._pos_I[self.rows_I] = np.arange(len(self.rows_I))
+        self._pos_J = np.full(nJ, -1, dtype=np.int64)
+        self._pos_J[self.rows_J] = np.arange(len(self.rows_J))
+
+        # Chi phí w giữa các facility được phép và đường rẻ nhất tới mỗi kho
+        self._c = np.asarray(inst.c[np.ix_(self.rows_I, self.rows_J)], dtype=np.float64)
+        self._c_min = self._c.min(axis=0)
+
+        # Cung đã có trong model và số cung mỗi cột lúc tính chi phí (-1: chưa tính)
+        self._has_w = np.zeros(self._c.shape, dtype=bool)
+        self._has_z = np.zeros((len(self.rows_J), nK), dtype=bool)
+        self._cnt_w = np.full(len(self.rows_J), -1, dtype=np.int64)
+        self._cnt_z = np.full(nK, -1, dtype=np.int64)
+        self._n_arcs = (-1, -1)
+        self.active = False
+        # Số lần mỗi customer / kho đã phải tái chèn cung (xem expand)
+        self._rounds_z = np.zeros(nK, dtype=np.int64)
+        self._rounds_w = np.zeros(len(self.rows_J), dtype=np.int64)
+        # Chênh lệch chi phí cung gộp so với cung rẻ nhất đã có (xem expand)
+        self._gap_z = np.full(nK, np.inf)
+        self._gap_w = np.full(len(self.rows_J), np.inf)
+
+        cons = model.prob.constraints
+        self.r = {k: pl.LpVariable(f"r_{k}", lowBound=0, upBound=0) for k in inst.K}
+        self.s = {j: pl.LpVariable(f"s_{j}", lowBound=0, upBound=0)
+                  for j in self.rows_J.tolist()}
+        for k, v in self.r.items():
+            cons[f"dem_{k}"].expr[v] = 1
+        for j, v in self.s.items():
+            cons[f"flow_{j}"].expr[v] = 1
+
+        # r, s không chiếm capacity → thêm ràng buộc tổng capacity (đúng cho cả
+        # model đầy đủ) để pattern của mọi lời giải đều đủ capacity, tức là
+        # khả thi khi có mọi cung
+        total = float(inst.D.sum())
+        model.prob += pl.lpSum(float(inst.U[i]) * model.x[i] for i in model.I) >= total, "capI_tot"
+        model.prob += pl.lpSum(float(inst.V[j]) * model.y[j] for j in model.J) >= total, "capJ_tot"
+
+    def _cost_z(self, cols: np.ndarray) -> np.ndarray:
+        """Chi phí d[j,k] + min_i c[i,j] của mọi cung z tới các customer cols."""
+        return (np.asarray(self.inst.d[np.ix_(self.rows_J, cols)], dtype=np.float64)
+                + self._c_min[:, None])
+
+    @staticmethod
+    def _split(cost: np.ndarray, has: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Chi phí rẻ nhất qua cung bị cắt (rho / sigma) và phần đắt hơn cung đã có."""
+        cut = np.where(has, np.inf, cost).min(axis=0)
+        kept = np.where(has, cost, np.inf).min(axis=0)
+        with np.errstate(invalid='ignore'):
+            return cut, np.where(np.isfinite(cut), cut - kept, np.inf)
+
+    @staticmethod
+    def _set_cost(obj, var: pl.LpVariable, cost: float):
+        """Đặt chi phí biến gộp; không còn cung bị cắt → khóa biến về 0."""
+        if np.isfinite(cost):
+            obj[var] = float(cost)
+            var.upBound = None
+        else:
+            obj[var] = 0.0
+            var.upBound = 0
+
+    def activate(self):
+        """Mở khóa r, s (chi phí tính trên tập cung hiện tại của model)."""
+        self.active = True
+        self.update()
+
+    def update(self):
+        """Đồng bộ với tập cung của model: tính lại rho / sigma của cột có cung mới."""
+        model = self.model
+        if not self.active or self._n_arcs == (len(model.w), len(model.z)):
+            return
+        self._n_arcs = (len(model.w), len(model.z))
+        obj = model.prob.objective
+
+        keys = np.array(list(model.z), dtype=np.int64).reshape(-1, 2)
+        self._has_z[self._pos_J[keys[:, 0]], keys[:, 1]] = True
+        cnt = self._has_z.sum(axis=0)
+        cols = np.flatnonzero(cnt != self._cnt_z)
+        self._cnt_z = cnt
+        if len(cols):
+            rho, self._gap_z[cols] = self._split(self._cost_z(cols), self._has_z[:, cols])
+            for k, cost in zip(cols.tolist(), rho.tolist()):
+                self._set_cost(obj, self.r[k], cost)
+
+        keys = np.array(list(model.w), dtype=np.int64).reshape(-1, 2)
+        self._has_w[self._pos_I[keys[:, 0]], self._pos_J[keys[:, 1]]] = True
+        cnt = self._has_w.sum(axis=0)
+        cols = np.flatnonzero(cnt != self._cnt_w)
+        self._cnt_w = cnt
+        if len(cols):
+            sigma, self._gap_w[cols] = self._split(self._c[:, cols], self._has_w[:, cols])
+            for j, cost in zip(self.rows_J[cols].tolist(), sigma.tolist()):
+                self._set_cost(obj, self.s[j], cost)
+
+    def zero_start(self):
+        """r = s = 0 trong MIP start (lời giải khả thi không dùng cung gộp)."""
+        for v in list(self.r.values()) + list(self.s.values()):
+            v.setInitialValue(0.0)
+
+    def used(self, tol: float = 1e-7) -> Tuple[np.ndarray, np.ndarray]:
+        """Customer / kho mà lời giải hiện tại của model còn dùng r / s."""
+        K_s = [k for k, v in self.r.items() if (v.value() or 0.0) > tol]
+        J_s = [j for j, v in self.s.items() if (v.value() or 0.0) > tol]
+        return np.array(K_s, dtype=np.int64), np.array(J_s, dtype=np.int64)
+
+    def expand(self, K_s: np.ndarray, J_s: np.ndarray,
+               n_depots: int, n_plants: int) -> Tuple[Arcs, Arcs]:
+        """
+        Cung bị cắt cần tái chèn khi lời giải dùng r[k] (k ∈ K_s) / s[j] (j ∈ J_s).
+
+        Customer / kho được mở rộng: K_s / J_s và mọi customer / kho khác mà
+        cung gộp chỉ đắt hơn cung rẻ nhất đã có không quá mức của K_s / J_s
+        (thường là nơi solver sẽ chuyển sang dùng cung gộp ở vòng sau). Mỗi
+        nơi được thêm n_depots cung z (theo d + min c) / n_plants cung w bị
+        cắt rẻ nhất, gấp đôi mỗi lần nơi đó lại phải mở rộng.
+        """
+        def cheapest(cost: np.ndarray, has: np.ndarray, n: np.ndarray):
+            cost = np.where(has, np.inf, cost)
+            best = np.argsort(cost, axis=0, kind='stable')[:int(n.max())]
+            ok = (np.isfinite(np.take_along_axis(cost, best, axis=0))
+                  & (np.arange(len(best))[:, None] < n[None, :]))
+            return best[ok], np.broadcast_to(np.arange(cost.shape[1]), best.shape)[ok]
+
+        new_z = (np.empty(0, np.int64), np.empty(0, np.int64))
+        if len(K_s):
+            cols = np.flatnonzero(self._gap_z <= self._gap_z[K_s].max())
+            r, c = cheapest(self._cost_z(cols), self._has_z[:, cols],
+                            n_depots << self._rounds_z[cols])
+            self._rounds_z[cols] += 1
+            new_z = (self.rows_J[r], cols[c])
+        new_w = (np.empty(0, np.int64), np.empty(0, np.int64))
+        if len(J_s):
+            cols = np.flatnonzero(self._gap_w <= self._gap_w[self._pos_J[J_s]].max())
+            r, c = cheapest(self._c[:, cols], self._has_w[:, cols],
+                            n_plants << self._rounds_w[cols])
+            self._rounds_w[cols] += 1
+            new_w = (self.rows_I[r], self.rows_J[cols[c]])
+        return new_w, new_z
+
+
+def _infeasible(inst: TSCFLPInstance) -> Solution:
+    return Solution(cost=float('inf'), open_I=[0]*len(inst.I), open_J=[0]*len(inst.J))
+
+
+def _capacity_ok(inst: TSCFLPInstance,
+                 allowed_I: np.ndarray,
+                 allowed_J: np.ndarray) -> bool:
+    """Capacity của các facility còn được phép mở có đủ tổng demand không."""
+    total_demand = float(inst.D.sum())
+    return (inst.U[allowed_I].sum() >= total_demand - 1e-6
+            and inst.V[allowed_J].sum() >= total_demand - 1e-6)
+
+
+def _deadline(time_limit: Optional[float]):
+    """
+    Cặp hàm (remaining, expired) của time_limit: remaining() là thời gian còn
+    lại (0 khi đã hết, None nếu không giới hạn). Caller phải kiểm tra
+    expired() trước khi giải thêm MILP / LP nào.
+    """
+    start = time.time()
+
+    def remaining() -> Optional[float]:
+        if time_limit is None:
+            return None
+        return max(0.0, time_limit - (time.time() - start))
+
+    def expired() -> bool:
+        return time_limit is not None and time.time() - start >= time_limit
+
+    return remaining, expired
+
+
+def _mip_with_reinsertion(inst: TSCFLPInstance,
+                          model: TSCFLPModel,
+                          cut: _CutArcs,
+                          k_depots: int,
+                          k_plants: int,
+                          max_rounds: int,
+                          remaining, expired,
+                          verbose: bool,
+                          incumbent: Optional[Solution] = None) -> Solution:
+    """
+    Vòng lặp: giải MILP trên tập cung hiện tại + biến gộp r, s (xem _CutArcs)
+    → đánh giá pattern tìm được bằng min-cost flow trên MỌI cung → nếu lời
+    giải MILP còn dùng r[k] / s[j] thì tái chèn k_depots / k_plants cung bị
+    cắt rẻ nhất của customer k / kho j và giải lại.
+
+    Có time limit thì vòng đầu giải model thưa thuần (r, s khóa về 0):
+    relaxation có r, s còn lỏng khi ít cung, còn model thưa thuần cho nhanh
+    cận trên tốt. Sau đó mới bật r, s để chứng minh tối ưu.
+
+    Dừng khi giá trị MILP tối ưu (cận dưới của model đầy đủ) không nhỏ hơn
+    lời giải tốt nhất: khi đó lời giải trả về có optimal = True như model
+    đầy đủ. Lời giải tốt nhất (ban đầu là incumbent, nếu có) là MIP start của
+    mỗi lần giải.
+    """
+    # Chỉ giữ lời giải khả thi cho model đầy đủ (luồng từ min-cost flow).
+    # Cờ optimal của incumbent không nói gì về fixed-set này → bỏ
+    best = replace(incumbent, optimal=False) if incumbent is not None else _infeasible(inst)
+    if remaining() is None:
+        cut.activate()
+    for r in range(max_rounds):
+        if expired():
+            return best
+
+        # ===== Giải MILP trên tập cung hiện tại + cung gộp =====
+        cut.update()
+        if best.cost < float('inf'):
+            cut.zero_start()
+        sol = model.solve(time_limit=remaining(), verbose=verbose,
+                          incumbent=best if best.cost < float('inf') else None)
+        if sol.cost == float('inf') and cut.active:
+            return best
+        proven = model.prob.sol_status == pl.LpSolutionOptimal
+        lb = pl.value(model.prob.objective) if proven else None
+
+        # ===== Luồng tối ưu của pattern vừa tìm trên mọi cung =====
+        if sol.cost < float('inf'):
+            exact = solve_fixed_pattern(inst, sol.open_I, sol.open_J)
+            if exact.cost < best.cost:
+                best = exact
+        if not cut.active:
+            # Xong vòng model thưa thuần (hoặc nó không khả thi vì thiếu cung)
+            cut.activate()
+            continue
+
+        # Hết time limit trước khi MILP được chứng minh tối ưu
+        if lb is None:
+            return best
+        K_s, J_s = cut.used()
+        if (len(K_s) == 0 and len(J_s) == 0) or best.cost <= lb + 1e-9 * abs(lb):
+            return replace(best, optimal=True)
+        if expired():
+            return best
+
+        # ===== Tái chèn cung bị cắt của customer / kho còn dùng cung gộp =====
+        n_new = model.add_arcs(*cut.expand(K_s, J_s, k_depots, k_plants))
+        if n_new == 0:
+            return best
+        if verbose:
+            print(f"  → Tái chèn {n_new} cung ({len(K_s)} customer, {len(J_s)} kho "
+                  f"dùng cung gộp; cận dưới {lb:,.2f})")
+
+    return best
+
+
+def solve_sparse_mip(inst: TSCFLPInstance,
+                     time_limit: Optional[float] = None,
+                     fixed: Optional[Dict[str, Dict[int, int]]] = None,
+                     verbose: bool = True,
+                     k_depots: int = 5,
+                     k_plants: int = 5,
+                     max_rounds: int = 20,
+                     backend: str = 'cbc',
+                     incumbent: Optional[Solution] = None) -> Solution:
+    """
+    Giải MILP TSCFLP trên tập cung thưa + cung gộp (xem _CutArcs), tái chèn
+    cung bị cắt đến khi chứng minh được tối ưu như trên model đầy đủ.
+
+    Cùng giao diện với solve_full_mip (fixed, time_limit, verbose); được gọi
+    qua solve_full_mip(..., mode='sparse').
+
+    Parameters
+    ----------
+    k_depots, k_plants : int
+        Số kho gần nhất mỗi customer / nhà máy gần nhất mỗi kho trong tập
+        cung ban đầu; cũng là số cung tái chèn mỗi vòng cho mỗi customer /
+        kho còn dùng cung gộp.
+    max_rounds : int
+        Số vòng (giải MILP + tái chèn cung) tối đa.
+    backend : str
+        Solver dùng cho MILP (xem tscflp_core.make_solver).
+    incumbent : Solution, optional
+        Lời giải khả thi cho fixed-set: cung của nó được thêm vào model và nó
+        được dùng làm MIP start; kết quả không tệ hơn incumbent.
+
+    Returns
+    -------
+    Solution
+        Lời giải tốt nhất, luồng tối ưu trên toàn bộ cung cho pattern của nó
+        (min-cost flow). optimal = True khi đã chứng minh tối ưu trong
+        time_limit và max_rounds vòng: cùng kết quả với mode 'full'.
+    """
+    remaining, expired = _deadline(time_limit)
+    fixed = fixed or {}
+    allowed_I = _allowed(len(inst.I), fixed.get('I', {}))
+    allowed_J = _allowed(len(inst.J), fixed.get('J', {}))
+
+    # Capacity của các facility còn được phép mở không đủ demand → không khả thi,
+    # không cần dựng model
+    if not _capacity_ok(inst, allowed_I, allowed_J):
+        return _infeasible(inst)
+
+    # ===== BƯỚC 1: Dựng model trên tập cung k-láng giềng =====
+    arcs_w, arcs_z = candidate_arcs(inst, k_depots, k_plants, allowed_I, allowed_J)
+    model = TSCFLPModel(inst, arcs_w=arcs_w, arcs_z=arcs_z, backend=backend,
+                        I_act=np.flatnonzero(allowed_I), J_act=np.flatnonzero(allowed_J))
+    model.set_fixed(fixed)
+    cut = _CutArcs(inst, model, np.flatnonzero(allowed_I), np.flatnonzero(allowed_J))
+
+    # ===== BƯỚC 2-3: Giải MILP + tái chèn cung =====
+    return _mip_with_reinsertion(inst, model, cut, k_depots, k_plants, max_rounds,
+                                 remaining, expired, verbose, incumbent)
+
+
+def solve_colgen_mip(inst: TSCFLPInstance,
+                     time_limit: Optional[float] = None,
+                     fixed: Optional[Dict[str, Dict[int, int]]] = None,
+                     verbose: bool = True,
+                     k_start: int = 3,
+                     max_per_col: int = 2,
+                     max_lp_rounds: int = 100,
+                     max_rounds: int = 20,
+                     backend: str = 'cbc',
+                     incumbent: Optional[Solution] = None) -> Solution:
+    """
+    Column generation (sinh cột) cho TSCFLP, rồi mới branch.
+
+    - BƯỚC 1: Restricted master = LP relaxation trên k_start cung rẻ nhất
+      của mỗi customer / mỗi kho (chỉ facility không bị fix đóng).
+    - BƯỚC 2: Lặp: giải LP → pricing MỌI cung (giữa các facility được phép)
+      theo giá trị đối ngẫu → thêm tối đa max_per_col cung âm nhất cho mỗi
+      kho / customer, đến khi không còn cung có reduced cost âm. Khi đó LP
+      trên tập cung sinh ra bằng LP relaxation của model đầy đủ.
+      Hết max_lp_rounds mà chưa hội tụ thì 1 lượt pricing cuối thêm MỌI
+      cung có reduced cost âm.
+    - BƯỚC 3: Chỉ khi đó mới giải MILP (branch-and-bound) trên tập cung đó
+      + cung gộp, kèm tái chèn cung bị cắt như mode 'sparse' (xem
+      _mip_with_reinsertion): không time limit thì cho đúng tối ưu của
+      'full'.
+
+    Cùng giao diện với solve_full_mip; được gọi qua
+    solve_full_mip(..., mode='colgen'). Dùng khi model đầy đủ quá lớn để
+    dựng: số biến chỉ tăng theo số cung thực sự cần. Với instance vừa và
+    nhỏ, tập cung của LP thường quá ít cho MILP nên phải tái chèn nhiều vòng:
+    chậm hơn 'full' / 'sparse' (nhất là với CBC). incumbent: như
+    solve_sparse_mip (cung của nó có sẵn trong restricted master).
+    """
+    remaining, expired = _deadline(time_limit)
+    fixed = fixed or {}
+    allowed_I = _allowed(len(inst.I), fixed.get('I', {}))
+    allowed_J = _allowed(len(inst.J), fixed.get('J', {}))
+    if not _capacity_ok(inst, allowed_I, allowed_J):
+        return _infeasible(inst)
+    rows_I, rows_J = np.flatnonzero(allowed_I), np.flatnonzero(allowed_J)
+
+    # ===== BƯỚC 1: Restricted master trên ít cung =====
+    k = k_start
+    model = TSCFLPModel(inst, *candidate_arcs(inst, k, k, allowed_I, allowed_J),
+                        backend=backend, I_act=rows_I, J_act=rows_J)
+    model.set_fixed(fixed)
+    if incumbent is not None:
+        model.set_start(incumbent)  # Thêm sẵn các cung của incumbent
+    # Cung gộp khóa về 0 trong lúc sinh cột: restricted master phải là model
+    # đầy đủ bớt cột thì pricing hội tụ mới cho đúng LP relaxation đầy đủ
+    cut = _CutArcs(inst, model, rows_I, rows_J)
+
+    # ===== BƯỚC 2: Sinh cột trên LP relaxation =====
+    converged = False
+    for r in range(max_lp_rounds):
+        if expired():
+            break
+        lp = model.solve_lp(remaining())
+        if lp == float('inf'):
+            # Restricted master không khả thi (thiếu cung) → mở rộng láng giềng
+            if k >= max(len(inst.I), len(inst.J)):
+                return _infeasible(inst)
+            k *= 2
+            model.add_arcs(*candidate_arcs(inst, k, k, allowed_I, allowed_J))
+            continue
+        n_new = model.add_arcs(*price_arcs(inst, model, rows_I, rows_J,
+                                           max_per_col=max_per_col))
+        if verbose:
+            print(f"  → CG vòng {r + 1}: LP = {lp:,.2f}, thêm {n_new} cung "
+                  f"(model: {len(model.w) + len(model.z)} cung)")
+        if n_new == 0:
+            converged = True
+            break
+
+    # Chưa hội tụ sau max_lp_rounds vòng → 1 lượt pricing cuối theo đối ngẫu
+    # của LP gốc, thêm MỌI cung có reduced cost âm trước khi branch
+    if not converged and not expired():
+        if model.solve_lp(remaining()) < float('inf'):
+            n_new = model.add_arcs(*price_arcs(inst, model, rows_I, rows_J))
+            if verbose:
+                print(f"  → CG pricing cuối: thêm {n_new} cung")
+
+    # ===== BƯỚC 3: Branch trên tập cung đã sinh + cung gộp =====
+    return _mip_with_reinsertion(inst, model, cut, k, k, max_rounds,
+                                 remaining, expired, verbose, incumbent)
+
+
+if __name__ == "__main__":
+    import sys
+    import io
+
+    # Fix UTF-8 encoding cho console Windows
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+    from tscflp_core import load_instance_from_file, solve_full_mip
+
+    # Kiểm tra: không time limit thì 'sparse' / 'colgen' phải cho đúng chi phí
+    # tối ưu của 'full' (dùng instance nhỏ để model đầy đủ giải nhanh)
+    # python sparse_tscflp.py [file instance ...] [--backend cbc|highs]
+    args = sys.argv[1:]
+    backend = 'cbc'
+    if '--backend' in args:
+        pos = args.index('--backend')
+        backend = args[pos + 1]
+        del args[pos:pos + 2]
+    files = args or ["OCA/TSCFL/Instances/PSC1-C1-50.txt"]
+
+    print("=" * 70)
+    print(f"KIỂM TRA SPARSE / COLGEN = FULL (backend={backend})")
+    print("=" * 70)
+    n_fail = 0
+    for filepath in files:
+        inst = load_instance_from_file(filepath)
+        full = solve_full_mip(inst, mode='full', backend=backend, verbose=False)
+        print(f"{filepath}: full = {full.cost:,.2f}")
+        for mode in ('sparse', 'colgen'):
+            sol = solve_full_mip(inst, mode=mode, backend=backend, verbose=False)
+            ok = (sol.optimal and abs(sol.cost - full.cost)
+                  <= 1e-6 * max(1.0, abs(full.cost)))
+            n_fail += not ok
+            print(f"  {mode:<7}= {sol.cost:,.2f} {'✓' if ok else '✗ KHÁC FULL'}")
+    print("=" * 70)
+    sys.exit(1 if n_fail else 0)
@@ -0,0 +1,57 @@
+# test_cache_tscflp.py
+"""Kiểm tra SubproblemCache với lời giải subproblem lấy từ incumbent."""
+
+import numpy as np
+
+import tscflp_core
+from tscflp_core import TSCFLPInstance, solve_full_mip, fits_fixed
+from cache_tscflp import SubproblemCache
+
+
+def _small_instance(seed: int = 0) -> TSCFLPInstance:
+    rng = np.random.default_rng(seed)
+    return TSCFLPInstance(f=rng.uniform(50, 100, 4), U=rng.uniform(50, 80, 4),
+                          g=rng.uniform(20, 50, 6), V=rng.uniform(30, 60, 6),
+                          D=rng.uniform(5, 15, 10),
+                          c=rng.uniform(1, 10, (4, 6)), d=rng.uniform(1, 10, (6, 10)))
+
+
+def _fixed_from(sol, free_I=(0,), free_J=(0, 1)):
+    """Fixed-set theo pattern của sol, trừ vài facility tự do."""
+    return {'I': {i: v for i, v in enumerate(sol.open_I) if i not in free_I},
+            'J': {j: v for j, v in enumerate(sol.open_J) if j not in free_J}}
+
+
+def test_timed_out_subproblem_does_not_inherit_incumbent_optimal(monkeypatch):
+    inst = _small_instance()
+    B = solve_full_mip(inst, verbose=False)
+    assert B.optimal
+    F = _fixed_from(B)
+    assert fits_fixed(B, F)
+
+    # Solver hết time limit mà không có lời giải → rơi về incumbent B
+    monkeypatch.setattr(tscflp_core.TSCFLPModel, '_run',
+                        lambda self, time_limit, warm_start: False)
+    sol = solve_full_mip(inst, time_limit=0.3, fixed=F, verbose=False, incumbent=B)
+    assert sol.cost == B.cost
+    assert not sol.optimal
+
+    cache = SubproblemCache(len(inst.I), len(inst.J))
+    cache.put(F, 0.3, sol)
+    assert cache.get(F, 0.3) is sol
+    assert cache.get(F, 5.0) is None  # Time limit lớn hơn → phải giải lại
+
+
+def test_proven_subproblem_keeps_incumbent_and_is_reused():
+    inst = _small_instance()
+    B = solve_full_mip(inst, verbose=False)
+    F = _fixed_from(B)
+
+    # B tối ưu toàn cục nên cũng tối ưu cho F: solver chứng minh được
+    sol = solve_full_mip(inst, fixed=F, verbose=False, incumbent=B)
+    assert abs(sol.cost - B.cost) <= 1e-6 * B.cost
+    assert sol.optimal
+
+    cache = SubproblemCache(len(inst.I), len(inst.J))
+    cache.put(F, 0.3, sol)
+    assert cache.get(F, 5.0) is sol
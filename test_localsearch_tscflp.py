@@ -0,0 +1,47 @@
+# test_localsearch_tscflp.py
+"""Kiểm tra local search có lọc move (screen) và giới hạn thời gian."""
+
+import numpy as np
+
+from tscflp_core import TSCFLPInstance
+from greedy_tscflp import greedy_tscflp
+from mincostflow_tscflp import solve_fixed_pattern
+from localsearch_tscflp import local_search, _generate_moves, _apply_move, _MoveScreen
+
+
+def _instance(seed: int = 0):
+    rng = np.random.default_rng(seed)
+    nI, nJ, nK = 6, 25, 120
+    xp, xd, xc = rng.uniform(0, 100, nI), rng.uniform(0, 100, nJ), rng.uniform(0, 100, nK)
+    D = rng.uniform(1, 10, nK)
+    return TSCFLPInstance(c=np.abs(xp[:, None] - xd), d=np.abs(xd[:, None] - xc),
+                          f=rng.uniform(200, 400, nI), U=np.full(nI, D.sum() / 3),
+                          g=rng.uniform(50, 150, nJ), V=np.full(nJ, D.sum() / 6), D=D)
+
+
+def test_screened_search_improves_and_keeps_exact_cost():
+    inst = _instance()
+    start = greedy_tscflp(inst)
+    sol = local_search(inst, start, time_limit=None)
+    assert sol.cost <= start.cost + 1e-6
+    exact = solve_fixed_pattern(inst, sol.open_I, sol.open_J, use_cache=False)
+    assert abs(exact.cost - sol.cost) <= 1e-9 * sol.cost
+
+
+def test_screen_estimate_finds_an_improving_move():
+    inst = _instance(1)
+    sol = solve_fixed_pattern(inst, np.ones(len(inst.f), dtype=int),
+                              np.ones(len(inst.g), dtype=int), use_cache=False)
+    moves = _generate_moves(inst, sol, 3)
+    est = _MoveScreen(inst, sol)
+    # Mở mọi facility → đóng bớt phải lời; move có Δ ước lượng nhỏ nhất cũng phải lời thật
+    best = min(moves, key=est.delta)
+    assert est.delta(best) < 0
+    assert solve_fixed_pattern(inst, *_apply_move(sol, best), use_cache=False).cost < sol.cost
+
+
+def test_time_limit_zero_returns_start():
+    inst = _instance(2)
+    start = greedy_tscflp(inst)
+    start = solve_fixed_pattern(inst, start.open_I, start.open_J, use_cache=False)
+    assert local_search(inst, start, time_limit=0.0).cost == start.cost
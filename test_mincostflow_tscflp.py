@@ -0,0 +1,76 @@
+# test_mincostflow_tscflp.py
+"""Kiểm tra bộ giải min-cost flow với chi phí dày / lười."""
+
+import numpy as np
+
+from tscflp_core import TSCFLPInstance, AbsDistanceCost, SparseFlow, solve_full_mip
+from mincostflow_tscflp import min_cost_flow, solve_fixed_pattern, _FlowNetwork
+
+
+def _instances(seed: int = 0):
+    """Cùng 1 instance với c, d dạng mảng dày và dạng AbsDistanceCost."""
+    rng = np.random.default_rng(seed)
+    nI, nJ, nK = 5, 30, 80
+    xp, xd, xc = rng.uniform(0, 100, nI), rng.uniform(0, 100, nJ), rng.uniform(0, 100, nK)
+    D = rng.uniform(1, 10, nK)
+    data = dict(f=rng.uniform(10, 20, nI), U=np.full(nI, D.sum() / 3),
+                g=rng.uniform(5, 10, nJ), V=np.full(nJ, D.sum() / 8), D=D)
+    dense = TSCFLPInstance(c=np.abs(xp[:, None] - xd), d=np.abs(xd[:, None] - xc), **data)
+    lazy = TSCFLPInstance(c=AbsDistanceCost(xp, xd), d=AbsDistanceCost(xd, xc), **data)
+    return dense, lazy, rng
+
+
+def test_lazy_costs_match_dense_and_flows_are_sparse(monkeypatch):
+    dense, lazy, rng = _instances()
+    # Khối nhỏ để d được đọc qua nhiều khối
+    monkeypatch.setattr(_FlowNetwork, '_BLOCK', 64)
+    for _ in range(5):
+        open_I = (rng.random(len(dense.f)) < 0.8).astype(int)
+        open_J = (rng.random(len(dense.g)) < 0.5).astype(int)
+        cost, w, z = min_cost_flow(dense, open_I, open_J)
+        cost_lazy, _, _ = min_cost_flow(lazy, open_I, open_J)
+        assert isinstance(w, SparseFlow) and isinstance(z, SparseFlow)
+        assert z.shape == (len(dense.g), len(dense.D))
+        if not np.isfinite(cost):
+            assert not np.isfinite(cost_lazy) and z.nnz == 0
+            continue
+        assert abs(cost - cost_lazy) <= 1e-9 * cost
+        transport = (w.to_dense() * dense.c).sum() + (z.to_dense() * dense.d).sum()
+        fixed = dense.f[open_I > 0].sum() + dense.g[open_J > 0].sum()
+        assert abs(fixed + transport - cost) <= 1e-9 * cost
+        assert np.allclose(z.col_sums(), dense.D)
+
+
+def test_warm_start_matches_cold_solve():
+    dense, lazy, rng = _instances(1)
+    open_I = np.ones(len(dense.f), dtype=int)
+    open_J = (rng.random(len(dense.g)) < 0.6).astype(int)
+    base = solve_fixed_pattern(lazy, open_I, open_J, use_cache=False)
+    for j in range(5):
+        moved = open_J.copy()
+        moved[j] ^= 1
+        warm = solve_fixed_pattern(lazy, open_I, moved, use_cache=False, warm_start=base)
+        cold = solve_fixed_pattern(dense, open_I, moved, use_cache=False)
+        assert abs(warm.cost - cold.cost) <= 1e-9 * max(1.0, cold.cost)
+
+
+def test_matches_mip_on_fixed_pattern():
+    dense, _, rng = _instances(2)
+    open_I = np.ones(len(dense.f), dtype=int)
+    open_J = (rng.random(len(dense.g)) < 0.5).astype(int)
+    fixed = {'I': dict(enumerate(open_I.tolist())), 'J': dict(enumerate(open_J.tolist()))}
+    mip = solve_full_mip(dense, fixed=fixed, verbose=False)
+    sol = solve_fixed_pattern(dense, open_I, open_J, use_cache=False)
+    assert abs(sol.cost - mip.cost) <= 1e-6 * mip.cost
+
+
+def test_warm_start_detects_infeasible_pattern():
+    dense, _, _ = _instances(3)
+    open_I = np.ones(len(dense.f), dtype=int)
+    open_J = np.ones(len(dense.g), dtype=int)
+    base = solve_fixed_pattern(dense, open_I, open_J, use_cache=False)
+    # Chỉ còn 2 kho (mỗi kho chứa D.sum() / 8) → không đủ capacity
+    moved = np.zeros_like(open_J)
+    moved[:2] = 1
+    sol = solve_fixed_pattern(dense, open_I, moved, use_cache=False, warm_start=base)
+    assert not np.isfinite(sol.cost) and sol.z is None
@@ -0,0 +1,42 @@
+# test_population_tscflp.py
+"""Kiểm tra Population có giới hạn."""
+
+import numpy as np
+import pytest
+
+from tscflp_core import Solution
+from population_tscflp import Population
+
+
+def _sols(n: int, n_I: int = 4, n_J: int = 8, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return [Solution(cost=float(rng.uniform(100, 200)),
+                     open_I=rng.integers(0, 2, n_I).tolist(),
+                     open_J=rng.integers(0, 2, n_J).tolist())
+            for _ in range(n)]
+
+
+def test_diversity_requires_maxsize():
+    with pytest.raises(ValueError):
+        Population(4, 8, maxsize=None, evict='diversity')
+
+
+def test_diversity_keeps_size_and_elite():
+    P = Population(4, 8, maxsize=5, evict='diversity', elite=2)
+    best = float('inf')
+    for S in _sols(40):
+        if S not in P:  # Pattern mới
+            best = min(best, S.cost)
+        P.add(S)
+    assert len(P) == 5
+    assert P._dist.shape == (6, 6)
+    kept = [S.cost for S in P]
+    assert kept == sorted(kept)
+    # Lời giải tốt nhất từng thêm luôn còn (thuộc elite)
+    assert P.best.cost == best
+
+
+def test_unbounded_worst_grows():
+    P = Population(4, 8, maxsize=None, evict='worst')
+    added = sum(P.add(S) for S in _sols(100))
+    assert len(P) == added and P.n_evicted == 0
@@ -0,0 +1,59 @@
+# test_tscflp_core.py
+"""Kiểm tra đọc instance qua cache nhị phân."""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from tscflp_core import load_instance_from_file, _cache_dir
+
+
+def _write_instance(path):
+    rng = np.random.default_rng(0)
+    I, J, K = 3, 4, 6
+    lines = [f"{I} {J} {K}"]
+    lines += [f"{v:.3f}" for v in rng.uniform(50, 100, I)]            # f
+    lines += [f"{v:.3f}" for v in rng.uniform(20, 50, J)]             # g
+    lines += [f"{v:.3f}" for v in rng.uniform(20, 40, I)]             # U
+    lines += [f"{v:.3f} {x:.3f}" for v, x in rng.uniform(10, 30, (J, 2))]  # V x
+    lines += [f"{v:.3f} {x:.3f}" for v, x in rng.uniform(1, 10, (K, 2))]   # D x
+    path.write_text("\n".join(lines) + "\n")
+
+
+def _truncate_npy(cdir):
+    p = os.path.join(cdir, 'f.npy')
+    with open(p, 'rb') as fh:
+        raw = fh.read()
+    with open(p, 'wb') as fh:
+        fh.write(raw[:len(raw) - 8])
+
+
+def _empty_npy(cdir):
+    open(os.path.join(cdir, 'g.npy'), 'wb').close()
+
+
+def _meta_not_dict(cdir):
+    with open(os.path.join(cdir, 'meta.json'), 'w') as fh:
+        json.dump([1, 2, 3], fh)
+
+
+def _mismatched_arrays(cdir):
+    np.save(os.path.join(cdir, 'D.npy'), np.ones(2))
+
+
+@pytest.mark.parametrize('corrupt', [_truncate_npy, _empty_npy, _meta_not_dict,
+                                     _mismatched_arrays])
+def test_broken_cache_is_rebuilt(tmp_path, corrupt):
+    src = tmp_path / 'inst.txt'
+    _write_instance(src)
+    ref = load_instance_from_file(str(src))
+    corrupt(_cache_dir(str(src)))
+
+    inst = load_instance_from_file(str(src))
+    for name in ('f', 'g', 'U', 'V', 'D', 'c', 'd'):
+        assert np.array_equal(getattr(inst, name), getattr(ref, name))
+    # Cache đã được ghi lại và đọc lại được
+    again = load_instance_from_file(str(src))
+    assert np.array_equal(again.d, ref.d)
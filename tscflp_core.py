@@ -3,11 +3,18 @@
 
 - Định nghĩa cấu trúc dữ liệu cho bài toán TSCFLP
 - Cài đặt hàm solve_full_mip() dùng PuLP để giải MILP
+  (model được dựng 1 lần cho mỗi instance và tái sử dụng)
 - Hàm load_instance_from_file() để đọc dataset từ file
+  (có cache nhị phân cạnh file để các lần đọc sau không phải parse lại)
 """
 
-from dataclasses import dataclass
-from typing import List, Dict, Optional
+import json
+import os
+import shutil
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from typing import List, Dict, Optional, Tuple
+import numpy as np
 import pulp as pl
 
 
@@ -33,56 +40,788 @@ class TSCFLPInstance:
                là nhỏ nhất, đồng thời thỏa:
                     - capacity của nhà máy, kho
                     - thỏa mãn demand khách hàng
+
+    Dữ liệu được lưu dưới dạng mảng NumPy float64 liên tục (contiguous) để các
+    heuristic dùng được phép toán vector hóa. Có thể truyền vào list như cũ
+    (tự động chuyển sang mảng), và code cũ kiểu c[i][j], sum(D), len(f)
+    vẫn chạy bình thường.
+
+    c, d cũng có thể là np.memmap float64 (file trên đĩa, xem cost_mode='mmap'
+    của load_instance_from_file): khi đó được giữ nguyên, không copy vào RAM,
+    và khi pickle chỉ gửi đường dẫn file chứ không gửi dữ liệu.
+    Hoặc là AbsDistanceCost (cost_mode='lazy'): chỉ lưu tọa độ, chi phí được
+    tính khi truy cập.
     """
     # primary facilities (nhà máy)
-    f: List[float]     # fixed cost mở tại i
-    U: List[float]     # capacity (công suất tối đa) tại i
+    f: np.ndarray     # fixed cost mở tại i, shape (|I|,)
+    U: np.ndarray     # capacity (công suất tối đa) tại i, shape (|I|,)
 
     # secondary facilities (kho)
-    g: List[float]     # fixed cost mở tại j
-    V: List[float]     # capacity tại j
+    g: np.ndarray     # fixed cost mở tại j, shape (|J|,)
+    V: np.ndarray     # capacity tại j, shape (|J|,)
 
     # customers
-    D: List[float]     # nhu cầu của khách hàng k
+    D: np.ndarray     # nhu cầu của khách hàng k, shape (|K|,)
 
     # transport costs
-    c: List[List[float]]  # chi phí đơn vị i -> j
-    d: List[List[float]]  # chi phí đơn vị j -> k
+    c: np.ndarray     # chi phí đơn vị i -> j, shape (|I|, |J|)
+    d: np.ndarray     # chi phí đơn vị j -> k, shape (|J|, |K|)
 
     def __post_init__(self):
         """
-        Sau khi khởi tạo, tạo luôn các tập chỉ số I, J, K
-        để dùng cho vòng lặp cho tiện.
+        Sau khi khởi tạo:
+        - chuyển dữ liệu (list hoặc mảng) sang mảng float64 liên tục
+        - tạo luôn các tập chỉ số I, J, K để dùng cho vòng lặp cho tiện.
         """
+        for name in ('f', 'U', 'g', 'V', 'D', 'c', 'd'):
+            val = getattr(self, name)
+            if (isinstance(val, np.memmap) and val.dtype == np.float64
+                    and val.flags.c_contiguous):
+                continue  # Ma trận trên đĩa: đọc zero-copy, không nạp vào RAM
+            if isinstance(val, AbsDistanceCost):
+                continue  # Chi phí lười từ tọa độ: giữ nguyên
+            setattr(self, name, np.ascontiguousarray(val, dtype=np.float64))
+
         self.I = list(range(len(self.f)))   # index nhà máy
         self.J = list(range(len(self.g)))   # index kho
         self.K = list(range(len(self.D)))   # index khách hàng
 
+    def __getstate__(self):
+        """
+        Khi pickle instance (VD: gửi sang process khác), bỏ các thuộc tính
+        cache nội bộ (bắt đầu bằng '_', VD: model MILP đã dựng) vì chúng
+        không pickle được và có thể dựng lại ở phía bên kia.
+        """
+        state = {}
+        for k, v in self.__dict__.items():
+            if k.startswith('_'):
+                continue
+            if isinstance(v, np.memmap) and v.filename is not None:
+                # Ma trận memory-mapped: chỉ gửi vị trí file, bên kia tự map lại
+                v = _MemmapRef(v.filename, v.shape, v.offset)
+            state[k] = v
+        return state
+
+    def __setstate__(self, state):
+        """Khôi phục instance từ pickle, map lại các ma trận trên đĩa."""
+        for k, v in state.items():
+            if isinstance(v, _MemmapRef):
+                state[k] = v.open()
+        self.__dict__.update(state)
+
+
+@dataclass
+class _MemmapRef:
+    """Tham chiếu tới 1 ma trận float64 memory-mapped (dùng khi pickle)."""
+    filename: str
+    shape: Tuple[int, ...]
+    offset: int
+
+    def open(self) -> np.memmap:
+        return np.memmap(self.filename, dtype=np.float64, mode='r',
+                         shape=self.shape, offset=self.offset)
+
+
+class AbsDistanceCost:
+    """
+    Ma trận chi phí "lười": M[r, s] = |a[r] - b[s]|, chỉ lưu 2 vector tọa độ.
+
+    Dùng cho instance có chi phí tính từ tọa độ (xem cost_mode='lazy' của
+    load_instance_from_file): bộ nhớ O(len(a) + len(b)) thay vì O(len(a)·len(b)).
+    Giá trị chỉ được tính khi cần, bằng phép toán vector hóa trên phần được
+    truy cập, và dùng được như mảng NumPy ở những chỗ heuristic cần:
+        - M[r], M[r][s], M[:, s], M[rows], M[np.ix_(rows, cols)], M[mask]...
+          (cùng ngữ nghĩa chỉ số với ndarray, trừ Ellipsis/None)
+        - M.sum(axis=None/0/1): tính bằng sort + prefix sum, O((m+n) log n),
+          không dựng ma trận
+        - np.asarray(M), M.tolist(): dựng ma trận dày (chỉ khi thật sự cần,
+          VD: model MILP đầy đủ)
+    Hàng truy cập đơn lẻ M[r] được tính theo khối block_rows hàng và giữ lại
+    cache_blocks khối dùng gần nhất (LRU).
+    """
+
+    def __init__(self, a: np.ndarray, b: np.ndarray,
+                 block_rows: int = 64, cache_blocks: int = 8):
+        self.a = np.ascontiguousarray(a, dtype=np.float64)
+        self.b = np.ascontiguousarray(b, dtype=np.float64)
+        self.block_rows = max(1, block_rows)
+        self.cache_blocks = cache_blocks
+        self._blocks: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self._sorted_b = None  # (b đã sort, prefix sum) cho sum(axis=1)
+        self._sorted_a = None  # (a đã sort, prefix sum) cho sum(axis=0)
+
+    # ----- Thuộc tính giống ndarray -----
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return (len(self.a), len(self.b))
+
+    ndim = 2
+    dtype = np.dtype(np.float64)
+
+    def __len__(self) -> int:
+        return len(self.a)
+
+    def __repr__(self) -> str:
+        return f"AbsDistanceCost(shape={self.shape})"
+
+    def __getstate__(self):
+        """Pickle chỉ gửi tọa độ, không gửi các khối đã cache."""
+        state = self.__dict__.copy()
+        state['_blocks'] = OrderedDict()
+        return state
+
+    # ----- Truy cập phần tử -----
+    def _block(self, bi: int) -> np.ndarray:
+        """Khối hàng thứ bi (có cache LRU)."""
+        blk = self._blocks.get(bi)
+        if blk is None:
+            r0 = bi * self.block_rows
+            blk = np.abs(self.a[r0:r0 + self.block_rows, None] - self.b[None, :])
+            if self.cache_blocks > 0:
+                self._blocks[bi] = blk
+                while len(self._blocks) > self.cache_blocks:
+                    self._blocks.popitem(last=False)
+        else:
+            self._blocks.move_to_end(bi)
+        return blk
+
+    def row(self, r: int) -> np.ndarray:
+        """Hàng r (vector độ dài len(b)), lấy từ khối đã cache nếu có."""
+        r = int(r)
+        if r < 0:
+            r += len(self.a)
+        bi, off = divmod(r, self.block_rows)
+        return self._block(bi)[off].copy()
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) == 1:
+            if isinstance(key[0], (int, np.integer)):
+                return self.row(key[0])
+            key = (key[0], slice(None))
+        rk, ck = (_as_index(k) for k in key)
+        ar, bc = self.a[rk], self.b[ck]
+        if _is_fancy(rk) and _is_fancy(ck):
+            # 2 chỉ số mảng: broadcast như ndarray (từng cặp, hoặc np.ix_)
+            return np.abs(ar - bc)
+        # Có ít nhất 1 chỉ số int/slice: tích ngoài (outer) như ndarray
+        return np.abs(np.subtract.outer(ar, bc))
+
+    # ----- Phép toán -----
+    @staticmethod
+    def _abs_sums(x: np.ndarray, pts: Tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+        """sum_s |x[r] - p[s]| với mọi r, dùng p đã sort và prefix sum."""
+        p, pre = pts
+        n = len(p)
+        idx = np.searchsorted(p, x)          # số điểm p < x
+        left = x * idx - pre[idx]            # Σ (x - p) với p < x
+        right = (pre[n] - pre[idx]) - x * (n - idx)  # Σ (p - x) với p ≥ x
+        return left + right
+
+    @staticmethod
+    def _prefix(v: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        p = np.sort(v)
+        return p, np.concatenate(([0.0], np.cumsum(p)))
+
+    def sum(self, axis: Optional[int] = None):
+        """Tổng theo hàng (axis=1), theo cột (axis=0) hoặc toàn bộ (None)."""
+        if axis in (1, -1):
+            if self._sorted_b is None:
+                self._sorted_b = self._prefix(self.b)
+            return self._abs_sums(self.a, self._sorted_b)
+        if axis == 0:
+            if self._sorted_a is None:
+                self._sorted_a = self._prefix(self.a)
+            return self._abs_sums(self.b, self._sorted_a)
+        if axis is None:
+            return float(self.sum(axis=1).sum())
+        raise ValueError(f"axis không hợp lệ: {axis}")
+
+    def __array__(self, dtype=None, copy=None):
+        M = np.abs(self.a[:, None] - self.b[None, :])
+        return M if dtype is None else M.astype(dtype, copy=False)
+
+    def tolist(self) -> list:
+        return np.asarray(self).tolist()
+
+
+def _as_index(k):
+    """Chuẩn hóa 1 chỉ số: mask bool → mảng vị trí, list → mảng."""
+    if isinstance(k, (int, np.integer, slice)):
+        return k
+    k = np.asarray(k)
+    if k.dtype == bool:
+        return np.flatnonzero(k)
+    return k
+
+
+def _is_fancy(k) -> bool:
+    """Chỉ số dạng mảng (advanced indexing) hay int/slice."""
+    return not isinstance(k, (int, np.integer, slice))
+
+
+@dataclass
+class SparseFlow:
+    """
+    Ma trận luồng dạng thưa (COO): chỉ lưu các ô có luồng > 0.
+
+    Ở nghiệm tối ưu hầu hết w(i,j), z(j,k) bằng 0 (mỗi khách thường chỉ được
+    1-2 kho phục vụ), nên lưu (row, col, value) với chỉ số int32 gọn hơn rất
+    nhiều so với ma trận dày I×J, J×K — đủ rẻ để lưu cho cả population MFSS.
+    """
+    rows: np.ndarray        # int32, chỉ số hàng (i với w, j với z)
+    cols: np.ndarray        # int32, chỉ số cột (j với w, k với z)
+    vals: np.ndarray        # float64, lượng hàng
+    shape: Tuple[int, int]  # kích thước ma trận dày tương ứng
+
+    @classmethod
+    def from_dense(cls, M: np.ndarray, tol: float = 1e-9) -> "SparseFlow":
+        """Tạo từ ma trận dày, bỏ các ô có luồng <= tol."""
+        M = np.asarray(M, dtype=np.float64)
+        rows, cols = np.nonzero(M > tol)
+        return cls(rows=rows.astype(np.int32), cols=cols.astype(np.int32),
+                   vals=M[rows, cols], shape=M.shape)
+
+    @property
+    def nnz(self) -> int:
+        """Số ô có luồng."""
+        return len(self.vals)
+
+    def to_dense(self) -> np.ndarray:
+        """Chuyển về ma trận dày (dùng khi cần cập nhật luồng)."""
+        M = np.zeros(self.shape)
+        M[self.rows, self.cols] = self.vals
+        return M
+
+    def to_csr(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Dạng CSR (indptr, indices, data): luồng ra của hàng r nằm ở
+        indices/data[indptr[r]:indptr[r+1]].
+        """
+        order = np.lexsort((self.cols, self.rows))
+        indptr = np.zeros(self.shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.rows, minlength=self.shape[0]), out=indptr[1:])
+        return indptr, self.cols[order], self.vals[order]
+
+    def row_sums(self) -> np.ndarray:
+        """Tổng luồng theo hàng (VD: hàng xuất của plant i với w)."""
+        return np.bincount(self.rows, weights=self.vals, minlength=self.shape[0])
+
+    def col_sums(self) -> np.ndarray:
+        """Tổng luồng theo cột (VD: hàng khách k nhận được với z)."""
+        return np.bincount(self.cols, weights=self.vals, minlength=self.shape[1])
+
 
 @dataclass
 class Solution:
     """
-    Lưu lời giải ở mức "facility mở hay không" + cost.
-    (Phần luồng chi tiết w(i,j), z(j,k) không lưu lại ở đây
-     vì mục đích chính là so sánh cost và pattern mở/đóng.)
+    Lưu lời giải ở mức "facility mở hay không" + cost,
+    kèm luồng chi tiết w(i,j), z(j,k) dạng thưa (nếu bộ giải cung cấp).
+
+    Luồng dùng để: lấy kế hoạch vận chuyển thực tế mà không cần giải lại,
+    làm điểm khởi đầu (warm start) và đánh giá lại tăng dần (local search).
     """
     cost: float
     open_I: List[int]   # 0/1 cho từng nhà máy i
     open_J: List[int]   # 0/1 cho từng kho j
+    w: Optional[SparseFlow] = field(default=None, repr=False)  # luồng plant -> depot
+    z: Optional[SparseFlow] = field(default=None, repr=False)  # luồng depot -> customer
+    optimal: bool = field(default=False, repr=False)  # Solver chứng minh tối ưu (cho fixed-set đã giải)
 
 
 # =====================================================================
 # 2. HÀM GIẢI MILP ĐẦY ĐỦ CHO TSCFLP (DÙNG CHUNG CHO GREEDY + MFSS)
 # =====================================================================
 
+# Các backend giải MILP/LP (xem make_solver)
+SOLVER_BACKENDS = ('cbc', 'highs', 'highs_cmd')
+
+
+class _HiGHSWarmStart(pl.HiGHS):
+    """
+    HiGHS trong process (highspy) có MIP start: sau khi PuLP dựng model
+    highspy, giá trị hiện tại của các biến được nạp làm lời giải ban đầu.
+    """
+
+    def __init__(self, *args, warm_start: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.warm_start = warm_start
+
+    def buildSolverModel(self, lp):
+        super().buildSolverModel(lp)
+        if self.warm_start:
+            import highspy
+            variables = sorted(lp.variables(), key=lambda v: v.index)
+            start = highspy.HighsSolution()
+            start.col_value = [v.varValue if v.varValue is not None else 0.0
+                               for v in variables]
+            start.value_valid = True
+            lp.solverModel.setSolution(start)
+
+
+def make_solver(backend: str = 'cbc',
+                time_limit: Optional[float] = None,
+                warm_start: bool = False,
+                msg: bool = False):
+    """
+    Tạo solver PuLP theo tên backend.
+
+    - 'cbc'      : CBC qua dòng lệnh (mặc định của PuLP). Mỗi lần giải ghi
+                   model ra file và chạy 1 process CBC.
+    - 'highs'    : HiGHS chạy ngay trong process qua highspy: không ghi file,
+                   không tạo process → overhead mỗi lần giải nhỏ, hợp với
+                   hàng trăm subproblem nhỏ của MFSS. Cần `pip install highspy`.
+    - 'highs_cmd': HiGHS qua dòng lệnh (file + process như CBC).
+
+    warm_start: dùng giá trị hiện tại của các biến làm MIP start.
+    """
+    if backend == 'cbc':
+        return pl.PULP_CBC_CMD(msg=msg, timeLimit=time_limit, warmStart=warm_start)
+    if backend == 'highs':
+        solver = _HiGHSWarmStart(msg=msg, timeLimit=time_limit, warm_start=warm_start)
+    elif backend == 'highs_cmd':
+        solver = pl.HiGHS_CMD(msg=msg, timeLimit=time_limit, warmStart=warm_start)
+    else:
+        raise ValueError(f"backend không hợp lệ: {backend!r} (chọn một trong {SOLVER_BACKENDS})")
+    if not solver.available():
+        raise RuntimeError(f"Backend {backend!r} không khả dụng trên máy này "
+                           f"('highs' cần highspy, 'highs_cmd' cần file chạy highs)")
+    return solver
+
+
+class TSCFLPModel:
+    """
+    Model MILP của TSCFLP được dựng MỘT LẦN cho mỗi instance và tái sử dụng.
+
+    MFSS gọi solver hàng trăm lần trên cùng một instance, mỗi lần chỉ khác
+    nhau ở fixed-set và time limit. Thay vì dựng lại I*J + J*K biến cùng toàn
+    bộ ràng buộc mỗi lần, ta giữ nguyên model và chỉ đổi bound của x[i], y[j]:
+        - facility bị fix  → lowBound = upBound = 0/1
+        - facility tự do   → lowBound = 0, upBound = 1
+    Giá trị biến của lần giải trước được giữ lại trong model và dùng làm
+    điểm xuất phát (MIP start) cho lần giải sau.
+
+    Model cũng có thể chỉ chứa một phần cung (arc) w(i,j), z(j,k) (xem
+    sparse_tscflp): truyền arcs_w/arcs_z khi dựng, thêm cung sau bằng
+    add_arcs(). Biến w, z được lưu theo key (i, j) / (j, k).
+
+    Model rút gọn: truyền I_act/J_act (facility còn được phép mở) thì chỉ
+    facility đó mới có biến x/y, ràng buộc và cung; facility bị fix đóng
+    bị loại hẳn khỏi model trước khi dựng (xem solve_full_mip).
+
+    `backend` chọn solver (xem make_solver), có thể đổi giữa các lần giải.
+    """
+
+    def __init__(self,
+                 inst: TSCFLPInstance,
+                 arcs_w: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+                 arcs_z: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+                 backend: str = 'cbc',
+                 I_act: Optional[List[int]] = None,
+                 J_act: Optional[List[int]] = None):
+        # ===== BƯỚC 1: Lấy dữ liệu từ instance =====
+        # PuLP làm việc với số thực Python nên chuyển mảng NumPy về list
+        # I, J: chỉ các facility có mặt trong model (mặc định: tất cả)
+        I = list(inst.I) if I_act is None else [int(i) for i in I_act]
+        J = list(inst.J) if J_act is None else [int(j) for j in J_act]
+        K = inst.K  # Tập chỉ số plants, depots, customers
+        f, g, U, V, D = (inst.f.tolist(), inst.g.tolist(), inst.U.tolist(),
+                         inst.V.tolist(), inst.D.tolist())  # Chi phí, capacity, demand
+
+        self.inst = inst
+        self.backend = backend
+        self.I, self.J, self.K = I, J, K
+        self.n_solves = 0  # Số lần model đã được giải (để biết có warm start không)
+
+        # ===== BƯỚC 2: Tạo model MILP =====
+        prob = pl.LpProblem("TSCFLP", pl.LpMinimize)  # Bài toán tối thiểu hóa chi phí
+
+        # ===== BƯỚC 3: Định nghĩa biến quyết định =====
+        # x[i]: Biến nhị phân - 1 nếu mở nhà máy i, 0 nếu không
+        x = pl.LpVariable.dicts("x", I, lowBound=0, upBound=1, cat="Binary")
+
+        # y[j]: Biến nhị phân - 1 nếu mở kho j, 0 nếu không
+        y = pl.LpVariable.dicts("y", J, lowBound=0, upBound=1, cat="Binary")
+
+        # w[i,j], z[j,k]: Biến liên tục - luồng hàng trên từng cung,
+        # được tạo ở add_arcs() (BƯỚC 4-5 cho phần vận chuyển)
+        self.w: Dict[Tuple[int, int], pl.LpVariable] = {}
+        self.z: Dict[Tuple[int, int], pl.LpVariable] = {}
+
+        # ===== BƯỚC 4: Định nghĩa hàm mục tiêu (Objective Function) =====
+        # Tối thiểu hóa tổng chi phí = chi phí mở facility + chi phí vận chuyển
+        # (phần chi phí vận chuyển c·w + d·z được thêm theo từng cung)
+        prob += (
+            pl.lpSum(f[i] * x[i] for i in I) +                     # Tổng chi phí mở nhà máy
+            pl.lpSum(g[j] * y[j] for j in J)                       # Tổng chi phí mở kho
+        )
+
+        # ===== BƯỚC 5: Thêm các ràng buộc (Constraints) =====
+        # Đặt tên cho từng ràng buộc để đọc được dual value (xem duals())
+
+        # Ràng buộc 1: Capacity của nhà máy
+        # Tổng hàng xuất từ nhà máy i không vượt quá capacity U[i] (chỉ khi mở x[i]=1)
+        #     Σ_j w[i,j] - U[i]·x[i] <= 0
+        for i in I:
+            prob += -U[i] * x[i] <= 0, f"capI_{i}"
+
+        # Ràng buộc 2: Capacity của kho
+        # Tổng hàng qua kho j không vượt quá capacity V[j] (chỉ khi mở y[j]=1)
+        #     Σ_k z[j,k] - V[j]·y[j] <= 0
+        for j in J:
+            prob += -V[j] * y[j] <= 0, f"capJ_{j}"
+
+        # Ràng buộc 3: Bảo toàn luồng tại kho
+        # Hàng vào kho j (từ plants) = Hàng ra kho j (đến customers)
+        #     Σ_i w[i,j] - Σ_k z[j,k] == 0
+        for j in J:
+            prob += pl.LpConstraint(sense=pl.LpConstraintEQ, rhs=0, name=f"flow_{j}")
+
+        # Ràng buộc 4: Thỏa mãn nhu cầu khách hàng
+        # Tổng hàng nhận được của khách k phải đúng bằng nhu cầu D[k]
+        #     Σ_j z[j,k] == D[k]
+        for k in K:
+            prob += pl.LpConstraint(sense=pl.LpConstraintEQ, rhs=D[k], name=f"dem_{k}")
+
+        self.prob = prob
+        self.x, self.y = x, y
+        self._cons = prob.constraints
+        self._obj = prob.objective
+
+        # Mặc định: mọi cung (model đầy đủ)
+        if arcs_w is None:
+            arcs_w = tuple(a.ravel() for a in np.meshgrid(I, J, indexing='ij'))
+        if arcs_z is None:
+            arcs_z = tuple(a.ravel() for a in np.meshgrid(J, K, indexing='ij'))
+        self.add_arcs(arcs_w, arcs_z)
+
+    def add_arcs(self,
+                 arcs_w: Tuple[np.ndarray, np.ndarray] = ((), ()),
+                 arcs_z: Tuple[np.ndarray, np.ndarray] = ((), ())) -> int:
+        """
+        Thêm các cung w(i,j) (arcs_w = (mảng i, mảng j)) và z(j,k) vào model:
+        tạo biến, thêm hệ số vào hàm mục tiêu và các ràng buộc liên quan.
+        Cung đã có thì bỏ qua. Trả về số cung thực sự được thêm.
+        """
+        inst, cons, obj = self.inst, self._cons, self._obj
+        n_new = 0
+
+        ii, jj = (np.asarray(a, dtype=np.int64) for a in arcs_w)
+        cost_w = np.asarray(inst.c[ii, jj], dtype=np.float64).tolist() if len(ii) else []
+        for i, j, cost in zip(ii.tolist(), jj.tolist(), cost_w):
+            if (i, j) in self.w:
+                continue
+            v = pl.LpVariable(f"w_{i}_{j}", lowBound=0)
+            self.w[i, j] = v
+            obj[v] = cost                 # chi phí vận chuyển plant->depot
+            cons[f"capI_{i}"].expr[v] = 1
+            cons[f"flow_{j}"].expr[v] = 1
+            n_new += 1
+
+        jj, kk = (np.asarray(a, dtype=np.int64) for a in arcs_z)
+        cost_z = np.asarray(inst.d[jj, kk], dtype=np.float64).tolist() if len(jj) else []
+        for j, k, cost in zip(jj.tolist(), kk.tolist(), cost_z):
+            if (j, k) in self.z:
+                continue
+            v = pl.LpVariable(f"z_{j}_{k}", lowBound=0)
+            self.z[j, k] = v
+            obj[v] = cost                 # chi phí vận chuyển depot->customer
+            cons[f"capJ_{j}"].expr[v] = 1
+            cons[f"flow_{j}"].expr[v] = -1
+            cons[f"dem_{k}"].expr[v] = 1
+            n_new += 1
+
+        return n_new
+
+    def set_fixed(self, fixed: Optional[Dict[str, Dict[int, int]]] = None):
+        """
+        Áp dụng fixed-set (dùng cho MFSS) bằng cách đổi bound của x[i], y[j].
+
+        Trước hết trả mọi facility về trạng thái tự do [0, 1] (xóa fixed-set
+        của lần gọi trước), sau đó đặt lowBound = upBound = val cho các
+        facility có trong `fixed`. Facility không có trong model rút gọn
+        chỉ được phép fix đóng (= 0).
+        """
+        for i in self.I:
+            self.x[i].lowBound, self.x[i].upBound = 0, 1
+        for j in self.J:
+            self.y[j].lowBound, self.y[j].upBound = 0, 1
+
+        if fixed is None:
+            return
+        for tier, var in (('I', self.x), ('J', self.y)):
+            # Cố định các plant x[i] / depot y[j] = 0 hoặc 1
+            for t, val in fixed.get(tier, {}).items():
+                if t in var:
+                    var[t].lowBound = var[t].upBound = int(val)
+                elif int(val) != 0:
+                    raise ValueError(f"Facility {tier}{t} không có trong model rút gọn, "
+                                     f"không thể fix mở")
+
+    def set_start(self, sol: Solution):
+        """
+        Nạp lời giải `sol` (pattern + luồng) làm điểm xuất phát cho lần giải
+        tới (MIP start). Cung có luồng trong sol mà model chưa có (model thưa)
+        được thêm vào để điểm xuất phát khả thi.
+        """
+        for i, v in self.x.items():
+            v.setInitialValue(int(sol.open_I[i]))
+        for j, v in self.y.items():
+            v.setInitialValue(int(sol.open_J[j]))
+        for v in list(self.w.values()) + list(self.z.values()):
+            v.setInitialValue(0.0)
+
+        for flow, arcs, add in ((sol.w, self.w, 'w'), (sol.z, self.z, 'z')):
+            if flow is None:
+                continue
+            # Chỉ giữ cung có cả 2 đầu trong model
+            ok = np.isin(flow.rows, self.I if add == 'w' else self.J)
+            if add == 'w':
+                ok &= np.isin(flow.cols, self.J)
+            rows, cols = flow.rows[ok], flow.cols[ok]
+            if add == 'w':
+                self.add_arcs(arcs_w=(rows, cols))
+            else:
+                self.add_arcs(arcs_z=(rows, cols))
+            for r, c, val in zip(rows.tolist(), cols.tolist(), flow.vals[ok].tolist()):
+                arcs[r, c].setInitialValue(val)
+
+    def _run(self, time_limit: Optional[float], warm_start: bool) -> bool:
+        """
+        Gọi solver trên model hiện tại.
+        Trả về True nếu có lời giải (tối ưu hoặc khả thi) để đọc giá trị biến.
+        """
+        # ===== BƯỚC 7: Chọn solver và giải bài toán =====
+        # Solver theo self.backend (mặc định CBC - miễn phí, mã nguồn mở)
+        # msg=False: không in log chi tiết của solver
+        # time_limit: giới hạn thời gian giải (giây)
+        # warm_start: dùng lời giải của lần giải trước làm điểm xuất phát
+        solver = make_solver(self.backend, time_limit=time_limit,
+                             warm_start=warm_start)
+        self.prob.solve(solver)
+        self.n_solves += 1
+
+        # Model được tái sử dụng nên phải kiểm tra trạng thái lời giải:
+        # nếu solver không tìm được nghiệm, giá trị biến có thể là của lần trước
+        return self.prob.sol_status in (pl.LpSolutionOptimal,
+                                        pl.LpSolutionIntegerFeasible)
+
+    def solve(self,
+              time_limit: Optional[float] = None,
+              verbose: bool = True,
+              incumbent: Optional[Solution] = None) -> Solution:
+        """
+        Giải model với bound hiện tại và trả về Solution.
+
+        Từ lần giải thứ 2 trở đi, lời giải trước còn lưu trong các biến
+        được truyền cho solver làm MIP start.
+
+        incumbent: lời giải khả thi đã biết (phải khớp với bound hiện tại),
+        dùng làm MIP start thay cho lời giải trước. Nếu solver không tìm được
+        lời giải tốt hơn trong time limit thì trả về chính incumbent.
+        Solution.optimal = True khi solver chứng minh được tối ưu.
+        """
+        nI, nJ = len(self.inst.I), len(self.inst.J)  # Kích thước đầy đủ của instance
+        x, y = self.x, self.y
+
+        if verbose:
+            print("  → Đang giải MILP...", end='', flush=True)
+
+        warm_start = self.n_solves > 0
+        if incumbent is not None and incumbent.cost < float('inf'):
+            self.set_start(incumbent)
+            warm_start = True
+        else:
+            incumbent = None
+
+        try:
+            # Giải bài toán MILP
+            ok = self._run(time_limit, warm_start=warm_start)
+
+            if verbose:
+                print(" ✓")  # In dấu tick khi giải xong
+
+            # ===== BƯỚC 8: Lấy kết quả =====
+            if not ok:
+                return self._no_result(incumbent)
+
+            # Lấy giá trị hàm mục tiêu (tổng chi phí)
+            cost = pl.value(self.prob.objective)
+            if cost is None:  # Nếu không giải được
+                cost = float('inf')
+            # Solver chứng minh tối ưu (không phải dừng vì hết time limit)
+            proven = self.prob.sol_status == pl.LpSolutionOptimal
+            if incumbent is not None and incumbent.cost <= cost:
+                # Solver không cải thiện được incumbent trong time limit.
+                # Cờ optimal của incumbent là của bài toán nó được giải (VD: base
+                # B của MFSS, từ fixed-set khác) → chỉ giữ kết luận của lần giải này
+                return replace(incumbent, optimal=proven)
+
+            # Lấy pattern facility mở/đóng từ biến x[i] và y[j]
+            # round() để chuyển từ số thực (0.0/1.0) sang số nguyên (0/1)
+            # (facility không có trong model rút gọn = đóng)
+            open_I, open_J = [0] * nI, [0] * nJ
+            for i, v in x.items():
+                open_I[i] = int(round(v.value())) if v.value() is not None else 0
+            for j, v in y.items():
+                open_J[j] = int(round(v.value())) if v.value() is not None else 0
+
+            # Trả về Solution object chứa chi phí, pattern và luồng (dạng thưa)
+            return Solution(cost=cost, open_I=open_I, open_J=open_J,
+                            w=self._flow(self.w, (nI, nJ)),
+                            z=self._flow(self.z, (nJ, len(self.K))),
+                            optimal=proven)
+
+        except Exception as e:
+            # Xử lý lỗi: in thông báo và trả về nghiệm không khả thi
+            print(f"Solver error: {e}")
+            return self._no_result(incumbent)
+
+    def _no_result(self, incumbent: Optional[Solution]) -> Solution:
+        """
+        Kết quả khi solver không cho lời giải (hết giờ / lỗi): incumbent nếu
+        có, nhưng không bao giờ đánh dấu tối ưu vì chưa chứng minh được gì;
+        nếu không có thì là nghiệm không khả thi (cost = inf).
+        """
+        if incumbent is not None:
+            return replace(incumbent, optimal=False)
+        return Solution(cost=float('inf'), open_I=[0] * len(self.inst.I),
+                        open_J=[0] * len(self.inst.J))
+
+    @staticmethod
+    def _flow(arcs: Dict[Tuple[int, int], pl.LpVariable],
+              shape: Tuple[int, int], tol: float = 1e-9) -> SparseFlow:
+        """Đọc luồng trên các cung của model thành SparseFlow."""
+        keys = np.array(list(arcs.keys()), dtype=np.int32).reshape(-1, 2)
+        vals = np.array([v.value() or 0.0 for v in arcs.values()], dtype=np.float64)
+        keep = vals > tol
+        return SparseFlow(rows=keys[keep, 0], cols=keys[keep, 1],
+                          vals=vals[keep], shape=shape)
+
+    def solve_lp(self, time_limit: Optional[float] = None) -> float:
+        """
+        Giải LP relaxation (x, y liên tục trong bound hiện tại) để lấy giá trị
+        đối ngẫu cho pricing (xem duals()). Trả về giá trị mục tiêu LP,
+        hoặc inf nếu LP không khả thi.
+        """
+        for v in list(self.x.values()) + list(self.y.values()):
+            v.cat = pl.LpContinuous
+        try:
+            ok = self._run(time_limit, warm_start=False)
+        finally:
+            for v in list(self.x.values()) + list(self.y.values()):
+                v.cat = pl.LpInteger
+        if not ok:
+            return float('inf')
+        return pl.value(self.prob.objective)
+
+    def duals(self) -> Dict[str, np.ndarray]:
+        """
+        Giá trị đối ngẫu của các ràng buộc sau solve_lp():
+            alpha[i] (capI), beta[j] (capJ), gamma[j] (flow), delta[k] (dem)
+        (mảng theo chỉ số đầy đủ của instance; facility ngoài model = 0)
+        Reduced cost của cung:
+            w(i,j): c[i,j] - (alpha[i] + gamma[j])
+            z(j,k): d[j,k] - (beta[j] - gamma[j] + delta[k])
+        """
+        cons = self._cons
+
+        def pi(prefix: str, idx: List[int], n: int) -> np.ndarray:
+            out = np.zeros(n)
+            out[idx] = [cons[f"{prefix}_{t}"].pi or 0.0 for t in idx]
+            return out
+
+        nI, nJ, nK = len(self.inst.I), len(self.inst.J), len(self.K)
+        return {'alpha': pi('capI', self.I, nI), 'beta': pi('capJ', self.J, nJ),
+                'gamma': pi('flow', self.J, nJ), 'delta': pi('dem', self.K, nK)}
+
+
+
+def fits_fixed(sol: Solution, fixed: Optional[Dict[str, Dict[int, int]]]) -> bool:
+    """Pattern của sol có thỏa fixed-set không (để dùng làm incumbent)."""
+    fixed = fixed or {}
+    return (all(int(sol.open_I[i]) == int(val) for i, val in fixed.get('I', {}).items())
+            and all(int(sol.open_J[j]) == int(val) for j, val in fixed.get('J', {}).items()))
+
+
+def active_facilities(inst: TSCFLPInstance,
+                      fixed: Optional[Dict[str, Dict[int, int]]]
+                      ) -> Tuple[List[int], List[int]]:
+    """Các plant / depot KHÔNG bị fix đóng (= 0) trong fixed-set."""
+    fixed = fixed or {}
+    closed_I = {i for i, val in fixed.get('I', {}).items() if int(val) == 0}
+    closed_J = {j for j, val in fixed.get('J', {}).items() if int(val) == 0}
+    return ([i for i in inst.I if i not in closed_I],
+            [j for j in inst.J if j not in closed_J])
+
+
+# Số model rút gọn (mỗi tập facility bị fix đóng 1 model) giữ lại trên mỗi
+# instance, xem get_model
+REDUCED_MODEL_CACHE = 8
+
+
+def get_model(inst: TSCFLPInstance,
+              I_act: Optional[List[int]] = None,
+              J_act: Optional[List[int]] = None) -> TSCFLPModel:
+    """
+    Lấy model MILP dùng chung của instance (dựng ở lần gọi đầu tiên).
+
+    Model được gắn vào instance (thuộc tính `_model`) nên mỗi instance
+    chỉ dựng model đúng 1 lần, dù greedy/MFSS gọi solver bao nhiêu lần.
+
+    Truyền I_act/J_act (xem active_facilities) để lấy model rút gọn trên các
+    facility đó. Model rút gọn được giữ theo tập facility có mặt trong cache
+    LRU `_reduced_models` (tối đa REDUCED_MODEL_CACHE model), nên các
+    subproblem MFSS đóng cùng tập facility dùng lại model và MIP start.
+    """
+    if I_act is None and J_act is None:
+        model = getattr(inst, '_model', None)
+        if model is None:
+            model = TSCFLPModel(inst)
+            inst._model = model
+        return model
+
+    models = getattr(inst, '_reduced_models', None)
+    if models is None:
+        models = inst._reduced_models = OrderedDict()
+    I_act = list(inst.I) if I_act is None else I_act
+    J_act = list(inst.J) if J_act is None else J_act
+    # Key: bitset các facility có mặt (plant rồi depot)
+    mask = np.zeros(len(inst.I) + len(inst.J), dtype=bool)
+    mask[np.asarray(I_act, dtype=np.int64)] = True
+    mask[len(inst.I) + np.asarray(J_act, dtype=np.int64)] = True
+    key = np.packbits(mask).tobytes()
+
+    model = models.get(key)
+    if model is None:
+        model = TSCFLPModel(inst, I_act=I_act, J_act=J_act)
+        models[key] = model
+        while len(models) > REDUCED_MODEL_CACHE:
+            models.popitem(last=False)
+    else:
+        models.move_to_end(key)
+    return model
+
+
 def solve_full_mip(inst: TSCFLPInstance,
                    time_limit: Optional[float] = None,
                    fixed: Optional[Dict[str, Dict[int, int]]] = None,
-                   verbose: bool = True
+                   verbose: bool = True,
+                   mode: str = 'full',
+                   backend: str = 'cbc',
+                   incumbent: Optional[Solution] = None
                    ) -> Solution:
     """
     Giải đầy đủ mô hình MILP của TSCFLP bằng PuLP (CBC).
 
+    Khi `fixed` không đóng facility nào, model đầy đủ chỉ được dựng ở lần gọi
+    đầu tiên cho mỗi instance (xem `get_model`); các lần gọi sau chỉ đổi bound
+    của x/y rồi giải lại, với lời giải trước làm MIP start.
+    Khi có facility bị fix đóng, dùng model rút gọn chỉ gồm các facility còn
+    lại và các cung giữa chúng (nhỏ hơn nhiều với subproblem MFSS); model rút
+    gọn cũng được giữ lại theo tập facility bị đóng và chỉ đổi bound.
+
     Parameters
     ----------
     inst : TSCFLPInstance
@@ -98,117 +837,215 @@ def solve_full_mip(inst: TSCFLPInstance,
             }
     verbose : bool, optional
         In log từ solver hay không (default: True)
+    mode : str, optional
+        'full'   : model đầy đủ mọi cung (mặc định)
+        'sparse' : model trên k cung rẻ nhất + cung gộp, tái chèn cung bị
+                   cắt đến khi chứng minh tối ưu như 'full'
+                   (xem sparse_tscflp.solve_sparse_mip)
+        'colgen' : sinh cột trên LP relaxation đến khi hội tụ rồi mới branch
+                   (xem sparse_tscflp.solve_colgen_mip)
+    backend : str, optional
+        Solver dùng để giải: 'cbc' (mặc định), 'highs' (trong process, cần
+        highspy) hoặc 'highs_cmd' (xem make_solver).
+    incumbent : Solution, optional
+        Lời giải khả thi đã biết (VD: base B của MFSS). Nếu thỏa `fixed` thì
+        được dùng làm MIP start, và kết quả trả về không bao giờ tệ hơn nó
+        (solver không tìm được gì tốt hơn → trả về incumbent).
 
     Returns
     -------
     Solution
         Cost tối ưu (hoặc tốt nhất trong time limit) và pattern mở/đóng facility.
     """
-    # ===== BƯỚC 1: Lấy dữ liệu từ instance =====
-    I, J, K = inst.I, inst.J, inst.K  # Tập chỉ số plants, depots, customers
-    f, g, U, V, D = inst.f, inst.g, inst.U, inst.V, inst.D  # Chi phí, capacity, demand
-    c, d = inst.c, inst.d  # Ma trận chi phí vận chuyển
-
-    # ===== BƯỚC 2: Tạo model MILP =====
-    prob = pl.LpProblem("TSCFLP", pl.LpMinimize)  # Bài toán tối thiểu hóa chi phí
+    if incumbent is not None and not fits_fixed(incumbent, fixed):
+        incumbent = None  # Không khả thi cho subproblem này → bỏ qua
 
-    # ===== BƯỚC 3: Định nghĩa biến quyết định =====
-    # x[i]: Biến nhị phân - 1 nếu mở nhà máy i, 0 nếu không
-    x = pl.LpVariable.dicts("x", I, lowBound=0, upBound=1, cat="Binary")
-    
-    # y[j]: Biến nhị phân - 1 nếu mở kho j, 0 nếu không
-    y = pl.LpVariable.dicts("y", J, lowBound=0, upBound=1, cat="Binary")
+    if mode == 'sparse':
+        from sparse_tscflp import solve_sparse_mip
+        return solve_sparse_mip(inst, time_limit=time_limit, fixed=fixed,
+                                verbose=verbose, backend=backend, incumbent=incumbent)
+    if mode == 'colgen':
+        from sparse_tscflp import solve_colgen_mip
+        return solve_colgen_mip(inst, time_limit=time_limit, fixed=fixed,
+                                verbose=verbose, backend=backend, incumbent=incumbent)
+    if mode != 'full':
+        raise ValueError(f"mode không hợp lệ: {mode!r} (chọn 'full', 'sparse' hoặc 'colgen')")
 
-    # w[i,j]: Biến liên tục - lượng hàng vận chuyển từ nhà máy i đến kho j
-    w = pl.LpVariable.dicts("w", (I, J), lowBound=0, cat="Continuous")
-    
-    # z[j,k]: Biến liên tục - lượng hàng vận chuyển từ kho j đến khách hàng k
-    z = pl.LpVariable.dicts("z", (J, K), lowBound=0, cat="Continuous")
-
-    # ===== BƯỚC 4: Định nghĩa hàm mục tiêu (Objective Function) =====
-    # Tối thiểu hóa tổng chi phí = chi phí mở facility + chi phí vận chuyển
-    prob += (
-        pl.lpSum(f[i] * x[i] for i in I) +                     # Tổng chi phí mở nhà máy
-        pl.lpSum(g[j] * y[j] for j in J) +                     # Tổng chi phí mở kho
-        pl.lpSum(c[i][j] * w[i][j] for i in I for j in J) +    # Tổng chi phí vận chuyển plant->depot
-        pl.lpSum(d[j][k] * z[j][k] for j in J for k in K)      # Tổng chi phí vận chuyển depot->customer
-    )
-
-    # ===== BƯỚC 5: Thêm các ràng buộc (Constraints) =====
-    
-    # Ràng buộc 1: Capacity của nhà máy
-    # Tổng hàng xuất từ nhà máy i không vượt quá capacity U[i] (chỉ khi mở x[i]=1)
-    for i in I:
-        prob += pl.lpSum(w[i][j] for j in J) <= U[i] * x[i]
-
-    # Ràng buộc 2: Capacity của kho
-    # Tổng hàng qua kho j không vượt quá capacity V[j] (chỉ khi mở y[j]=1)
-    for j in J:
-        prob += pl.lpSum(z[j][k] for k in K) <= V[j] * y[j]
-
-    # Ràng buộc 3: Bảo toàn luồng tại kho
-    # Hàng vào kho j (từ plants) = Hàng ra kho j (đến customers)
-    # Đảm bảo không tồn kho, không mất hàng
-    for j in J:
-        prob += pl.lpSum(w[i][j] for i in I) == pl.lpSum(z[j][k] for k in K)
-
-    # Ràng buộc 4: Thỏa mãn nhu cầu khách hàng
-    # Tổng hàng nhận được của khách k phải đúng bằng nhu cầu D[k]
-    for k in K:
-        prob += pl.lpSum(z[j][k] for j in J) == D[k]
-
-    # ===== BƯỚC 6: Fixed-set constraints (dùng cho MFSS) =====
+    # ===== BƯỚC 6: Fixed-set (dùng cho MFSS) =====
     # Trong MFSS, ta cố định một số facility đã chọn, chỉ cho một số facility tự do
-    # Điều này giúp thu hẹp không gian tìm kiếm, giải nhanh hơn
-    if fixed is not None:
-        # Cố định các plant: x[i] = 0 hoặc 1
-        for i, val in fixed.get('I', {}).items():
-            prob += x[i] == int(val)
-        # Cố định các depot: y[j] = 0 hoặc 1
-        for j, val in fixed.get('J', {}).items():
-            prob += y[j] == int(val)
-
-    # ===== BƯỚC 7: Chọn solver và giải bài toán =====
-    # Sử dụng CBC solver (mặc định của PuLP, miễn phí, mã nguồn mở)
-    # msg=False: không in log chi tiết của solver
-    # timeLimit: giới hạn thời gian giải (giây)
-    solver = pl.PULP_CBC_CMD(msg=False, timeLimit=time_limit)
-    
-    if verbose:
-        print("  → Đang giải MILP...", end='', flush=True)
-    
-    try:
-        # Giải bài toán MILP
-        prob.solve(solver)
-        
-        if verbose:
-            print(" ✓")  # In dấu tick khi giải xong
-        
-        # ===== BƯỚC 8: Lấy kết quả =====
-        # Lấy giá trị hàm mục tiêu (tổng chi phí)
-        cost = pl.value(prob.objective)
-        if cost is None:  # Nếu không giải được
-            cost = float('inf')
-        
-        # Lấy pattern facility mở/đóng từ biến x[i] và y[j]
-        # round() để chuyển từ số thực (0.0/1.0) sang số nguyên (0/1)
-        open_I = [int(round(x[i].value())) if x[i].value() is not None else 0 for i in I]
-        open_J = [int(round(y[j].value())) if y[j].value() is not None else 0 for j in J]
-        
-        # Trả về Solution object chứa chi phí và pattern
-        return Solution(cost=cost, open_I=open_I, open_J=open_J)
-        
-    except Exception as e:
-        # Xử lý lỗi: in thông báo và trả về nghiệm không khả thi
-        print(f"Solver error: {e}")
-        return Solution(cost=float('inf'), open_I=[0]*len(I), open_J=[0]*len(J))
+    # Điều này giúp thu hẹp không gian tìm kiếm, giải nhanh hơn:
+    #   - facility fix đóng: loại hẳn khỏi model (biến, ràng buộc và mọi cung
+    #     nối với nó) TRƯỚC khi dựng → subproblem thành model nhỏ
+    #   - facility fix mở / tự do: đặt bound cho x[i], y[j]
+    I_act, J_act = active_facilities(inst, fixed)
+    if len(I_act) == len(inst.I) and len(J_act) == len(inst.J):
+        # Không facility nào bị đóng: dùng model đầy đủ đã dựng sẵn
+        model = get_model(inst)
+    else:
+        model = get_model(inst, I_act, J_act)
+    model.backend = backend
+    model.set_fixed(fixed)
+
+    return model.solve(time_limit=time_limit, verbose=verbose, incumbent=incumbent)
 
 
 # =====================================================================
 # 3. ĐỌC DỮ LIỆU TỪ FILE DATASET
 # =====================================================================
 
-def load_instance_from_file(filepath: str) -> TSCFLPInstance:
+# Các mảng đọc từ file được lưu trong cache nhị phân (mỗi mảng 1 file .npy)
+_CACHE_VERSION = 1
+_CACHE_ARRAYS = ('f', 'g', 'U_raw', 'V_raw', 'depot_x', 'D', 'customer_x')
+
+
+def _cache_dir(filepath: str) -> str:
+    """Thư mục cache nhị phân đặt cạnh file instance: `<file>.cache/`."""
+    return filepath + '.cache'
+
+
+def _source_stamp(filepath: str) -> Dict[str, int]:
+    """Dấu hiệu nhận biết file nguồn đã đổi (kích thước + thời điểm sửa)."""
+    st = os.stat(filepath)
+    return {'version': _CACHE_VERSION, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def _load_cache(filepath: str) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Đọc các mảng đã parse từ cache nhị phân.
+    Trả về None nếu chưa có cache, cache hỏng hoặc file nguồn đã bị sửa
+    (khi đó load_instance_from_file parse lại file text và ghi lại cache).
+    """
+    cdir = _cache_dir(filepath)
+    try:
+        with open(os.path.join(cdir, 'meta.json'), 'r') as fh:
+            meta = json.load(fh)
+        if meta != _source_stamp(filepath):
+            return None
+        data = {name: np.load(os.path.join(cdir, name + '.npy'))
+                for name in _CACHE_ARRAYS}
+        # Mảng ghi dở / lẫn giữa 2 lần ghi: độ dài các mảng phải khớp nhau
+        sizes = {name: data[name].shape for name in _CACHE_ARRAYS}
+        if not (sizes['f'] == sizes['U_raw']
+                and sizes['g'] == sizes['V_raw'] == sizes['depot_x']
+                and sizes['D'] == sizes['customer_x']
+                and all(len(shape) == 1 for shape in sizes.values())):
+            return None
+        return data
+    except Exception:
+        # Cache hỏng theo bất kỳ cách nào (file cụt → EOFError, meta.json sai
+        # kiểu, .npy không đọc được...) chỉ có nghĩa là phải parse lại
+        return None
+
+
+def _save_cache(filepath: str, arrays: Dict[str, np.ndarray]):
+    """
+    Ghi cache nhị phân cạnh file instance.
+    Ghi vào thư mục tạm rồi đổi tên, để tiến trình khác (VD: batch chạy song
+    song) không bao giờ đọc phải cache ghi dở. Lỗi ghi (thư mục chỉ đọc...)
+    được bỏ qua: lần sau chỉ đơn giản là parse lại file text.
+    """
+    cdir = _cache_dir(filepath)
+    tmp = f"{cdir}.tmp{os.getpid()}"
+    try:
+        os.makedirs(tmp, exist_ok=True)
+        for name in _CACHE_ARRAYS:
+            np.save(os.path.join(tmp, name + '.npy'), arrays[name])
+        with open(os.path.join(tmp, 'meta.json'), 'w') as fh:
+            json.dump(_source_stamp(filepath), fh)
+        if os.path.isdir(cdir):
+            shutil.rmtree(cdir, ignore_errors=True)
+        os.replace(tmp, cdir)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _parse_instance_text(filepath: str) -> Dict[str, np.ndarray]:
+    """
+    Parse file text của instance thành các mảng NumPy.
+
+    Đường nhanh: đọc dòng đầu (I J K), phần còn lại được tách token và
+    chuyển sang float64 một lần duy nhất (np.array trên list token), rồi cắt
+    lát theo cấu trúc file - không tạo list các dòng, không parse từng số.
+    Nếu số token không khớp format đầy đủ (VD: dòng depot/customer thiếu tọa
+    độ x) thì đọc lại từng dòng theo kiểu streaming, tọa độ thiếu = 0.
+    """
+    with open(filepath, 'r') as fh:
+        # Dòng đầu tiên (bỏ dòng trống): số lượng plants, depots, customers
+        header = fh.readline()
+        while header and not header.strip():
+            header = fh.readline()
+        I_size, J_size, K_size = map(int, header.split())
+
+        # Toàn bộ số còn lại → 1 mảng float64
+        vals = np.array(fh.read().split(), dtype=np.float64)
+
+    n_full = 2 * I_size + J_size + 2 * J_size + 2 * K_size
+    if len(vals) == n_full:
+        out = {}
+        pos = 0
+        for name, n in (('f', I_size), ('g', J_size), ('U_raw', I_size)):
+            out[name] = vals[pos:pos + n]
+            pos += n
+        Vx = vals[pos:pos + 2 * J_size].reshape(J_size, 2)   # mỗi dòng "V x"
+        pos += 2 * J_size
+        Dx = vals[pos:pos + 2 * K_size].reshape(K_size, 2)   # mỗi dòng "D x"
+        out['V_raw'], out['depot_x'] = Vx[:, 0].copy(), Vx[:, 1].copy()
+        out['D'], out['customer_x'] = Dx[:, 0].copy(), Dx[:, 1].copy()
+        return out
+
+    # Đường dự phòng: streaming từng dòng (không giữ cả file trong bộ nhớ)
+    sizes = (I_size, J_size, I_size, J_size, K_size)
+    rows: List[List[List[float]]] = [[] for _ in sizes]
+    with open(filepath, 'r') as fh:
+        lines = (line.split() for line in fh)
+        lines = (parts for parts in lines if parts)   # Bỏ dòng trống
+        next(lines)                                    # Bỏ dòng header
+        for sec, n in enumerate(sizes):
+            for _ in range(n):
+                rows[sec].append([float(v) for v in next(lines)])
+
+    def col(sec: int, pos: int) -> np.ndarray:
+        return np.array([r[pos] if len(r) > pos else 0.0 for r in rows[sec]],
+                        dtype=np.float64)
+
+    return {'f': col(0, 0), 'g': col(1, 0), 'U_raw': col(2, 0),
+            'V_raw': col(3, 0), 'depot_x': col(3, 1),   # J dòng "V x"
+            'D': col(4, 0), 'customer_x': col(4, 1)}     # K dòng "D x"
+
+
+def _cost_memmap(filepath: str, name: str,
+                 a: np.ndarray, b: np.ndarray,
+                 block_rows: int = 1024) -> np.memmap:
+    """
+    Ma trận chi phí |a[r] - b[s]| lưu trên đĩa (`<file>.cache/<name>.npy`)
+    và mở ở dạng memory-mapped chỉ đọc.
+
+    File được tính theo từng khối block_rows hàng nên bộ nhớ dùng khi tạo chỉ
+    cỡ block_rows × len(b), dù ma trận lớn hơn RAM. Nếu file đã có (và đúng
+    kích thước) thì map lại luôn, không tính lại.
+    """
+    path = os.path.join(_cache_dir(filepath), name + '.npy')
+    shape = (len(a), len(b))
+    if os.path.exists(path):
+        M = np.load(path, mmap_mode='r')
+        if M.shape == shape and M.dtype == np.float64:
+            return M
+
+    os.makedirs(_cache_dir(filepath), exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}.npy"
+    M = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float64, shape=shape)
+    for r0 in range(0, shape[0], block_rows):
+        r1 = min(r0 + block_rows, shape[0])
+        M[r0:r1] = np.abs(a[r0:r1, None] - b[None, :])
+    M.flush()
+    del M
+    os.replace(tmp, path)
+    return np.load(path, mmap_mode='r')
+
+
+def load_instance_from_file(filepath: str,
+                            use_cache: bool = True,
+                            cost_mode: str = 'dense') -> TSCFLPInstance:
     """
     Đọc instance TSCFLP từ file dataset theo format chuẩn.
     
@@ -223,68 +1060,52 @@ def load_instance_from_file(filepath: str) -> TSCFLPInstance:
     Lưu ý:
     - Ma trận chi phí c[i][j] và d[j][k] được tính từ khoảng cách Euclidean
     - Capacity được tự động scale để đảm bảo bài toán khả thi
+    - Lần đọc đầu tiên ghi cache nhị phân `<file>.cache/` (các mảng .npy);
+      các lần sau đọc thẳng từ cache, bỏ qua parse text. Cache tự bị bỏ qua
+      khi file nguồn thay đổi. use_cache=False để luôn parse file text.
+    - cost_mode:
+        'dense' : c, d là mảng trong RAM (mặc định)
+        'mmap'  : c, d được ghi ra `<file>.cache/c.npy`, `d.npy` (tính theo
+                  khối) và mở memory-mapped, dùng cho instance rất lớn mà ma
+                  trận J×K không vừa RAM. Luôn dùng thư mục cache.
+        'lazy'  : c, d là AbsDistanceCost, chỉ giữ tọa độ (bộ nhớ O(I+J+K)),
+                  chi phí tính khi truy cập.
     """
-    import math
+    if cost_mode not in ('dense', 'mmap', 'lazy'):
+        raise ValueError(f"cost_mode không hợp lệ: {cost_mode!r} "
+                         f"(chọn 'dense', 'mmap' hoặc 'lazy')")
     import random
     
-    # ===== BƯỚC 1: Đọc file và phân tích cấu trúc =====
-    with open(filepath, 'r') as f:
-        lines = [line.strip() for line in f if line.strip()]  # Bỏ dòng trống
-    
-    idx = 0  # Con trỏ theo dõi vị trí đọc
-    
-    # Đọc dòng đầu tiên: số lượng plants, depots, customers
-    I_size, J_size, K_size = map(int, lines[idx].split())
-    idx += 1
-    
-    # ===== BƯỚC 2: Đọc chi phí mở facility =====
-    # I dòng tiếp theo: chi phí mở từng plant
-    f = [float(lines[idx + i]) for i in range(I_size)]
-    idx += I_size
-    
-    # J dòng tiếp theo: chi phí mở từng depot
-    g = [float(lines[idx + j]) for j in range(J_size)]
-    idx += J_size
-    
-    # ===== BƯỚC 3: Đọc capacity và tọa độ =====
-    # I dòng tiếp: capacity của từng plant (số nguyên hoặc thực)
-    U_raw = [float(lines[idx + i]) for i in range(I_size)]
-    idx += I_size
-    
-    # J dòng tiếp: capacity + tọa độ của depot (format: "V x")
-    V_raw = []       # Capacity kho
-    depot_x = []     # Tọa độ x của kho (dùng để tính chi phí vận chuyển)
-    for j in range(J_size):
-        parts = list(map(float, lines[idx + j].split()))
-        V_raw.append(parts[0])                           # Capacity
-        depot_x.append(parts[1] if len(parts) > 1 else 0)  # Tọa độ (nếu có)
-    idx += J_size
-    
-    # K dòng tiếp: demand + tọa độ của customer (format: "D x")
-    D = []           # Nhu cầu khách hàng
-    customer_x = []  # Tọa độ x của khách hàng
-    for k in range(K_size):
-        parts = list(map(float, lines[idx + k].split()))
-        D.append(parts[0])                               # Demand
-        customer_x.append(parts[1] if len(parts) > 1 else 0)  # Tọa độ (nếu có)
-    idx += K_size
+    # ===== BƯỚC 1-3: Đọc chi phí mở, capacity và tọa độ =====
+    # (mmap cần thư mục cache hợp lệ: ghi lại cache cũng xóa c/d cũ đã lỗi thời)
+    use_cache = use_cache or cost_mode == 'mmap'
+    data = _load_cache(filepath) if use_cache else None
+    if data is None:
+        data = _parse_instance_text(filepath)
+        if use_cache:
+            _save_cache(filepath, data)
+
+    I_size = len(data['f'])
+    f, g = data['f'], data['g']
+    U_raw, V_raw, D = data['U_raw'], data['V_raw'], data['D']
+    depot_x, customer_x = data['depot_x'], data['customer_x']
     
     # ===== BƯỚC 4: Auto-scaling capacity để đảm bảo khả thi =====
     # Vấn đề: Dataset gốc có thể có capacity < demand → bài toán infeasible
     # Giải pháp: Tự động scale capacity lên để đủ phục vụ demand
     
-    total_demand = sum(D)      # Tổng nhu cầu cần phục vụ
-    total_U_raw = sum(U_raw)   # Tổng capacity plant gốc
-    total_V_raw = sum(V_raw)   # Tổng capacity depot gốc
+    total_demand = D.sum()      # Tổng nhu cầu cần phục vụ
+    total_U_raw = U_raw.sum()   # Tổng capacity plant gốc
+    total_V_raw = V_raw.sum()   # Tổng capacity depot gốc
     
     # Scale factor cho plant: đảm bảo tổng capacity ≥ 110% tổng demand
     # 10% buffer để tránh trường hợp biên
     u_scale = max(1.0, (total_demand / total_U_raw) * 1.1)
-    U = [u * u_scale for u in U_raw]  # Apply scale factor
+    U = U_raw * u_scale  # Apply scale factor
     
     # Scale factor cho depot: tương tự cho throughput capacity
     v_scale = max(1.0, (total_demand / total_V_raw) * 1.1)
-    V = [v * v_scale for v in V_raw]
+    V = V_raw * v_scale
     
     # In thông báo scale factor (để user biết capacity đã được điều chỉnh)
     print(f"  → Scale factors: U×{u_scale:.1f}, V×{v_scale:.1f} (đảm bảo feasible)")
@@ -292,28 +1113,28 @@ def load_instance_from_file(filepath: str) -> TSCFLPInstance:
     # ===== BƯỚC 5: Tạo tọa độ cho plants và tính ma trận chi phí =====
     # Plants không có tọa độ trong file → sinh ngẫu nhiên trong khoảng
     random.seed(42)  # Fixed seed để kết quả lặp lại được
-    min_x = min(min(depot_x), min(customer_x))
-    max_x = max(max(depot_x), max(customer_x))
-    plant_x = [random.uniform(min_x, max_x) for _ in range(I_size)]
-    
-    # Tính ma trận chi phí c[i][j]: khoảng cách từ plant i đến depot j
-    # Giả định: chi phí tỷ lệ thuận với khoảng cách Euclidean
-    c = []
-    for i in range(I_size):
-        row = []
-        for j in range(J_size):
-            dist = abs(plant_x[i] - depot_x[j])  # Khoảng cách 1D
-            row.append(dist)  # Chi phí = khoảng cách
-        c.append(row)
+    # (Luôn sinh lại kể cả khi đọc từ cache: rẻ, và giữ nguyên trạng thái
+    #  của `random` sau khi load như trước đây)
+    min_x = min(depot_x.min(), customer_x.min())
+    max_x = max(depot_x.max(), customer_x.max())
+    plant_x = np.array([random.uniform(min_x, max_x) for _ in range(I_size)])
     
-    # Tính ma trận chi phí d[j][k]: khoảng cách từ depot j đến customer k
-    d = []
-    for j in range(J_size):
-        row = []
-        for k in range(K_size):
-            dist = abs(depot_x[j] - customer_x[k])  # Khoảng cách 1D
-            row.append(dist)  # Chi phí = khoảng cách
-        d.append(row)
+    if cost_mode == 'mmap':
+        # Ma trận chi phí trên đĩa, đọc zero-copy qua memory map
+        c = _cost_memmap(filepath, 'c', plant_x, depot_x)
+        d = _cost_memmap(filepath, 'd', depot_x, customer_x)
+    elif cost_mode == 'lazy':
+        # Chỉ giữ tọa độ, chi phí |x_a - x_b| tính khi cần
+        c = AbsDistanceCost(plant_x, depot_x)
+        d = AbsDistanceCost(depot_x, customer_x)
+    else:
+        # Tính ma trận chi phí c[i][j]: khoảng cách từ plant i đến depot j
+        # Giả định: chi phí tỷ lệ thuận với khoảng cách Euclidean (1D)
+        # Broadcasting: (I, 1) - (1, J) → ma trận (I, J), không cần vòng lặp Python
+        c = np.abs(plant_x[:, None] - depot_x[None, :])
+
+        # Tính ma trận chi phí d[j][k]: khoảng cách từ depot j đến customer k
+        d = np.abs(depot_x[:, None] - customer_x[None, :])
     
     # ===== BƯỚC 6: Tạo và trả về TSCFLPInstance =====
     return TSCFLPInstance(f=f, U=U, g=g, V=V, D=D, c=c, d=d)